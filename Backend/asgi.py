@@ -0,0 +1,9 @@
+from myApp.asgi import create_asgi_app
+
+# Os processos do pool de PDFs (forkserver) importam este arquivo de novo como __mp_main__
+if __name__ != '__mp_main__':
+    app = create_asgi_app()
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=5000)
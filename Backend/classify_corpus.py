@@ -0,0 +1,168 @@
+import argparse
+import itertools
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from myApp import routes
+from myApp.bulk_jobs import BULK_INPUT_FORMATS, BULK_OUTPUT_FORMATS, format_results, input_format_for, read_records, results_header
+
+load_dotenv()
+
+# =========================================================================
+# ------------------ Configurações da Classificação Offline ---------------
+# =========================================================================
+#
+# Classifica um corpus inteiro (CSV, JSONL, mbox ou .zip) sem passar pelo Flask, com a mesma
+# limpeza/tokenizacao/inferencia em lotes das rotas (routes.classify_emails). O arquivo e lido
+# como stream, em lotes de --chunk-size mensagens, e os resultados sao gravados na ordem do arquivo.
+#
+# Exemplo: python classify_corpus.py myApp/data/datasets/email_dataset_pt.csv resultados.csv --workers 4
+# (o modelo e o de MODEL_PATH; no CSV o texto vem da coluna 'message', como no treino)
+
+# Mensagens enviadas a cada worker por vez
+CORPUS_CHUNK_SIZE = int(os.getenv("CORPUS_CHUNK_SIZE", 256))
+
+# Intervalo (s) entre as mensagens de progresso
+PROGRESS_INTERVAL_SECONDS = 10
+
+LABELS = [routes.LABEL_MAP[class_id] for class_id in sorted(routes.LABEL_MAP)]
+
+
+def init_worker(torch_threads: int, ready_barrier=None):
+    # Carrega o modelo no processo (uma vez por processo; no modo threads, uma vez para todas)
+    import torch
+
+    try:
+        if torch_threads > 0:
+            torch.set_num_threads(torch_threads)
+        routes.model_manager.start('eager')
+        if not routes.model_manager.ready:
+            raise RuntimeError(f"Modelo nao carregado: {routes.model_manager.status().get('error')}")
+    finally:
+        # Avisa o processo principal (a vazao e medida so depois de todos os modelos carregados)
+        if ready_barrier is not None:
+            ready_barrier.wait()
+
+
+def classify_chunk(texts: list[str]):
+    # Resultados + tokens reais ja processados por este processo (para tokens/s)
+    results = routes.classify_emails(texts)
+    return results, os.getpid(), routes.padding_stats.real_tokens
+
+
+def classified_chunks(chunks, executor, max_in_flight: int):
+    """
+    Gera (lote, resultado) na ordem do arquivo, com no max `max_in_flight` lotes em andamento
+    (so esses lotes ficam em memoria, qualquer que seja o tamanho do corpus).
+    """
+    if executor is None:
+        for chunk in chunks:
+            yield chunk, classify_chunk([text for _, text in chunk])
+        return
+
+    in_flight = deque()
+    for chunk in chunks:
+        in_flight.append((chunk, executor.submit(classify_chunk, [text for _, text in chunk])))
+        if len(in_flight) >= max_in_flight:
+            chunk, future = in_flight.popleft()
+            yield chunk, future.result()
+    while in_flight:
+        chunk, future = in_flight.popleft()
+        yield chunk, future.result()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Classifica um corpus de e-mails offline (CSV, JSONL, mbox ou .zip).")
+    parser.add_argument('input', help="Arquivo de entrada")
+    parser.add_argument('output', help="Arquivo de saida (.csv ou .jsonl)")
+    parser.add_argument('--format', choices=BULK_INPUT_FORMATS, help="Formato da entrada (padrao: pela extensao)")
+    parser.add_argument('--output-format', choices=BULK_OUTPUT_FORMATS, help="Formato da saida (padrao: pela extensao)")
+    parser.add_argument('--text-column', help="Coluna (CSV) ou campo (JSONL) com o texto (padrao: message/text/...)")
+    parser.add_argument('--workers', type=int, default=1, help="Processos ou threads de inferencia (padrao: 1)")
+    parser.add_argument('--mode', choices=('processes', 'threads'), default='processes',
+                        help="processes: um modelo por processo; threads: um modelo compartilhado (padrao: processes)")
+    parser.add_argument('--chunk-size', type=int, default=CORPUS_CHUNK_SIZE, help="Mensagens por lote enviado a um worker")
+    parser.add_argument('--torch-threads', type=int, default=0, help="Threads do torch por worker (padrao: CPUs / workers)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    input_format = args.format or input_format_for(args.input)
+    output_format = args.output_format or ('csv' if args.output.lower().endswith('.csv') else 'jsonl')
+    workers = max(1, args.workers)
+    torch_threads = args.torch_threads or max(1, (os.cpu_count() or 1) // workers)
+
+    if input_format not in BULK_INPUT_FORMATS:
+        print(f"ERRO: Formato de entrada nao reconhecido para '{args.input}'. Use --format ({', '.join(BULK_INPUT_FORMATS)}).")
+        sys.exit(1)
+    if not os.path.isfile(args.input):
+        print(f"ERRO: Arquivo '{args.input}' nao encontrado.")
+        sys.exit(1)
+
+    print(f"--- Classificando '{args.input}' ({input_format}) -> '{args.output}' ({output_format}) "
+          f"com {workers} worker(s) ({args.mode}, {torch_threads} thread(s) do torch cada) ---")
+
+    executor = None
+    try:
+        loading_start = time.perf_counter()
+        if workers > 1 and args.mode == 'processes':
+            # spawn: cada processo importa o torch do zero (fork depois do torch nao e seguro)
+            context = multiprocessing.get_context('spawn')
+            ready_barrier = context.Barrier(workers + 1)
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                           initializer=init_worker, initargs=(torch_threads, ready_barrier))
+            for _ in range(workers):
+                executor.submit(os.getpid) # Sobe todos os processos agora
+            ready_barrier.wait()
+        else:
+            init_worker(torch_threads)
+            if workers > 1:
+                executor = ThreadPoolExecutor(max_workers=workers)
+
+        start = time.perf_counter()
+        print(f"Modelo(s) carregado(s) em {start - loading_start:.1f}s")
+        last_progress = start
+        emails = 0
+        categories = Counter()
+        tokens_by_worker = {}
+
+        with open(args.input, 'rb') as input_file, open(args.output, 'wb') as output_file:
+            output_file.write(results_header(output_format, LABELS))
+            record_issues = Counter()
+            records = read_records(input_file, input_format, args.text_column,
+                                   on_issue=lambda record_id, reason: record_issues.update([reason]))
+            chunks = iter(lambda: list(itertools.islice(records, max(1, args.chunk_size))), [])
+
+            for chunk, (results, pid, real_tokens) in classified_chunks(chunks, executor, workers * 2):
+                output_file.write(format_results(output_format, LABELS, chunk, results))
+                emails += len(chunk)
+                categories.update(category for category, _ in results)
+                tokens_by_worker[pid] = max(tokens_by_worker.get(pid, 0), real_tokens)
+
+                now = time.perf_counter()
+                if now - last_progress >= PROGRESS_INTERVAL_SECONDS:
+                    print(f"{emails} e-mails classificados ({emails / (now - start):.1f} e-mails/s)")
+                    last_progress = now
+
+    except Exception as e:
+        print(f"ERRO: A classificacao falhou: {e}")
+        sys.exit(1)
+
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    tokens = sum(tokens_by_worker.values())
+    print(f"\n--- {emails} e-mails classificados em {elapsed:.1f}s ---")
+    print(f"Vazao: {emails / elapsed:.1f} e-mails/s | {tokens / elapsed:.0f} tokens/s ({tokens} tokens reais no modelo)")
+    print("Categorias: " + ", ".join(f"{category}: {count}" for category, count in categories.most_common()))
+    if record_issues:
+        print("AVISO: Registros ignorados ou truncados: " + ", ".join(f"{reason}: {count}" for reason, count in record_issues.most_common()))
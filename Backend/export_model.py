@@ -0,0 +1,131 @@
+import json
+import os
+import sys
+
+import torch
+
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from dotenv import load_dotenv
+
+from myApp.inference_backends import EXPORT_META_FILE, ONNX_FILE, TORCHSCRIPT_FILE, OnnxModel, TorchScriptModel
+from myApp.result_cache import model_fingerprint
+
+load_dotenv()
+
+# =========================================================================
+# ----------------------- Configurações do Export -------------------------
+# =========================================================================
+
+# Modelo treinado (saida do train_classifier.py) e pasta do grafo exportado
+MODEL_PATH = os.getenv("MODEL_PATH", "./fine_tuned_classifier")
+EXPORTED_MODEL_PATH = os.getenv("EXPORTED_MODEL_PATH", "./fine_tuned_classifier_export")
+MAX_LENGTH = int(os.getenv("MAX_LENGTH", 64))
+
+# Formatos gerados: torchscript, onnx (requer onnxruntime para rodar no Flask)
+EXPORT_FORMATS = [fmt.strip().lower() for fmt in os.getenv("EXPORT_FORMATS", "torchscript,onnx").split(',') if fmt.strip()]
+
+# Diferenca max aceita entre os logits do grafo exportado e do modelo eager
+MAX_LOGITS_DIFF = 1e-3
+
+
+def example_inputs(tokenizer, texts: list[str]) -> dict:
+    encodings = tokenizer(texts, truncation=True, max_length=MAX_LENGTH, padding='longest', return_tensors="pt")
+    return {'input_ids': encodings['input_ids'], 'attention_mask': encodings['attention_mask']}
+
+
+def export_torchscript(model, inputs: dict, path: str):
+    # trace registra as operacoes do forward; freeze embute os pesos como constantes do grafo
+    with torch.no_grad():
+        traced = torch.jit.trace(model, (inputs['input_ids'], inputs['attention_mask']))
+        frozen = torch.jit.freeze(traced)
+    torch.jit.save(frozen, path)
+
+
+def export_onnx(model, inputs: dict, path: str):
+    # Eixos dinamicos: lote e tamanho da sequencia variam a cada chamada (padding dinamico)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (inputs['input_ids'], inputs['attention_mask']),
+            path,
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['logits'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'sequence'},
+                'attention_mask': {0: 'batch', 1: 'sequence'},
+                'logits': {0: 'batch'}
+            },
+            opset_version=17,
+            dynamo=False
+        )
+
+
+def check_parity(model, exported_model, tokenizer, texts: list[str]) -> float:
+    # Compara com o modelo eager em lotes e tamanhos diferentes dos usados no export
+    max_diff = 0.0
+    for batch in ([texts[0]], texts, [text * 50 for text in texts]):
+        inputs = example_inputs(tokenizer, batch)
+        with torch.no_grad():
+            expected = model(**inputs)[0]
+            obtained = exported_model(**inputs).logits
+        max_diff = max(max_diff, (expected - obtained).abs().max().item())
+    return max_diff
+
+
+if __name__ == "__main__":
+    print(f"--- Exportando o modelo '{MODEL_PATH}' para '{EXPORTED_MODEL_PATH}' ({', '.join(EXPORT_FORMATS)}) ---")
+
+    if not os.path.isdir(MODEL_PATH):
+        print(f"ERRO: Modelo '{MODEL_PATH}' nao encontrado. Rode o train_classifier.py antes.")
+        sys.exit(1)
+
+    # torchscript=True: o modelo retorna tuplas (necessario para trace/export)
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
+    model = AutoModelForSequenceClassification.from_pretrained(MODEL_PATH, torchscript=True)
+    model.eval()
+
+    os.makedirs(EXPORTED_MODEL_PATH, exist_ok=True)
+    sample_texts = ["ola, poderia enviar o relatorio do projeto?", "obrigado pelo retorno, tenha um otimo dia e ate a proxima reuniao"]
+    inputs = example_inputs(tokenizer, sample_texts)
+
+    exported_formats = []
+    for export_format in EXPORT_FORMATS:
+        try:
+            if export_format == 'torchscript':
+                path = os.path.join(EXPORTED_MODEL_PATH, TORCHSCRIPT_FILE)
+                export_torchscript(model, inputs, path)
+                exported_model = TorchScriptModel(path, torch.device("cpu"))
+            elif export_format == 'onnx':
+                path = os.path.join(EXPORTED_MODEL_PATH, ONNX_FILE)
+                export_onnx(model, inputs, path)
+                exported_model = OnnxModel(path)
+            else:
+                print(f"AVISO: Formato de export '{export_format}' desconhecido. Sera ignorado.")
+                continue
+        except Exception as e:
+            print(f"AVISO: Nao foi possivel exportar em '{export_format}': {e}")
+            continue
+
+        max_diff = check_parity(model, exported_model, tokenizer, sample_texts)
+        if max_diff > MAX_LOGITS_DIFF:
+            print(f"ERRO: '{export_format}' difere do modelo original (diferenca max nos logits: {max_diff:.2e}).")
+            os.remove(path)
+            continue
+
+        print(f"'{export_format}' gravado em '{path}' (diferenca max nos logits: {max_diff:.2e}).")
+        exported_formats.append(export_format)
+
+    if not exported_formats:
+        print("ERRO: Nenhum formato foi exportado.")
+        sys.exit(1)
+
+    # Liga o export ao modelo de origem: o Flask recusa um export desatualizado
+    with open(os.path.join(EXPORTED_MODEL_PATH, EXPORT_META_FILE), 'w', encoding='utf-8') as f:
+        json.dump({
+            'model_fingerprint': model_fingerprint(MODEL_PATH),
+            'formats': exported_formats,
+            'max_length': MAX_LENGTH,
+            'torch_version': torch.__version__
+        }, f, indent=2)
+
+    print(f"\n--- Export concluido! Use INFERENCE_BACKEND={exported_formats[0]} no .env para servir o modelo exportado. ---")
@@ -0,0 +1,30 @@
+# ==============================================================
+# ------------- Configuracao do Gunicorn (run:app) -------------
+# ==============================================================
+# Lido automaticamente pelo Gunicorn a partir da pasta Backend (ou com -c gunicorn.conf.py)
+
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Num de processos (workers)
+workers = int(os.getenv("GUNICORN_WORKERS", 1))
+
+# Preload: o master importa o app e carrega o modelo (MODEL_LOADING=eager) antes do fork.
+# Os workers herdam os pesos ja carregados e compartilham as paginas de memoria (copy-on-write)
+preload_app = os.getenv("GUNICORN_PRELOAD", "False").lower() == "true"
+
+
+# Paralelismo da CPU (myApp/cpu_layout.py): cada worker recebe um slot (0..workers-1), que define
+# as suas threads do torch e, com CPU_AFFINITY=True, o seu conjunto de nucleos
+def pre_fork(server, worker):
+    # Roda no master: o novo worker (inclusive um que substitui outro) fica com o menor slot livre
+    used_slots = {getattr(w, 'cpu_slot', None) for w in server.WORKERS.values()}
+    worker.cpu_slot = next(slot for slot in range(len(used_slots) + 1) if slot not in used_slots)
+
+
+def post_fork(server, worker):
+    from myApp.cpu_layout import apply_cpu_layout
+    apply_cpu_layout(worker.cpu_slot, workers)
@@ -17,7 +17,32 @@ def create_app():
     CORS(app, resources={r"/*": {"origins": [FRONTEND_ORIGIN]}})
 
     # Importa e registra as rotas
-    from .routes import upload_files
+    from .routes import upload_files, inference_stats, prometheus_metrics, readiness, reload_model, classification_queue_full, model_not_ready, model_manager
+    from .routes import create_bulk_job, bulk_job_status, resume_bulk_job, bulk_job_results
+    from .batching import BatcherFullError
+    from .cpu_layout import apply_cpu_layout
+    from .model_manager import ModelNotReadyError
     app.add_url_rule('/upload', view_func=upload_files, methods=['POST'])
+    app.add_url_rule('/stats', view_func=inference_stats, methods=['GET'])
+    app.add_url_rule('/metrics', view_func=prometheus_metrics, methods=['GET'])
+    app.add_url_rule('/ready', view_func=readiness, methods=['GET'])
+    app.add_url_rule('/admin/reload-model', view_func=reload_model, methods=['POST'])
+
+    # Jobs de classificacao em lote (exportacoes de caixas de e-mail)
+    app.add_url_rule('/jobs', view_func=create_bulk_job, methods=['POST'])
+    app.add_url_rule('/jobs/<job_id>', view_func=bulk_job_status, methods=['GET'])
+    app.add_url_rule('/jobs/<job_id>/resume', view_func=resume_bulk_job, methods=['POST'])
+    app.add_url_rule('/jobs/<job_id>/results', view_func=bulk_job_results, methods=['GET'])
+
+    # Fila de classificacao cheia -> 503 (backpressure)
+    app.register_error_handler(BatcherFullError, classification_queue_full)
+    # Modelo ainda carregando em background -> 503
+    app.register_error_handler(ModelNotReadyError, model_not_ready)
+
+    # Threads do torch (e afinidade) do worker antes de carregar o modelo (cpu_layout.py)
+    apply_cpu_layout()
+
+    # Carrega o modelo conforme MODEL_LOADING (eager, background ou lazy)
+    model_manager.start()
 
     return app
\ No newline at end of file
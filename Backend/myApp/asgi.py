@@ -0,0 +1,204 @@
+# ========================================================================
+# ---- Modo ASGI (Starlette): mesmas rotas do Flask, sem bloquear o loop --
+# ========================================================================
+#
+# O I/O das requisicoes (upload multipart, leitura dos arquivos) roda no event loop;
+# a extracao de texto e a classificacao vao para pools de threads limitados. Assim um
+# worker aceita muitos uploads lentos ao mesmo tempo. O JSON de resposta e identico ao do Flask.
+#
+# Dependencias opcionais: starlette, uvicorn e python-multipart (veja requirements.txt)
+# Executar: uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+import asyncio
+import contextlib
+import contextvars
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from dotenv import load_dotenv
+
+try:
+    from starlette.applications import Starlette
+    from starlette.datastructures import UploadFile
+    from starlette.middleware import Middleware
+    from starlette.middleware.cors import CORSMiddleware
+    from starlette.responses import FileResponse, JSONResponse, Response
+    from starlette.routing import Route
+except ImportError as e:
+    raise ImportError("O modo ASGI requer starlette, uvicorn e python-multipart (veja requirements.txt).") from e
+
+from myApp import FRONTEND_ORIGIN
+from myApp import routes
+from myApp.batching import BatcherFullError
+from myApp.cpu_layout import apply_cpu_layout
+from myApp.metrics import request_timer, timings_ms, wants_timings
+from myApp.model_manager import ModelNotReadyError
+from myApp.profiling import PROFILE_HEADER, profile_headers, profile_request, run_in_request_profile
+
+load_dotenv()
+
+# Threads para extracao de texto (PDF/TXT) e para classificacao, por worker
+ASGI_EXTRACTION_WORKERS = int(os.getenv("ASGI_EXTRACTION_WORKERS", 4))
+ASGI_INFERENCE_WORKERS = int(os.getenv("ASGI_INFERENCE_WORKERS", 4))
+
+
+class FlaskJSONResponse(JSONResponse):
+    # Mesmo formato do jsonify do Flask (chaves ordenadas, ASCII, compacto): o contrato das rotas nao muda
+    def render(self, content) -> bytes:
+        return (json.dumps(content, ensure_ascii=True, sort_keys=True, separators=(',', ':')) + "\n").encode('utf-8')
+
+
+async def run_in_pool(request, pool_name: str, function, *args):
+    # Executa uma funcao bloqueante em um dos pools do app sem bloquear o event loop
+    # (no contexto da requisicao: os tempos das etapas e o perfil de CPU, se houver, incluem a thread do pool)
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        getattr(request.app.state, pool_name), partial(context.run, run_in_request_profile, function, *args)
+    )
+
+
+# ==============================================================
+# ----------------------- Rotas (ASGI) -------------------------
+# ==============================================================
+
+async def upload_files(request):
+    collect_timings = wants_timings(request.query_params.get('timings'))
+    with profile_request('/upload', request.headers.get(PROFILE_HEADER), attach_thread=False) as profile, \
+            request_timer('/upload', collect_timings) as timings:
+        async with request.form() as form:
+            uploaded_files = [item for item in form.getlist('files') if isinstance(item, UploadFile)]
+
+            # Logica para lidar com UPLOAD DE ARQUIVOS (txt, pdf)
+            if uploaded_files:
+                files = [(file.filename or '', file.content_type, await file.read()) for file in uploaded_files]
+
+                # Cada arquivo e extraido em paralelo; a classificacao e feita em lote para o upload inteiro
+                extracted = await asyncio.gather(*(
+                    run_in_pool(request, 'extraction_pool', routes.extract_file_infos, [file]) for file in files
+                ))
+                processed_contents = [file_info for file_infos in extracted for file_info in file_infos]
+                processed_contents = await run_in_pool(request, 'inference_pool', routes.classify_file_infos, processed_contents)
+                payload, status = routes.upload_result(processed_contents)
+
+            # Logica para lidar com TEXTO DIRETO INSERIDO
+            elif 'email_text' in form:
+                payload, status = await run_in_pool(request, 'inference_pool', routes.process_typed_text, form['email_text'])
+
+            else:
+                payload, status = routes.upload_result([])
+
+    if collect_timings:
+        payload['timings_ms'] = timings_ms(timings)
+    return FlaskJSONResponse(payload, status, headers=profile_headers(profile))
+
+
+async def inference_stats(request):
+    return FlaskJSONResponse(routes.stats_payload(), 200)
+
+
+async def prometheus_metrics(request):
+    return Response(routes.metrics_text(), media_type=routes.PROMETHEUS_MIMETYPE)
+
+
+async def readiness(request):
+    status = routes.model_manager.status()
+    return FlaskJSONResponse(status, 200 if status['ready'] else 503)
+
+
+async def reload_model(request):
+    payload, status = routes.reload_model_result(request.headers.get('X-Admin-Token', ''))
+    return FlaskJSONResponse(payload, status)
+
+
+async def create_bulk_job(request):
+    async with request.form() as form:
+        upload = form.get('file')
+        if not isinstance(upload, UploadFile):
+            upload = None
+
+        def save_input(path):
+            # O upload ja esta em um arquivo temporario (SpooledTemporaryFile): copia em blocos
+            upload.file.seek(0)
+            with open(path, 'wb') as f:
+                shutil.copyfileobj(upload.file, f)
+
+        content_length = request.headers.get('content-length')
+        payload, status = await run_in_pool(
+            request, 'extraction_pool', routes.create_bulk_job_result,
+            (upload.filename or '') if upload is not None else '',
+            save_input,
+            int(content_length) if content_length and content_length.isdigit() else None,
+            form.get('format'),
+            form.get('output'),
+            form.get('text_column')
+        )
+    return FlaskJSONResponse(payload, status)
+
+
+async def bulk_job_status(request):
+    payload, status = routes.bulk_job_status_result(request.path_params['job_id'])
+    return FlaskJSONResponse(payload, status)
+
+
+async def resume_bulk_job(request):
+    payload, status = routes.resume_bulk_job_result(request.path_params['job_id'])
+    return FlaskJSONResponse(payload, status)
+
+
+async def bulk_job_results(request):
+    results_file = routes.bulk_job_results_file(request.path_params['job_id'])
+    if results_file is None:
+        return FlaskJSONResponse({'error': 'Resultados não encontrados.'}, 404)
+    path, media_type, download_name = results_file
+    return FileResponse(path, media_type=media_type, filename=download_name)
+
+
+# Fila de classificacao cheia ou modelo ainda carregando -> 503
+async def unavailable(request, error):
+    payload, status, headers = routes.unavailable_result(error)
+    return FlaskJSONResponse(payload, status, headers=headers)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Pools criados em cada worker (depois do fork) e encerrados no shutdown
+    app.state.extraction_pool = ThreadPoolExecutor(max_workers=max(1, ASGI_EXTRACTION_WORKERS), thread_name_prefix="extraction")
+    app.state.inference_pool = ThreadPoolExecutor(max_workers=max(1, ASGI_INFERENCE_WORKERS), thread_name_prefix="inference")
+
+    # Threads do torch do worker (cpu_layout.py) e, fora do event loop, o modelo conforme MODEL_LOADING
+    apply_cpu_layout()
+    await asyncio.get_running_loop().run_in_executor(app.state.inference_pool, routes.model_manager.start)
+
+    try:
+        yield
+    finally:
+        app.state.extraction_pool.shutdown(wait=False, cancel_futures=True)
+        app.state.inference_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def create_asgi_app():
+    return Starlette(
+        routes=[
+            Route('/upload', upload_files, methods=['POST']),
+            Route('/stats', inference_stats, methods=['GET']),
+            Route('/metrics', prometheus_metrics, methods=['GET']),
+            Route('/ready', readiness, methods=['GET']),
+            Route('/admin/reload-model', reload_model, methods=['POST']),
+            Route('/jobs', create_bulk_job, methods=['POST']),
+            Route('/jobs/{job_id}', bulk_job_status, methods=['GET']),
+            Route('/jobs/{job_id}/resume', resume_bulk_job, methods=['POST']),
+            Route('/jobs/{job_id}/results', bulk_job_results, methods=['GET'])
+        ],
+        middleware=[
+            Middleware(CORSMiddleware, allow_origins=[FRONTEND_ORIGIN], allow_methods=["*"], allow_headers=["*"])
+        ],
+        exception_handlers={
+            BatcherFullError: unavailable,
+            ModelNotReadyError: unavailable
+        },
+        lifespan=lifespan
+    )
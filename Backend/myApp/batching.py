@@ -0,0 +1,210 @@
+# ========================================================================
+# ---- Micro-batching entre requisicoes concorrentes (fila em memoria) ---
+# ========================================================================
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError
+
+
+class BatcherFullError(RuntimeError):
+    """
+    Fila do micro-batcher cheia (backpressure). A requisicao deve ser recusada
+    em vez de esperar indefinidamente.
+    """
+
+
+class BatcherTimeoutError(BatcherFullError):
+    """
+    O lote da requisicao nao terminou em `timeout_ms` (fila lenta ou thread do micro-batcher parada).
+    Tratado como a fila cheia: a requisicao e recusada com 503.
+    """
+
+
+class MicroBatcher:
+    """
+    Junta os jobs de requisicoes concorrentes em um unico lote e chama `process_batch`
+    uma vez para todos eles, devolvendo a cada requisicao apenas os seus resultados.
+
+    Um lote e enviado quando atinge `max_batch_size` itens ou quando o primeiro job
+    do lote ja esperou `max_wait_ms`. Se nao houver outro job na fila (trafego leve),
+    o job segue imediatamente, sem latencia extra.
+
+    Cada job pode trazer um `context` (ex: a versao do modelo escolhida pela requisicao):
+    so jobs com o mesmo context vao no mesmo lote, e o lote e processado com ele.
+
+    Uma requisicao espera no max `timeout_ms` pelo seu lote. Se a thread do micro-batcher
+    parar por um erro inesperado, os jobs na fila falham com esse erro (a proxima requisicao
+    cria outra thread).
+    """
+
+    def __init__(self, process_batch, max_batch_size: int = 32, max_wait_ms: float = 5.0, max_queue_size: int = 256,
+                 timeout_ms: float = 30000):
+        # Recebe (lista de itens, context dos jobs) e retorna uma lista de resultados (mesma ordem)
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.timeout = max(0.0, timeout_ms) / 1000
+        self._queue = queue.Queue(maxsize=max(1, max_queue_size))
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+        self._carry = None  # Job que nao coube no lote anterior (vai no proximo)
+
+        # Contadores expostos em /stats
+        self.batches = 0
+        self.jobs = 0
+        self.items = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def submit(self, items: list, context=None) -> list:
+        """
+        Enfileira os itens de uma requisicao e bloqueia ate o lote que os contem ser processado
+        (com o `context` desta requisicao). Levanta BatcherFullError se a fila estiver cheia e
+        BatcherTimeoutError se o lote nao terminar em `timeout_ms`.
+        """
+        if not items:
+            return []
+
+        self._ensure_worker()
+
+        future = Future()
+        try:
+            self._queue.put_nowait((items, future, context))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise BatcherFullError(f"Fila de classificação cheia ({self._queue.maxsize} requisições aguardando).") from None
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel() # Se ainda estiver na fila, o micro-batcher descarta o job
+            with self._lock:
+                self.timed_out += 1
+            raise BatcherTimeoutError(f"Classificação não concluída em {self.timeout * 1000:.0f} ms.") from None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'jobs': self.jobs,
+                'items': self.items,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'queued_jobs': self._queue.qsize(),
+                'avg_items_per_batch': round(self.items / self.batches, 2) if self.batches else 0.0
+            }
+
+    def _ensure_worker(self):
+        # Threads nao sobrevivem a um fork (ex: gunicorn com preload), entao cada processo cria a sua
+        if self._worker_alive():
+            return
+        with self._lock:
+            if self._worker_alive():
+                return
+            self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+
+    def _worker_alive(self) -> bool:
+        return self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive()
+
+    def _next_job(self, timeout: float | None):
+        # Retorna o proximo job (primeiro o que sobrou do lote anterior) ou None se a fila estiver vazia
+        if self._carry is not None:
+            job, self._carry = self._carry, None
+            return job
+        try:
+            if timeout is None:
+                return self._queue.get()
+            if timeout <= 0:
+                return self._queue.get_nowait()
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _run(self):
+        batch = []
+        try:
+            while True:
+                batch = self._collect_batch()
+                self._dispatch(batch, batch[0][2])
+        except Exception as e:
+            # Erro fora de process_batch (ex: ao devolver os resultados): sem isso as requisicoes
+            # na fila so desistiriam no tempo limite. A proxima requisicao cria outra thread
+            print(f"ERRO: A thread do micro-batcher parou: {e}. Os jobs na fila falharam.")
+            self._fail_pending(batch, e)
+
+    def _collect_batch(self) -> list:
+        first_job = self._next_job(timeout=None)
+        batch = [first_job]
+        batch_size = len(first_job[0])
+        context = first_job[2]
+        deadline = time.monotonic() + self.max_wait
+
+        while batch_size < self.max_batch_size:
+            # Primeiro pega o que ja esta na fila; so espera por mais jobs se houver concorrencia
+            job = self._next_job(timeout=0)
+            if job is None:
+                remaining = deadline - time.monotonic()
+                if len(batch) == 1 or remaining <= 0:
+                    break
+                job = self._next_job(timeout=remaining)
+                if job is None:
+                    break
+
+            # Job que nao cabe no lote ou de outro context (ex: depois de uma recarga do modelo) vai no proximo
+            if batch_size + len(job[0]) > self.max_batch_size or job[2] is not context:
+                self._carry = job
+                break
+
+            batch.append(job)
+            batch_size += len(job[0])
+
+        return batch
+
+    def _dispatch(self, batch: list, context):
+        # Jobs cujas requisicoes desistiram (tempo limite) nao sao processados
+        batch = [job for job in batch if job[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        items = [item for job_items, _, _ in batch for item in job_items]
+
+        with self._lock:
+            self.batches += 1
+            self.jobs += len(batch)
+            self.items += len(items)
+
+        try:
+            results = self.process_batch(items, context)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        # Devolve a cada requisicao a sua fatia de resultados
+        start = 0
+        for job_items, future, _ in batch:
+            future.set_result(results[start:start + len(job_items)])
+            start += len(job_items)
+
+    def _fail_pending(self, batch: list, error: Exception):
+        # Falha os jobs do lote atual, o que sobrou do lote anterior e os que estao na fila
+        jobs = list(batch)
+        if self._carry is not None:
+            jobs.append(self._carry)
+            self._carry = None
+        while True:
+            try:
+                jobs.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for _, future, _ in jobs:
+            try:
+                future.set_exception(error)
+            except InvalidStateError:
+                pass # Ja concluido ou cancelado (tempo limite)
@@ -0,0 +1,692 @@
+# ========================================================================
+# ---- Jobs de classificacao em lote (exportacoes de caixas de e-mail) ---
+# ========================================================================
+#
+# Um job recebe um arquivo grande (CSV, mbox, JSONL ou um .zip com esses arquivos e/ou
+# .txt/.eml/.pdf) e classifica as mensagens em background, lendo o arquivo como stream:
+# so um lote de BULK_JOB_BATCH_SIZE mensagens fica em memoria por vez, qualquer que seja o
+# tamanho da exportacao. Os resultados sao gravados no disco a cada lote (JSONL ou CSV).
+#
+# Cada job tem uma pasta em BULK_JOBS_DIR/<job_id>/:
+#   input.<formato> - arquivo enviado
+#   results.<jsonl|csv> - resultados (id, categoria, probabilidades), sem o texto extraido
+#   status.json - progresso; gravado a cada lote junto com o tamanho valido dos resultados
+#
+# Se o worker cair no meio do job, o status fica 'interrupted' e o job pode ser retomado:
+# os resultados sao cortados no ultimo lote registrado e a leitura continua do byte logo depois da
+# ultima mensagem classificada (bytes_read). Em um .zip a leitura recomeca do inicio e as mensagens
+# ja classificadas sao puladas (lidas de novo, inclusive a extracao dos PDFs).
+#
+# Registros invalidos (ex: linha JSONL malformada, sem texto ou acima do limite de linha) sao
+# ignorados e textos acima de BULK_MAX_RECORD_MB sao cortados; o status informa as contagens (skipped_records, truncated_records)
+# e os primeiros registros afetados (record_issues, com o id e o motivo).
+
+import codecs
+import csv
+import email
+import email.policy
+import html
+import io
+import itertools
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+
+from dotenv import load_dotenv
+
+from myApp.batching import BatcherFullError
+from myApp.model_manager import ModelNotReadyError
+from myApp.pdf_extraction import pdf_extractor
+
+load_dotenv()
+
+# Pasta dos jobs (compartilhada pelos workers) e mensagens classificadas por lote
+BULK_JOBS_DIR = os.getenv("BULK_JOBS_DIR", "./bulk_jobs")
+BULK_JOB_BATCH_SIZE = int(os.getenv("BULK_JOB_BATCH_SIZE", 256))
+
+# Jobs rodando ao mesmo tempo por worker e limites de tamanho (arquivo enviado e cada mensagem)
+BULK_MAX_ACTIVE_JOBS = int(os.getenv("BULK_MAX_ACTIVE_JOBS", 2))
+BULK_MAX_UPLOAD_MB = float(os.getenv("BULK_MAX_UPLOAD_MB", 2048))
+BULK_MAX_RECORD_MB = float(os.getenv("BULK_MAX_RECORD_MB", 5))
+
+# Sem atualizacao do status por este tempo (s), um job 'running' e considerado interrompido
+BULK_JOB_STALE_SECONDS = float(os.getenv("BULK_JOB_STALE_SECONDS", 300))
+
+BULK_INPUT_FORMATS = ('csv', 'mbox', 'jsonl', 'zip')
+BULK_OUTPUT_FORMATS = ('jsonl', 'csv')
+
+# Extensoes aceitas para deduzir o formato do arquivo enviado
+_INPUT_EXTENSIONS = {'.csv': 'csv', '.mbox': 'mbox', '.mbx': 'mbox', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.zip': 'zip'}
+
+# Colunas (CSV) ou campos (JSONL) procurados quando text_column nao e informado
+_TEXT_COLUMNS = ('text', 'email_text', 'email', 'body', 'message', 'content', 'texto', 'mensagem', 'corpo')
+_ID_COLUMNS = ('id', 'message_id', 'message-id', 'email_id')
+
+_JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+_HTML_TAG_PATTERN = re.compile(r'<[^>]*>')
+
+# Espera entre tentativas quando o modelo esta carregando ou a fila de classificacao esta cheia
+_RETRY_SECONDS = 1.0
+
+# Registros problematicos listados no status do job (os demais so entram nas contagens)
+MAX_REPORTED_RECORD_ISSUES = 100
+
+# Motivos de registros ignorados (nao classificados) ou truncados (texto cortado em max_record_bytes)
+RECORD_SKIPPED_REASONS = ('invalid_json', 'unsupported_record', 'missing_text', 'line_too_long')
+RECORD_TRUNCATED = 'truncated'
+
+# Uma linha JSONL pode ter ate este multiplo de max_record_bytes (escapes do JSON e outros campos);
+# linhas maiores sao ignoradas sem ficar inteiras em memoria
+JSONL_LINE_FACTOR = 2
+
+
+class BulkJobError(ValueError):
+    """
+    Pedido de job invalido (formato, coluna ou arquivo). Vira uma resposta 400.
+    """
+
+
+class BulkJobsBusyError(RuntimeError):
+    """
+    Limite de jobs simultaneos do worker atingido. Vira uma resposta 503.
+    """
+
+
+# ==============================================================
+# --------- Leitura das mensagens (stream, sem carregar tudo) --------
+# ==============================================================
+
+def _column_index(header: list[str], column: str | None, candidates: tuple) -> int | None:
+    normalized = [name.strip().lower() for name in header]
+    if column:
+        if column.strip().lower() not in normalized:
+            raise BulkJobError(f"Coluna '{column}' nao encontrada (colunas: {', '.join(header)}).")
+        return normalized.index(column.strip().lower())
+    for candidate in candidates:
+        if candidate in normalized:
+            return normalized.index(candidate)
+    return None
+
+
+def _ignore_issue(record_id: str, reason: str):
+    pass
+
+
+class RecordCursor:
+    """
+    Posicao do leitor logo depois da ultima mensagem gerada: `offset` (bytes do arquivo) e `number`
+    (linhas/mensagens ja lidas, base dos ids sequenciais). Os leitores de CSV, JSONL e mbox a
+    atualizam a cada mensagem e, se ela vier preenchida, continuam dali com seek().
+    """
+
+    def __init__(self, offset: int = 0, number: int = 0):
+        self.offset = offset
+        self.number = number
+
+
+def _read_line(stream, limit: int) -> tuple[bytes, int]:
+    # Le uma linha de ate `limit` bytes; o resto de uma linha maior e descartado sem ir para a memoria.
+    # Retorna (linha, bytes consumidos do arquivo)
+    line = stream.readline(limit)
+    while line and not line.endswith(b'\n') and len(line) < limit:
+        rest = stream.readline(limit - len(line)) # Alguns streams leem menos (ou mais, no .zip) que o limite
+        if not rest:
+            break
+        line += rest
+    consumed = len(line)
+    if len(line) >= limit and not line.endswith(b'\n'):
+        while True:
+            rest = stream.readline(limit)
+            consumed += len(rest)
+            if not rest or rest.endswith(b'\n'):
+                break
+    return line, consumed
+
+
+def _truncate_text(text: str, max_record_bytes: int) -> tuple[str, bool]:
+    # Corta o texto em max_record_bytes bytes (UTF-8), sem partir um caractere
+    if len(text) * 4 <= max_record_bytes:
+        return text, False # Nao passa do limite nem com 4 bytes por caractere
+    data = text.encode('utf-8')
+    if len(data) <= max_record_bytes:
+        return text, False
+    return data[:max_record_bytes].decode('utf-8', errors='ignore'), True
+
+
+def _read_csv(stream, text_column: str | None, max_record_bytes: int, on_issue=_ignore_issue, cursor=None):
+    # Uma mensagem por linha; o texto vem de text_column (ou da primeira coluna conhecida/primeira coluna)
+    csv.field_size_limit(max(csv.field_size_limit(), max_record_bytes))
+    cursor = cursor or RecordCursor()
+    offset = [0] # Bytes ja entregues ao csv.reader (ele nao le alem da linha que fecha o registro)
+
+    def lines():
+        while line := stream.readline():
+            offset[0] += len(line)
+            if offset[0] == len(line):
+                line = line.removeprefix(codecs.BOM_UTF8)
+            yield line.decode('utf-8', errors='replace')
+
+    reader = csv.reader(lines())
+    header = next(reader, None)
+    if header is None:
+        return
+    text_index = _column_index(header, text_column, _TEXT_COLUMNS)
+    text_index = 0 if text_index is None else text_index
+    id_index = _column_index(header, None, _ID_COLUMNS)
+
+    if cursor.offset > offset[0]:
+        # Retomada: o cabecalho ja foi lido, continua depois da ultima linha classificada
+        stream.seek(cursor.offset)
+        offset[0] = cursor.offset
+        reader = csv.reader(lines())
+
+    row_number = cursor.number
+    for row in reader:
+        row_number += 1
+        cursor.offset, cursor.number = offset[0], row_number
+        if not row:
+            continue
+        record_id = row[id_index] if id_index is not None and id_index < len(row) else str(row_number)
+        yield record_id, row[text_index] if text_index < len(row) else ''
+
+
+def _read_jsonl(stream, text_column: str | None, max_record_bytes: int, on_issue=_ignore_issue, cursor=None):
+    # Um objeto JSON (ou uma string) por linha. A linha e lida inteira ate JSONL_LINE_FACTOR * max_record_bytes
+    # (so o texto extraido e cortado em max_record_bytes); linhas invalidas, sem texto ou maiores que
+    # isso sao ignoradas e informadas em on_issue
+    cursor = cursor or RecordCursor()
+    max_line_bytes = JSONL_LINE_FACTOR * max_record_bytes
+    if cursor.offset:
+        stream.seek(cursor.offset)
+    offset, line_number = cursor.offset, cursor.number
+
+    while True:
+        line, consumed = _read_line(stream, max_line_bytes + 1)
+        if not consumed:
+            break
+        offset += consumed
+        line_number += 1
+        cursor.offset, cursor.number = offset, line_number
+
+        if consumed > max_line_bytes:
+            on_issue(str(line_number), 'line_too_long')
+            continue
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            on_issue(str(line_number), 'invalid_json')
+            continue
+
+        if isinstance(record, str):
+            record_id, text = str(line_number), record
+        elif isinstance(record, dict):
+            fields = {str(key).lower(): value for key, value in record.items()}
+            text_key = text_column.lower() if text_column else next((key for key in _TEXT_COLUMNS if key in fields), None)
+            id_key = next((key for key in _ID_COLUMNS if key in fields), None)
+            record_id = str(fields[id_key]) if id_key else str(line_number)
+            text = fields.get(text_key) if text_key else None
+            if not isinstance(text, str):
+                on_issue(record_id, 'missing_text')
+                continue
+        else:
+            on_issue(str(line_number), 'unsupported_record')
+            continue
+
+        text, truncated = _truncate_text(text, max_record_bytes)
+        if truncated:
+            on_issue(record_id, RECORD_TRUNCATED)
+        yield record_id, text
+
+
+def _message_text(message) -> str:
+    # Corpo de texto da mensagem (texto puro ou, na falta dele, HTML sem as tags)
+    body = message.get_body(preferencelist=('plain', 'html'))
+    if body is None:
+        return ''
+    try:
+        content = body.get_content()
+    except (LookupError, UnicodeError, AssertionError):
+        content = (body.get_payload(decode=True) or b'').decode('utf-8', errors='replace')
+    if body.get_content_type() == 'text/html':
+        content = html.unescape(_HTML_TAG_PATTERN.sub(' ', content))
+    return content
+
+
+def _parse_message(data: bytes, record_id: str) -> tuple[str, str]:
+    message = email.message_from_bytes(data, policy=email.policy.default)
+    try:
+        message_id = (message.get('Message-ID') or '').strip()
+    except (TypeError, ValueError):
+        message_id = ''
+    return message_id or record_id, _message_text(message)
+
+
+def _read_mbox(stream, text_column: str | None, max_record_bytes: int, on_issue=_ignore_issue, cursor=None):
+    # Le uma mensagem por vez: cada mensagem comeca em uma linha 'From ' (partes acima do limite sao descartadas).
+    # Linhas longas sao lidas em pedacos de ate max_record_bytes: a memoria fica limitada a uma mensagem
+    cursor = cursor or RecordCursor()
+    if cursor.offset:
+        stream.seek(cursor.offset) # Sempre o inicio de uma linha 'From '
+    offset, index = cursor.offset, cursor.number
+    lines, size, truncated = None, 0, False
+    line_start, skip_line = True, False
+
+    while line := stream.readline(max_record_bytes + 1):
+        line_offset = offset
+        offset += len(line)
+        at_line_start, line_start = line_start, line.endswith(b'\n')
+        if not at_line_start:
+            if skip_line:
+                continue # Resto de uma linha 'From ' longa
+        elif line.startswith(b'From '):
+            if lines is not None:
+                index += 1
+                record_id, text = _parse_message(b''.join(lines), str(index))
+                if truncated:
+                    on_issue(record_id, RECORD_TRUNCATED)
+                cursor.offset, cursor.number = line_offset, index
+                yield record_id, text
+            lines, size, truncated, skip_line = [], 0, False, True
+            continue
+        else:
+            skip_line = False
+            if line.startswith(b'>') and line.lstrip(b'>').startswith(b'From '):
+                line = line[1:] # Linha do corpo escapada no formato mbox ('>From ')
+
+        if lines is None:
+            continue
+        if size + len(line) > max_record_bytes:
+            line = line[:max_record_bytes - size]
+            truncated = True
+        if line:
+            lines.append(line)
+            size += len(line)
+
+    if lines is not None:
+        index += 1
+        record_id, text = _parse_message(b''.join(lines), str(index))
+        if truncated:
+            on_issue(record_id, RECORD_TRUNCATED)
+        cursor.offset, cursor.number = offset, index
+        yield record_id, text
+
+
+def _read_zip(stream, text_column: str | None, max_record_bytes: int, on_issue=_ignore_issue, cursor=None):
+    # Cada arquivo do .zip: CSV/mbox/JSONL (varias mensagens) ou .txt/.eml/.pdf (uma mensagem).
+    # Sem retomada por posicao (cursor e ignorado): os arquivos de dentro nao tem um offset proprio
+    with zipfile.ZipFile(stream) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or info.filename.startswith('__MACOSX/'):
+                continue
+            extension = os.path.splitext(info.filename)[1].lower()
+            input_format = _INPUT_EXTENSIONS.get(extension)
+
+            with archive.open(info) as entry:
+                if input_format in ('csv', 'mbox', 'jsonl'):
+                    entry_issue = lambda record_id, reason, name=info.filename: on_issue(f"{name}:{record_id}", reason)
+                    for record_id, text in _RECORD_READERS[input_format](entry, text_column, max_record_bytes, entry_issue):
+                        yield f"{info.filename}:{record_id}", text
+                elif extension in ('.txt', '.eml'):
+                    data = entry.read(max_record_bytes + 1)
+                    if len(data) > max_record_bytes:
+                        data = data[:max_record_bytes]
+                        on_issue(info.filename, RECORD_TRUNCATED)
+                    if extension == '.txt':
+                        yield info.filename, data.decode('utf-8', errors='replace')
+                    else:
+                        yield info.filename, _parse_message(data, info.filename)[1]
+                elif extension == '.pdf':
+                    # Mesmos limites de tamanho/paginas/tempo do /upload (pdf_extraction.py)
+                    yield info.filename, pdf_extractor.extract_text(entry.read(pdf_extractor.max_bytes + 1))
+
+
+_RECORD_READERS = {'csv': _read_csv, 'mbox': _read_mbox, 'jsonl': _read_jsonl, 'zip': _read_zip}
+
+
+def input_format_for(filename: str) -> str:
+    # Formato deduzido pela extensao do arquivo ('' se desconhecida)
+    return _INPUT_EXTENSIONS.get(os.path.splitext(filename or '')[1].lower(), '')
+
+
+def read_records(stream, input_format: str, text_column: str | None = None, max_record_bytes: int | None = None,
+                 on_issue=None, cursor: RecordCursor | None = None):
+    """
+    Gera (id, texto) para cada mensagem do arquivo, na ordem do arquivo (sempre a mesma).
+    `on_issue(id, motivo)` e chamado para registros ignorados (RECORD_SKIPPED_REASONS, nao sao
+    gerados) e para textos cortados em max_record_bytes (RECORD_TRUNCATED, gerados cortados).
+
+    Com `cursor` (CSV, JSONL e mbox), a leitura comeca em `cursor.offset` e o cursor acompanha a
+    posicao logo depois de cada mensagem gerada: basta guarda-lo para retomar dali. Em um .zip o
+    cursor nao e usado; para retomar, pule as mensagens ja classificadas.
+    """
+    if input_format not in _RECORD_READERS:
+        raise BulkJobError(f"Formato de entrada '{input_format}' invalido (opcoes: {', '.join(BULK_INPUT_FORMATS)}).")
+    max_record_bytes = max_record_bytes or int(BULK_MAX_RECORD_MB * 1024 * 1024)
+    return _RECORD_READERS[input_format](stream, text_column, max_record_bytes, on_issue or _ignore_issue, cursor)
+
+
+# ==============================================================
+# ----------- Gravacao dos resultados (JSONL ou CSV) -----------
+# ==============================================================
+
+def _csv_lines(rows: list[list]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode('utf-8')
+
+
+def results_header(output_format: str, labels: list[str]) -> bytes:
+    # Cabecalho do CSV (uma coluna de probabilidade por categoria); JSONL nao tem cabecalho
+    if output_format == 'csv':
+        return _csv_lines([['id', 'category'] + [f'prob_{label}' for label in labels]])
+    return b''
+
+
+def format_results(output_format: str, labels: list[str], batch: list[tuple[str, str]], results: list) -> bytes:
+    """
+    Linhas de resultado de um lote: `batch` tem (id, texto) e `results` (categoria, probabilidades).
+    """
+    if output_format == 'csv':
+        rows = []
+        for (record_id, _), (category, probabilities) in zip(batch, results):
+            probabilities = probabilities if isinstance(probabilities, list) else [''] * len(labels)
+            rows.append([record_id, category] + list(probabilities))
+        return _csv_lines(rows)
+
+    return ''.join(
+        json.dumps({'id': record_id, 'category': category, 'probabilities': probabilities}, ensure_ascii=False) + '\n'
+        for (record_id, _), (category, probabilities) in zip(batch, results)
+    ).encode('utf-8')
+
+
+# ==============================================================
+# ------------------- Gerenciador de jobs ---------------------
+# ==============================================================
+
+class BulkJobManager:
+    """
+    Cria, executa (em threads do worker), acompanha e retoma jobs de classificacao em lote.
+    `classify` recebe uma lista de textos e retorna (categoria, probabilidades) na mesma ordem.
+    O status fica no disco, entao qualquer worker responde pelo progresso de qualquer job.
+    """
+
+    def __init__(self, classify, labels: list[str], jobs_dir: str = BULK_JOBS_DIR, batch_size: int = BULK_JOB_BATCH_SIZE,
+                 max_active_jobs: int = BULK_MAX_ACTIVE_JOBS, stale_seconds: float = BULK_JOB_STALE_SECONDS,
+                 max_record_bytes: int = int(BULK_MAX_RECORD_MB * 1024 * 1024)):
+        self.classify = classify
+        self.labels = list(labels)
+        self.jobs_dir = jobs_dir
+        self.batch_size = max(1, batch_size)
+        self.max_active_jobs = max(1, max_active_jobs)
+        self.stale_seconds = stale_seconds
+        self.max_record_bytes = max_record_bytes
+
+        self._threads = {} # job_id -> thread do job neste processo
+        self._lock = threading.Lock()
+
+    # --- API usada pelas rotas ---
+
+    def create_job(self, filename: str, save_input, input_format: str | None = None,
+                   output_format: str | None = None, text_column: str | None = None) -> dict:
+        """
+        Grava o arquivo enviado com `save_input(caminho)` e inicia o job em background.
+        Levanta BulkJobError (pedido invalido) ou BulkJobsBusyError (worker cheio).
+        """
+        input_format = (input_format or input_format_for(filename)).strip().lower()
+        output_format = (output_format or 'jsonl').strip().lower()
+        if input_format not in BULK_INPUT_FORMATS:
+            raise BulkJobError(f"Formato de entrada nao reconhecido para '{filename}' (opcoes: {', '.join(BULK_INPUT_FORMATS)}).")
+        if output_format not in BULK_OUTPUT_FORMATS:
+            raise BulkJobError(f"Formato de saida '{output_format}' invalido (opcoes: {', '.join(BULK_OUTPUT_FORMATS)}).")
+        if self._active_jobs() >= self.max_active_jobs:
+            raise BulkJobsBusyError(f"Limite de {self.max_active_jobs} jobs simultaneos atingido.")
+
+        job_id = uuid.uuid4().hex
+        os.makedirs(self._job_dir(job_id))
+        input_path = self._input_path(job_id, input_format)
+        save_input(input_path)
+
+        input_bytes = os.path.getsize(input_path)
+        try:
+            if input_bytes > BULK_MAX_UPLOAD_MB * 1024 * 1024:
+                raise BulkJobError(f"Arquivo excede o tamanho máximo permitido ({BULK_MAX_UPLOAD_MB:.0f} MB).")
+            if input_format == 'csv' and text_column:
+                # Confere a coluna no cabecalho antes de aceitar o job
+                with open(input_path, 'rb') as input_file:
+                    next(read_records(input_file, input_format, text_column, self.max_record_bytes), None)
+        except BulkJobError:
+            shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+            raise
+
+        now = time.time()
+        status = {
+            'job_id': job_id,
+            'state': 'queued',
+            'filename': filename,
+            'input_format': input_format,
+            'output_format': output_format,
+            'text_column': text_column or None,
+            'input_bytes': input_bytes,
+            'bytes_read': 0,
+            'records_read': 0,
+            'processed': 0,
+            'output_bytes': 0,
+            'categories': {},
+            'skipped_records': 0,
+            'truncated_records': 0,
+            'record_issues': [],
+            'error': None,
+            'created_at': round(now, 3),
+            'started_at': None,
+            'updated_at': round(now, 3),
+            'finished_at': None,
+            'run_id': None,
+            'pid': None
+        }
+        self._write_status(job_id, status)
+        return self._start(job_id, status)
+
+    def status(self, job_id: str) -> dict | None:
+        status = self._read_status(job_id)
+        if status is None:
+            return None
+        if status['state'] in ('queued', 'running') and not self._is_alive(job_id, status):
+            status['state'] = 'interrupted'
+        status['progress'] = round(status['bytes_read'] / status['input_bytes'], 4) if status['input_bytes'] else 1.0
+        return status
+
+    def resume(self, job_id: str) -> tuple[bool, dict | None]:
+        """
+        Retoma um job interrompido ou que falhou, a partir do ultimo lote gravado.
+        Retorna (iniciou, status); nao inicia jobs em andamento ou ja concluidos.
+        """
+        status = self.status(job_id)
+        if status is None or status['state'] not in ('interrupted', 'failed'):
+            return False, status
+        if self._active_jobs() >= self.max_active_jobs:
+            raise BulkJobsBusyError(f"Limite de {self.max_active_jobs} jobs simultaneos atingido.")
+        status['error'] = None
+        return True, self._start(job_id, status)
+
+    def results_path(self, job_id: str) -> str | None:
+        status = self._read_status(job_id)
+        if status is None:
+            return None
+        path = self._results_path(job_id, status['output_format'])
+        return path if os.path.exists(path) else None
+
+    # --- Execucao ---
+
+    def _start(self, job_id: str, status: dict) -> dict:
+        # Cada execucao tem um run_id: se outro worker retomar o job, esta execucao para
+        run_id = uuid.uuid4().hex
+        status.update(state='running', run_id=run_id, pid=os.getpid(), updated_at=round(time.time(), 3))
+        status['started_at'] = status['started_at'] or status['updated_at']
+        self._write_status(job_id, status)
+
+        thread = threading.Thread(target=self._run, args=(job_id, run_id), name=f"bulk-job-{job_id[:8]}", daemon=True)
+        with self._lock:
+            self._threads[job_id] = thread
+        thread.start()
+        return self.status(job_id)
+
+    def _run(self, job_id: str, run_id: str):
+        status = self._read_status(job_id)
+        input_path = self._input_path(job_id, status['input_format'])
+        results_path = self._results_path(job_id, status['output_format'])
+        print(f"--- Job {job_id}: classificando '{status['filename']}' (a partir da mensagem {status['processed']}) ---")
+
+        try:
+            with open(input_path, 'rb') as input_file, open(results_path, 'ab') as results_file:
+                # Descarta resultados gravados depois do ultimo lote registrado (execucao interrompida)
+                results_file.truncate(status['output_bytes'])
+                if status['output_bytes'] == 0:
+                    results_file.write(results_header(status['output_format'], self.labels))
+
+                # CSV/JSONL/mbox continuam do byte depois da ultima mensagem classificada (bytes_read).
+                # No .zip (e em status sem records_read) a leitura recomeca e as ja classificadas sao puladas
+                seekable = status['input_format'] != 'zip' and 'records_read' in status
+                cursor = RecordCursor(status['bytes_read'], status['records_read']) if seekable else None
+                resume_from = 0 if seekable else status['processed']
+                position = [0] # Mensagens geradas pelo leitor nesta execucao
+
+                # Registros ignorados/truncados entram no status junto com o lote que os leu (o mesmo
+                # checkpoint); os anteriores ao ponto de parada ja foram contados pela execucao anterior
+                pending_issues = []
+
+                def on_issue(record_id, reason):
+                    if position[0] >= resume_from:
+                        pending_issues.append((record_id, reason))
+
+                def counted(records):
+                    for record in records:
+                        yield record
+                        position[0] += 1
+
+                records = counted(read_records(input_file, status['input_format'], status['text_column'],
+                                               self.max_record_bytes, on_issue, cursor))
+                records = itertools.islice(records, resume_from, None)
+
+                while True:
+                    batch = list(itertools.islice(records, self.batch_size))
+                    if not batch:
+                        break
+
+                    results = self._classify_batch(job_id, run_id, status, [text for _, text in batch])
+                    if results is None:
+                        return self._forget(job_id) # Outro worker assumiu o job
+                    results_file.write(format_results(status['output_format'], self.labels, batch, results))
+                    results_file.flush()
+                    os.fsync(results_file.fileno())
+
+                    status['processed'] += len(batch)
+                    status['output_bytes'] = results_file.tell()
+                    if cursor is not None:
+                        status['bytes_read'], status['records_read'] = cursor.offset, cursor.number
+                    else:
+                        status['bytes_read'] = input_file.tell() # .zip: so uma estimativa do progresso
+                    for record_id, reason in pending_issues:
+                        self._record_issue(status, record_id, reason)
+                    pending_issues.clear()
+                    for category, _ in results:
+                        status['categories'][category] = status['categories'].get(category, 0) + 1
+                    if not self._checkpoint(job_id, run_id, status):
+                        return self._forget(job_id)
+
+            for record_id, reason in pending_issues: # Registros invalidos depois da ultima mensagem
+                self._record_issue(status, record_id, reason)
+            status.update(state='completed', bytes_read=status['input_bytes'], finished_at=round(time.time(), 3))
+            print(f"--- Job {job_id} concluido: {status['processed']} mensagens classificadas "
+                  f"({status.get('skipped_records', 0)} ignoradas, {status.get('truncated_records', 0)} truncadas) ---")
+
+        except Exception as e:
+            print(f"ERRO: Job {job_id} falhou: {e}")
+            status.update(state='failed', error=str(e))
+
+        self._checkpoint(job_id, run_id, status)
+        self._forget(job_id)
+
+    def _record_issue(self, status: dict, record_id: str, reason: str):
+        # Contagens no status e os primeiros MAX_REPORTED_RECORD_ISSUES registros com o motivo
+        counter = 'truncated_records' if reason == RECORD_TRUNCATED else 'skipped_records'
+        status[counter] = status.get(counter, 0) + 1
+        issues = status.setdefault('record_issues', [])
+        if len(issues) < MAX_REPORTED_RECORD_ISSUES:
+            issues.append({'id': record_id, 'reason': reason})
+
+    def _forget(self, job_id: str):
+        with self._lock:
+            self._threads.pop(job_id, None)
+
+    def _classify_batch(self, job_id: str, run_id: str, status: dict, texts: list[str]):
+        # Espera o modelo carregar (MODEL_LOADING=background) ou a fila do micro-batcher esvaziar
+        while True:
+            try:
+                results = self.classify(texts)
+            except (ModelNotReadyError, BatcherFullError):
+                time.sleep(_RETRY_SECONDS)
+                if not self._checkpoint(job_id, run_id, status):
+                    return None
+                continue
+            if any(category == "Erro de IA" for category, _ in results):
+                raise RuntimeError("Modelo ou tokenizador não carregados.")
+            return results
+
+    def _checkpoint(self, job_id: str, run_id: str, status: dict) -> bool:
+        # Grava o progresso (e o heartbeat); retorna False se outra execucao assumiu o job
+        current = self._read_status(job_id)
+        if current is None or current.get('run_id') != run_id:
+            print(f"AVISO: Job {job_id} foi retomado por outro worker. Esta execucao foi encerrada.")
+            return False
+        status['updated_at'] = round(time.time(), 3)
+        self._write_status(job_id, status)
+        return True
+
+    # --- Estado ---
+
+    def _active_jobs(self) -> int:
+        with self._lock:
+            for job_id in [job_id for job_id, thread in self._threads.items() if not thread.is_alive()]:
+                del self._threads[job_id]
+            return len(self._threads)
+
+    def _is_alive(self, job_id: str, status: dict) -> bool:
+        if status.get('pid') == os.getpid():
+            with self._lock:
+                thread = self._threads.get(job_id)
+            return thread is not None and thread.is_alive()
+        # Job de outro worker: vivo enquanto o status continuar sendo atualizado
+        return time.time() - status['updated_at'] < self.stale_seconds
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, job_id)
+
+    def _input_path(self, job_id: str, input_format: str) -> str:
+        return os.path.join(self._job_dir(job_id), f"input.{input_format}")
+
+    def _results_path(self, job_id: str, output_format: str) -> str:
+        return os.path.join(self._job_dir(job_id), f"results.{output_format}")
+
+    def _read_status(self, job_id: str) -> dict | None:
+        if not _JOB_ID_PATTERN.match(job_id or ''):
+            return None
+        try:
+            with open(os.path.join(self._job_dir(job_id), 'status.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_status(self, job_id: str, status: dict):
+        # Grava em um arquivo temporario e troca: quem le nunca ve um status pela metade
+        path = os.path.join(self._job_dir(job_id), 'status.json')
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(status, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
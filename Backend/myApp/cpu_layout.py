@@ -0,0 +1,145 @@
+# ========================================================================
+# ---- Paralelismo da CPU por worker (threads do torch e afinidade) ------
+# ========================================================================
+#
+# Por padrao cada worker do Gunicorn usa todos os nucleos no paralelismo intra-op do torch:
+# com N workers na mesma maquina sao N x nucleos threads disputando a CPU (oversubscription),
+# o que piora a latencia de cauda. Aqui o servidor define, por worker:
+#   TORCH_INTRA_OP_THREADS - threads de cada operacao (auto = nucleos disponiveis / workers)
+#   TORCH_INTER_OP_THREADS - threads entre operacoes independentes (auto = 1: a inferencia nao usa)
+#   CPU_AFFINITY           - fixa cada worker em um conjunto proprio de nucleos (so com Gunicorn,
+#                            que numera os workers; veja pre_fork/post_fork no gunicorn.conf.py)
+# Os conjuntos de nucleos seguem os nos NUMA (/sys/devices/system/node): um worker so ocupa
+# nucleos de mais de um no quando ha mais nucleos por worker do que nucleos por no.
+# O melhor layout para a maquina: python util/benchmark_cpu_layout.py
+
+import glob
+import os
+import re
+
+import torch
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Threads do torch por worker: auto | num | vazio (padrao do torch)
+TORCH_INTRA_OP_THREADS = os.getenv("TORCH_INTRA_OP_THREADS", "auto").strip().lower()
+TORCH_INTER_OP_THREADS = os.getenv("TORCH_INTER_OP_THREADS", "auto").strip().lower()
+
+# Fixa cada worker em um conjunto de nucleos (Linux)
+CPU_AFFINITY = os.getenv("CPU_AFFINITY", "False").lower() == "true"
+
+# Num de workers que dividem os nucleos (padrao: GUNICORN_WORKERS)
+CPU_LAYOUT_WORKERS = max(1, int(os.getenv("CPU_LAYOUT_WORKERS") or os.getenv("GUNICORN_WORKERS") or 1))
+
+# Processo em que o layout ja foi aplicado (o post_fork do Gunicorn aplica antes do create_app)
+_applied_pid = None
+
+
+def available_cores() -> list[int]:
+    # Nucleos que o processo pode usar (respeita cpusets/taskset); fora do Linux, todos
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def parse_cpu_list(cpu_list: str) -> list[int]:
+    # Formato do kernel: "0-3,8-11"
+    cores = []
+    for part in cpu_list.strip().split(','):
+        if '-' in part:
+            start, end = part.split('-')
+            cores.extend(range(int(start), int(end) + 1))
+        elif part:
+            cores.append(int(part))
+    return cores
+
+
+def numa_nodes() -> list[list[int]]:
+    # Nucleos de cada no NUMA (vazio se o sistema nao expoe a topologia)
+    nodes = []
+    paths = glob.glob('/sys/devices/system/node/node[0-9]*/cpulist')
+    for path in sorted(paths, key=lambda p: int(re.search(r'node(\d+)', p).group(1))):
+        try:
+            with open(path) as f:
+                nodes.append(parse_cpu_list(f.read()))
+        except (OSError, ValueError):
+            return []
+    return nodes
+
+
+def core_sets(cores: list[int], workers: int, nodes: list[list[int]] | None = None) -> list[list[int]]:
+    """
+    Divide `cores` em `workers` conjuntos contiguos (um por worker), na ordem dos nos NUMA.
+    Com mais workers que nucleos, os nucleos sao compartilhados (um por worker, em rodizio).
+    """
+    workers = max(1, workers)
+    available = set(cores)
+    ordered = [core for node in (numa_nodes() if nodes is None else nodes) for core in node if core in available]
+    in_nodes = set(ordered)
+    ordered += [core for core in cores if core not in in_nodes]
+
+    sets = []
+    for i in range(workers):
+        start, end = i * len(ordered) // workers, (i + 1) * len(ordered) // workers
+        sets.append(ordered[start:end] or [ordered[i % len(ordered)]])
+    return sets
+
+
+def resolve_threads(value: str, auto_value: int) -> int | None:
+    # auto -> auto_value | num -> num | vazio ou invalido -> None (mantem o padrao do torch)
+    if value == 'auto':
+        return max(1, auto_value)
+    if value.isdigit() and int(value) > 0:
+        return int(value)
+    if value:
+        print(f"AVISO: Valor de threads '{value}' invalido (use auto ou um numero). Mantendo o padrao do torch.")
+    return None
+
+
+def apply_cpu_layout(slot: int | None = None, workers: int = CPU_LAYOUT_WORKERS) -> dict:
+    """
+    Aplica o layout no processo atual: afinidade (com `slot` e CPU_AFFINITY) e num de threads
+    do torch. Chamado no post_fork do Gunicorn (com o num do worker) e no create_app (sem slot;
+    nao faz nada se o post_fork ja aplicou neste processo). Deve rodar antes da carga do modelo
+    (o backend onnx le o num de threads do torch ao criar a sessao).
+    """
+    global _applied_pid
+    if _applied_pid == os.getpid():
+        return {}
+
+    cores = available_cores()
+    pinned_cores = None
+    if CPU_AFFINITY and slot is not None and hasattr(os, 'sched_setaffinity'):
+        pinned_cores = core_sets(cores, workers)[slot % max(1, workers)]
+        try:
+            os.sched_setaffinity(0, pinned_cores)
+        except OSError as e:
+            print(f"AVISO: Nao foi possivel fixar o worker {slot} nos nucleos {pinned_cores}: {e}")
+            pinned_cores = None
+
+    intra_op = resolve_threads(TORCH_INTRA_OP_THREADS, len(pinned_cores) if pinned_cores else len(cores) // max(1, workers))
+    inter_op = resolve_threads(TORCH_INTER_OP_THREADS, 1)
+
+    if intra_op is not None:
+        torch.set_num_threads(intra_op)
+        # Tokenizacao em lote (tokenizers/rayon) com o mesmo limite, se o pool ainda nao foi criado
+        os.environ.setdefault('RAYON_NUM_THREADS', str(intra_op))
+    if inter_op is not None and torch.get_num_interop_threads() != inter_op:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError as e:
+            # So pode ser definido uma vez, antes de qualquer trabalho inter-op no processo
+            print(f"AVISO: Nao foi possivel definir TORCH_INTER_OP_THREADS={inter_op}: {e}")
+
+    _applied_pid = os.getpid()
+    layout = {
+        'slot': slot,
+        'cores': pinned_cores,
+        'intra_op_threads': torch.get_num_threads(),
+        'inter_op_threads': torch.get_num_interop_threads()
+    }
+    print(f"Layout da CPU (worker {slot if slot is not None else '-'}, pid {os.getpid()}): "
+          f"{layout['intra_op_threads']} thread(s) intra-op, {layout['inter_op_threads']} inter-op, "
+          f"nucleos: {pinned_cores if pinned_cores else 'todos os ' + str(len(cores))}")
+    return layout
@@ -2,29 +2,119 @@
 # ----------Responsavel pela limpeza e pre-processamento de dados de emails-------------
 # ======================================================================================
 
+import hashlib
+import json
 import os
 import re
+import threading
+import zlib
 import pandas as pd
-import torch
 
-from torch.utils.data import Dataset, DataLoader
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from transformers import AutoTokenizer
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Processos usados na limpeza/tokenizacao dos datasets ("auto" = todos os nucleos)
+PREPROCESS_WORKERS = os.getenv("PREPROCESS_WORKERS", "1")
+# Num de amostras por bloco enviado a cada processo
+PREPROCESS_CHUNK_SIZE = int(os.getenv("PREPROCESS_CHUNK_SIZE", 10000))
+# Cache do resultado de prepare_data_for_ia entre execucoes do treino (vazio desativa)
+TOKENIZATION_CACHE_DIR = os.getenv("TOKENIZATION_CACHE_DIR", "./prepared_dataset/tokenization_cache")
+# Modo incremental: so limpa/tokeniza as linhas novas ou alteradas dos CSVs (requer TOKENIZATION_CACHE_DIR)
+INCREMENTAL_PREPROCESSING = os.getenv("INCREMENTAL_PREPROCESSING", "False").lower() == "true"
+
+# Versao da limpeza (EmailPreprocessor.clean_text). Incremente ao mudar a saida da limpeza
+# para invalidar os caches de tokenizacao gravados com a versao anterior
+PREPROCESSOR_VERSION = "2"
+
+# Mapeamento de categorias - string para numericas (0, 1)
+CATEGORY_MAPPING = {
+    'Produtivo': 0,
+    'Improdutivo': 1,
+}
+
+
+# =============================================================================
+# ------------- Padroes de limpeza (compilados uma unica vez) -----------------
+# =============================================================================
+
+# 'https' ja e coberto por 'http\S+' (mesmo resultado de 'http\S+|www\S+|https\S+')
+_URL_PATTERN = re.compile(r'(?:http|www)\S+')
+_EMAIL_ADDRESS_PATTERN = re.compile(r'\S*@\S*\s?')
+
+# Padroes comuns de inicio de linha de cabecalho (case-insensitive e com espacos no inicio)
+_HEADER_PATTERN = re.compile(
+    r'^(Message-ID|Date|From|To|Subject|Cc|Bcc|Mime-Version|Content-Type|Content-Transfer-Encoding|X-From|X-To|X-cc|X-bcc|X-Folder|X-Origin|X-FileName):',
+    re.IGNORECASE
+)
+# Maior cabecalho do padrao ('Content-Transfer-Encoding:'): com essa quantidade de caracteres a linha ja e decidida
+_HEADER_MAX_LENGTH = len('Content-Transfer-Encoding:')
+
+# Padroes de assinatura/avisos legais, em ordem de prioridade: o texto e cortado na primeira
+# ocorrencia do primeiro padrao (na ordem da lista) que aparecer em qualquer ponto do email
+_SIGNATURE_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE | re.DOTALL) for pattern in [
+        r'-----Original Message-----', r'From:.*', r'Sent:.*', r'To:.*',
+        r'Subject:.*', r'[\s]*_{3,}[\s]*', r'[\s]*-{3,}[\s]*',
+        r'Regards,', r'Sincerely,', r'Thank you,', r'V/R,',
+        r'Best regards,', r'Sent from my BlackBerry', r'Confidentiality Notice:',
+        r'This email and any files transmitted with it are confidential',
+        r'This message is intended only for the use of the individual or entity to which it is addressed and may contain information that is confidential and privileged.' 
+    ]
+]
+
+# Os mesmos padroes como texto literal em minusculas, para busca direta (str.find) no texto em minusculas.
+# So o inicio da ocorrencia importa: 'From:.*' vira 'from:' e '[\s]*_{3,}[\s]*' vira '___'
+# (os espacos antes do corte sao removidos pelo strip). O '.' final do ultimo padrao exige mais um caractere.
+_SIGNATURE_LITERALS = [
+    ('-----original message-----', 0), ('from:', 0), ('sent:', 0), ('to:', 0),
+    ('subject:', 0), ('___', 0), ('---', 0),
+    ('regards,', 0), ('sincerely,', 0), ('thank you,', 0), ('v/r,', 0),
+    ('best regards,', 0), ('sent from my blackberry', 0), ('confidentiality notice:', 0),
+    ('this email and any files transmitted with it are confidential', 0),
+    ('this message is intended only for the use of the individual or entity to which it is addressed and may contain information that is confidential and privileged', 1)
+]
+
+# Caracteres em que str.lower() nao equivale ao IGNORECASE do re ('İ' muda de tamanho; 'ı' e 'ſ' casam com 'i' e 's')
+_CASEFOLD_EXCEPTIONS = ('\u0130', '\u0131', '\u017f')
+
+# Qualquer sequencia de caracteres fora de letras, numeros e pontuacao permitida (inclui espacos)
+# O intervalo ';-_' e o mesmo da versao original
+_NON_TEXT_CHARACTER_PATTERN = re.compile(r'[^a-zA-Z0-9\s.,?!:;-_/#@%]')
+_NON_TEXT_RUN_PATTERN = re.compile(r'[^a-zA-Z0-9.,?!:;-_/#@%]+')
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+_WHITESPACE_CHARACTER_PATTERN = re.compile(r'\s')
+
+# Limpeza com orcamento (clean_text com max_words): caracteres brutos lidos por palavra no primeiro
+# prefixo (cresce GROWTH vezes se nao bastar) e folga no fim do prefixo para um padrao de assinatura cortado
+_BUDGET_RAW_CHARS_PER_WORD = 16
+_BUDGET_PREFIX_GROWTH = 4
+_SIGNATURE_MARGIN = max(len(literal) + trailing_chars for literal, trailing_chars in _SIGNATURE_LITERALS)
+
 
 class EmailPreprocessor:
 
     def __init__(self):
         pass
 
-    def clean_text(self, text: str) -> str:
+    def clean_text(self, text: str, max_words: int | None = None) -> str:
         """
         Aplica a sequencia de pre-processamento a uma unica string de email.
+        Com max_words, devolve apenas as primeiras max_words palavras do texto limpo (exatamente
+        as mesmas da limpeza completa), limpando so o inicio do email sempre que possivel.
         """
         if not isinstance(text, str):
             return ""
+
+        if max_words:
+            cleaned = self._clean_text_prefix(text, max_words)
+            if cleaned is not None:
+                return cleaned
+            words = self.clean_text(text).split(' ', max_words)
+            return ' '.join(words[:max_words])
         
         # Ordem de processamento:
         # 1. Remover URLs e enderecos de email (sao ruidos universais)
@@ -34,13 +124,83 @@ class EmailPreprocessor:
         # 3. Remover assinaturas (tambem ruidos)
         text = self._remove_signatures_refined(text) 
         # 4. Converter para minusculas
-        text = self._to_lowercase(text) 
         # 5. Normalizar pontuacao e caracteres especiais (mantem numeros, remove excesso)
-        text = self._normalize_text_characters(text)
         # 6. Remover espacos extras
-        text = self._remove_extra_whitespace(text) 
-        
-        return text
+        # (5 e 6 em uma unica substituicao: cada sequencia de espacos/caracteres especiais vira um espaco)
+        return _NON_TEXT_RUN_PATTERN.sub(' ', text.lower()).strip()
+
+    def _clean_text_prefix(self, text: str, max_words: int):
+        """
+        Limpa prefixos crescentes do texto bruto ate obter as primeiras max_words palavras da
+        limpeza completa. Retorna None quando nao da para garantir o mesmo resultado so com o
+        inicio do texto (texto curto, caracteres especiais de caixa ou assinatura ambigua).
+        """
+        if any(char in text for char in _CASEFOLD_EXCEPTIONS):
+            return None
+
+        raw_length = max_words * _BUDGET_RAW_CHARS_PER_WORD
+        while raw_length < len(text):
+            # Corta em um espaco: URLs e enderecos de email nunca atravessam espacos, entao
+            # a remocao no prefixo e igual ao inicio da remocao no texto inteiro
+            match = _WHITESPACE_CHARACTER_PATTERN.search(text, raw_length)
+            if match is None:
+                return None
+            cleaned = self._clean_raw_prefix(text, text[:match.start()], max_words)
+            if cleaned is not False:
+                return cleaned
+            raw_length *= _BUDGET_PREFIX_GROWTH
+        return None
+
+    def _clean_raw_prefix(self, text: str, raw_prefix: str, max_words: int):
+        # Retorna as palavras, None (usar a limpeza completa) ou False (prefixo curto demais)
+        prefix = self._remove_urls_emails(raw_prefix)
+        body_start = self._find_body_start(prefix, complete=False, more_lines=text.find('\n', len(raw_prefix)) != -1)
+        if body_start is None:
+            return False
+        body = prefix[body_start:].strip()
+        # Um padrao de assinatura cortado pelo fim do prefixo so pode comecar depois de safe_length
+        safe_length = len(body) - _SIGNATURE_MARGIN
+        if safe_length <= 0:
+            return False
+
+        lowered_body = body.lower()
+        for index, (literal, trailing_chars) in enumerate(_SIGNATURE_LITERALS):
+            cut_position = lowered_body.find(literal)
+            if cut_position != -1 and cut_position + len(literal) + trailing_chars <= len(lowered_body):
+                break
+        else:
+            index = cut_position = None
+
+        if index == 0:
+            # Padrao de maior prioridade: o corte e o mesmo no texto inteiro
+            shared_length = None
+        elif cut_position is None:
+            shared_length = safe_length
+        else:
+            # O corte real e este ou vem de um padrao de maior prioridade depois de safe_length
+            shared_length = min(cut_position, safe_length)
+
+        if shared_length is not None:
+            # A ultima palavra pode estar incompleta: so vale com mais de max_words palavras
+            words = _NON_TEXT_RUN_PATTERN.sub(' ', lowered_body[:shared_length]).strip().split(' ', max_words)
+            if len(words) > max_words:
+                return ' '.join(words[:max_words])
+            if cut_position is None:
+                return False
+            if self._may_contain_signature(text, _SIGNATURE_LITERALS[:index]):
+                return None if cut_position <= safe_length else False
+
+        words = _NON_TEXT_RUN_PATTERN.sub(' ', lowered_body[:cut_position].strip()).strip().split(' ', max_words)
+        return ' '.join(words[:max_words])
+
+    def _may_contain_signature(self, text: str, literals: list) -> bool:
+        """
+        Indica se algum dos padroes pode aparecer no texto limpo. A remocao de URLs/emails so
+        junta trechos separados por espaco, entao cada parte (entre espacos) do padrao precisa
+        estar no texto bruto; se alguma nao estiver, o padrao com certeza nao aparece.
+        """
+        lowered_text = text.lower()
+        return any(all(part in lowered_text for part in literal.split(' ')) for literal, _ in literals)
 
     # --- FUNCOES DE LIMPEZA REFINADAS ---
 
@@ -51,30 +211,53 @@ class EmailPreprocessor:
         """
         if not isinstance(email_text, str):
             return ""
-        
-        lines = email_text.split('\n')
-        body_start_index = 0
-        
-        # Padroes comuns de inicio de linha de cabecalho (case-insensitive e com espacos no inicio)
-        # Mais robusto que apenas novas linhas duplas
-        header_patterns = re.compile(
-            r'^(Message-ID|Date|From|To|Subject|Cc|Bcc|Mime-Version|Content-Type|Content-Transfer-Encoding|X-From|X-To|X-cc|X-bcc|X-Folder|X-Origin|X-FileName):',
-            re.IGNORECASE
-        )
-        
+
+        # Mantem o texto a partir do inicio do corpo
+        return email_text[self._find_body_start(email_text):].strip()
+
+    def _find_body_start(self, email_text: str, complete: bool = True, more_lines: bool = True):
+        """
+        Retorna a posicao onde o corpo comeca. Com complete=False o texto e so o inicio do
+        email (more_lines indica se ha outras linhas depois dele): retorna None se a decisao
+        depender de uma parte da linha que ainda nao foi lida.
+        """
+        # Percorre as linhas pelos indices (sem dividir o email inteiro em uma lista)
+        text_length = len(email_text)
+        body_start = 0
+        line_start = 0
+
         # Itera sobre as linhas para encontrar o fim do cabecalho
-        for i, line in enumerate(lines):
-            line_stripped = line.strip()
+        while True:
+            line_end = email_text.find('\n', line_start)
+            if line_end == -1:
+                line_end = text_length
+                if not complete:
+                    # Ultima linha incompleta: so e decidida se for a ultima do email e ja
+                    # tiver caracteres suficientes para o padrao de cabecalho
+                    line_stripped = email_text[line_start:line_end].strip()
+                    if more_lines or not line_stripped or (len(line_stripped) < _HEADER_MAX_LENGTH and not _HEADER_PATTERN.match(line_stripped)):
+                        return None
+
+            line_stripped = email_text[line_start:line_end].strip()
             # Se a linha esta vazia apos cabecalhos, ou nao corresponde a um padrao de cabecalho
-            if not line_stripped or not header_patterns.match(line_stripped):
-                body_start_index = i
+            if not line_stripped or not _HEADER_PATTERN.match(line_stripped):
+                body_start = line_start
                 # Se encontrou uma linha nao-cabecalho ou vazia, verifica se o proximo eh conteudo real
                 # Isso evita cortar o corpo se houver um cabecalho que nao esta na lista
-                if i + 1 < len(lines) and lines[i+1].strip(): # Proxima linha nao vazia, assume que e o corpo
-                    break
-            
-        # Junta as linhas a partir do inicio do corpo
-        return '\n'.join(lines[body_start_index:]).strip()
+                if line_end < text_length:
+                    next_line_end = email_text.find('\n', line_end + 1)
+                    if next_line_end == -1:
+                        next_line_end = text_length
+                    if email_text[line_end + 1:next_line_end].strip(): # Proxima linha nao vazia, assume que e o corpo
+                        break
+                    if next_line_end == text_length and not complete:
+                        return None
+
+            if line_end >= text_length:
+                break
+            line_start = line_end + 1
+
+        return body_start
 
     def _remove_signatures_refined(self, email_text: str) -> str:
         """
@@ -82,31 +265,41 @@ class EmailPreprocessor:
         """
         if not isinstance(email_text, str):
             return ""
-        
-        patterns = [
-            r'-----Original Message-----', r'From:.*', r'Sent:.*', r'To:.*',
-            r'Subject:.*', r'[\s]*_{3,}[\s]*', r'[\s]*-{3,}[\s]*',
-            r'Regards,', r'Sincerely,', r'Thank you,', r'V/R,',
-            r'Best regards,', r'Sent from my BlackBerry', r'Confidentiality Notice:',
-            r'This email and any files transmitted with it are confidential',
-            r'This message is intended only for the use of the individual or entity to which it is addressed and may contain information that is confidential and privileged.' 
-        ]
-        
-        # Percorre os padroes de assinatura, removendo do final do texto
-        for pattern in patterns:
-            # re.DOTALL faz com que '.' inclua novas linhas para pegar assinaturas multi-linha
-            match = re.search(pattern, email_text, re.IGNORECASE | re.DOTALL)
-            if match:
-                email_text = email_text[:match.start()].strip()
-                break # Para apos encontrar a primeira assinatura e remover
-        return email_text
+
+        # Corta no primeiro padrao encontrado (na ordem de prioridade)
+        cut_position = self._find_signature_start(email_text)
+        if cut_position is None:
+            return email_text
+        return email_text[:cut_position].strip()
+
+    def _find_signature_start(self, email_text: str):
+        """
+        Retorna a posicao onde a assinatura comeca (ou None). O texto e convertido para
+        minusculas uma unica vez e cada padrao vira uma busca literal (str.find), bem mais
+        rapida que re.search com IGNORECASE e DOTALL sobre o corpo inteiro.
+        """
+        if any(char in email_text for char in _CASEFOLD_EXCEPTIONS):
+            # Caso raro: mantem a busca por regex para preservar o resultado exato
+            for pattern in _SIGNATURE_PATTERNS:
+                match = pattern.search(email_text)
+                if match:
+                    return match.start()
+            return None
+
+        lowered_text = email_text.lower()
+        for literal, trailing_chars in _SIGNATURE_LITERALS:
+            position = lowered_text.find(literal)
+            if position != -1 and position + len(literal) + trailing_chars <= len(lowered_text):
+                return position
+        return None
 
     def _remove_urls_emails(self, text: str) -> str:
         # Remove URLs e enderecos de email
         if not isinstance(text, str):
             return ""
-        text = re.sub(r'http\S+|www\S+|https\S+', '', text, flags=re.MULTILINE)
-        text = re.sub(r'\S*@\S*\s?', '', text)
+        text = _URL_PATTERN.sub('', text)
+        if '@' in text: # Sem '@' nao ha endereco de email para remover
+            text = _EMAIL_ADDRESS_PATTERN.sub('', text)
         return text
     
     def _to_lowercase(self, text: str) -> str:
@@ -124,23 +317,25 @@ class EmailPreprocessor:
             return ""
         
         # Substitui qualquer coisa que NAO seja letra (a-z), numero (0-9) ou espaco (\s) por um espaco
-        text = re.sub(r'[^a-zA-Z0-9\s.,?!:;-_/#@%]', ' ', text)
+        text = _NON_TEXT_CHARACTER_PATTERN.sub(' ', text)
         
         # Remove multiplos espacos e espacos no inicio/fim
-        text = re.sub(r'\s+', ' ', text).strip()
+        text = _WHITESPACE_PATTERN.sub(' ', text).strip()
         return text
 
     def _remove_extra_whitespace(self, text: str) -> str:
         # Remove espacos extras
         if not isinstance(text, str):
             return ""
-        text = re.sub(r'\s+', ' ', text)
+        text = _WHITESPACE_PATTERN.sub(' ', text)
         return text.strip()
 
-    def preprocess_dataframe(self, dataframe: pd.DataFrame, column_name: str) -> pd.DataFrame:
+    def preprocess_dataframe(self, dataframe: pd.DataFrame, column_name: str, num_workers: int | str | None = None) -> pd.DataFrame:
 
         """
         Aplica a sequencia de pre-processamento a uma coluna de DataFrame.
+        Com num_workers > 1 (padrao: PREPROCESS_WORKERS) a coluna e dividida em blocos
+        limpos em paralelo por um pool de processos.
         """
         if column_name not in dataframe.columns:
             raise ValueError(f"A coluna '{column_name}' nao existe no DataFrame.")
@@ -152,35 +347,313 @@ class EmailPreprocessor:
 
         print(f"Iniciando pre-processamento da coluna '{column_name}'...")
         
-        series_to_process = series_to_process.apply(self.clean_text) 
+        cleaned_chunks = run_in_chunks(
+            _clean_chunk,
+            series_to_process.tolist(),
+            num_workers=num_workers,
+            description="Pre-processamento"
+        )
         print("Pre-processamento concluido.")
 
-        processed_df[f'{column_name}_processed'] = series_to_process
+        processed_df[f'{column_name}_processed'] = [text for chunk in cleaned_chunks for text in chunk]
         return processed_df
 
-# Email Dataset (para PyTorch Trainer)
-class EmailDataset(Dataset):
-    def __init__(self, encodings, labels=None):
-        self.encodings = encodings
-        self.labels = labels
 
-    def __getitem__(self, idx):
-        # Converte itens para tensores PyTorch
-        item = {key: torch.tensor(val[idx]) for key, val in self.encodings.items()}
-        if self.labels is not None:
-            item['labels'] = torch.tensor(self.labels[idx], dtype=torch.long)
-        return item
+# =============================================================================
+# ------------- Processamento paralelo em blocos (pool de processos) ----------
+# =============================================================================
+
+# Estado de cada processo do pool (o tokenizador e carregado uma unica vez por processo)
+_worker_preprocessor = EmailPreprocessor()
+_worker_tokenizer = None
+_worker_max_length = None
+
+
+def resolve_num_workers(num_workers: int | str | None = None) -> int:
+    # None usa PREPROCESS_WORKERS; "auto" ou 0 usa todos os nucleos
+    value = PREPROCESS_WORKERS if num_workers is None else num_workers
+    if str(value).strip().lower() in ("auto", "0"):
+        return os.cpu_count() or 1
+    return max(1, int(value))
+
+
+def _init_tokenizer_worker(model_name: str, max_length: int):
+    global _worker_tokenizer, _worker_max_length
+    # Cada processo ja e um nivel de paralelismo: evita threads extras do tokenizador rapido
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    _worker_tokenizer = AutoTokenizer.from_pretrained(model_name)
+    _worker_max_length = max_length
+
+
+def _clean_chunk(texts: list[str]) -> list[str]:
+    return [_worker_preprocessor.clean_text(text) for text in texts]
+
+
+def _tokenize_chunk(texts: list[str]) -> dict:
+    if not texts:
+        return {'input_ids': [], 'attention_mask': []}
+    # Sem padding: cada lote e completado apenas ate o seu maior item no treinamento
+    encodings = _worker_tokenizer(texts, truncation=True, padding=False, max_length=_worker_max_length)
+    return dict(encodings)
+
+
+def _clean_and_tokenize_chunk(texts: list[str]) -> list[list[int]]:
+    return _tokenize_chunk(_clean_chunk(texts))['input_ids']
+
+
+def run_in_chunks(function, items: list, num_workers: int | str | None = None, chunk_size: int | None = None,
+                  description: str = "Processamento", initializer=None, initargs: tuple = ()) -> list:
+    """
+    Divide `items` em blocos de `chunk_size` e aplica `function` a cada bloco, em paralelo
+    quando num_workers > 1. Retorna a lista de resultados por bloco, na ordem original,
+    e imprime o progresso a cada bloco concluido.
+    """
+    num_workers = resolve_num_workers(num_workers)
+    chunk_size = max(1, chunk_size or PREPROCESS_CHUNK_SIZE)
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    num_workers = min(num_workers, max(1, len(chunks)))
+
+    def report(results):
+        done = 0
+        for chunk, result in zip(chunks, results):
+            done += len(chunk)
+            print(f"  {description}: {done}/{len(items)} amostras ({done / len(items):.0%})")
+            yield result
+
+    if num_workers <= 1:
+        if initializer:
+            initializer(*initargs)
+        return list(report(map(function, chunks)))
+
+    print(f"  {description}: {len(chunks)} blocos em {num_workers} processos")
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=initializer, initargs=initargs) as executor:
+        return list(report(executor.map(function, chunks)))
+
+
+def tokenize_texts(texts: list[str], model_name: str, max_length: int, num_workers: int | str | None = None) -> dict:
+    """
+    Tokeniza os textos (sem padding) em blocos paralelos e junta o resultado em
+    um unico dicionario de listas (input_ids, attention_mask, ...).
+    """
+    encoded_chunks = run_in_chunks(
+        _tokenize_chunk,
+        texts,
+        num_workers=num_workers,
+        description="Tokenizacao",
+        initializer=_init_tokenizer_worker,
+        initargs=(model_name, max_length)
+    )
+
+    tokenized_data = {}
+    for encodings in encoded_chunks:
+        for key, values in encodings.items():
+            tokenized_data.setdefault(key, []).extend(values)
+    return tokenized_data
+
+
+# =============================================================================
+# ---------------- Padding dinamico e agrupamento por tamanho -----------------
+# =============================================================================
+
+def length_buckets(lengths: list[int], batch_size: int) -> list[list[int]]:
+    """
+    Agrupa os indices das amostras em lotes de ate `batch_size` itens com tamanhos
+    (num de tokens) parecidos, para que o padding de cada lote seja minimo.
+    """
+    batch_size = max(1, batch_size)
+    ordered_indexes = sorted(range(len(lengths)), key=lengths.__getitem__)
+    return [ordered_indexes[i:i + batch_size] for i in range(0, len(ordered_indexes), batch_size)]
+
+
+class PaddingStats:
+    """
+    Contabiliza os tokens processados com padding dinamico (ate o maior item do lote)
+    comparado ao padding fixo em max_length, para medir a economia real.
+    """
+
+    def __init__(self, max_length: int):
+        self.max_length = max_length
+        self._lock = threading.Lock()
+        self.sequences = 0
+        self.real_tokens = 0        # Tokens reais (sem padding)
+        self.padded_tokens = 0      # Tokens processados com padding dinamico
+        self.max_length_tokens = 0  # Tokens que seriam processados com padding='max_length'
+
+    def update(self, batch_lengths: list[int]):
+        # Registra um lote ja tokenizado (tamanho de cada sequencia do lote)
+        if not batch_lengths:
+            return
+        with self._lock:
+            self.sequences += len(batch_lengths)
+            self.real_tokens += sum(batch_lengths)
+            self.padded_tokens += max(batch_lengths) * len(batch_lengths)
+            self.max_length_tokens += self.max_length * len(batch_lengths)
+
+    @property
+    def saved_fraction(self) -> float:
+        # Fracao dos tokens de max_length que deixaram de ser processados
+        if not self.max_length_tokens:
+            return 0.0
+        return 1.0 - self.padded_tokens / self.max_length_tokens
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                'sequences': self.sequences,
+                'real_tokens': self.real_tokens,
+                'padded_tokens': self.padded_tokens,
+                'max_length_tokens': self.max_length_tokens,
+                'padding_saved_fraction': round(self.saved_fraction, 4)
+            }
+
+
+# =============================================================================
+# ------------- Cache de tokenizacao entre execucoes do treino ----------------
+# =============================================================================
+
+def file_content_hash(file_path: str, block_size: int = 1024 * 1024) -> str:
+    # sha256 do conteudo do arquivo, lido em blocos (nao carrega o CSV inteiro na memoria)
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def tokenization_cache_key(file_paths: list[str], text_column: str, category_column: str,
+                           model_name: str, max_length: int) -> str:
+    """
+    Chave do cache de prepare_data_for_ia: muda se o conteudo de qualquer CSV, a versao da
+    limpeza, o tokenizador (MODEL_NAME), o MAX_LENGTH ou as colunas usadas mudarem.
+    """
+    key_data = {
+        'files': [[f_path, file_content_hash(f_path) if os.path.exists(f_path) else None] for f_path in file_paths],
+        'text_column': text_column,
+        'category_column': category_column,
+        'category_mapping': CATEGORY_MAPPING,
+        'preprocessor_version': PREPROCESSOR_VERSION,
+        'model_name': model_name,
+        'max_length': max_length
+    }
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode('utf-8')).hexdigest()[:32]
+
+
+def tokenization_cache_group(file_paths: list[str], text_column: str, category_column: str) -> str:
+    # Conjunto de entrada (quais CSVs e colunas), sem o conteudo: o cache guarda uma unica
+    # versao por conjunto e a versao anterior e apagada quando os dados ou a configuracao mudam
+    key_data = {'files': list(file_paths), 'text_column': text_column, 'category_column': category_column}
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def save_tokenization_cache(dataframe: pd.DataFrame, cache_path: str, replaces_prefix: str | None = None):
+    """
+    Grava em um arquivo temporario e renomeia: um treino interrompido nunca deixa um cache pela metade.
+    Com `replaces_prefix`, apaga os outros caches da mesma pasta com esse prefixo (versoes
+    anteriores do mesmo conjunto), para a pasta nao crescer a cada mudanca nos dados.
+    """
+    try:
+        cache_dir = os.path.dirname(cache_path) or '.'
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        dataframe.to_pickle(temp_path)
+        os.replace(temp_path, cache_path)
+        print(f"--- Cache de tokenizacao gravado em '{cache_path}' ---")
+    except OSError as e:
+        print(f"AVISO: Nao foi possivel gravar o cache de tokenizacao: {e}")
+        return
+
+    if replaces_prefix is not None:
+        remove_stale_tokenization_caches(cache_dir, replaces_prefix, keep=os.path.basename(cache_path))
+
+
+def remove_stale_tokenization_caches(cache_dir: str, prefix: str, keep: str):
+    # Versoes anteriores do cache (e caches sem prefixo, do formato antigo de nome: <chave>.pkl)
+    for name in os.listdir(cache_dir):
+        stale = name.startswith(prefix) or re.fullmatch(r'[0-9a-f]{32}\.pkl', name) is not None
+        if name == keep or not name.endswith('.pkl') or not stale:
+            continue
+        try:
+            os.remove(os.path.join(cache_dir, name))
+            print(f"--- Cache de tokenizacao antigo removido: '{name}' ---")
+        except OSError as e:
+            print(f"AVISO: Nao foi possivel remover o cache de tokenizacao antigo '{name}': {e}")
+
+
+def row_fingerprints(texts: pd.Series) -> pd.Series:
+    # Impressao digital de cada linha pelo texto (a limpeza/tokenizacao so depende dele)
+    return texts.map(lambda text: hashlib.sha1(text.encode('utf-8')).hexdigest())
+
+
+def incremental_clean_and_tokenize(dataframe: pd.DataFrame, text_column: str, model_name: str, max_length: int,
+                                   num_workers: int | str | None = None) -> tuple[pd.DataFrame, dict]:
+    """
+    Equivalente a preprocess_dataframe + tokenize_texts, mas reaproveitando o resultado de cada
+    linha ja processada em execucoes anteriores (cache por linha em TOKENIZATION_CACHE_DIR).
+    So as linhas novas ou alteradas sao limpas e tokenizadas; as linhas removidas dos CSVs
+    saem do cache. Retorna o DataFrame com a coluna limpa e as colunas de tokens (Series
+    alinhadas pelo indice), identicos aos de um processamento completo.
+    """
+    processed_df = dataframe.copy()
+    fingerprints = row_fingerprints(processed_df[text_column].astype(str).fillna(''))
+
+    row_cache_key = hashlib.sha256(json.dumps([PREPROCESSOR_VERSION, model_name, max_length]).encode('utf-8')).hexdigest()[:32]
+    row_cache_path = os.path.join(TOKENIZATION_CACHE_DIR, f"rows_{row_cache_key}.pkl")
+
+    row_cache = pd.read_pickle(row_cache_path) if os.path.exists(row_cache_path) else pd.DataFrame()
+    cached_rows = len(row_cache)
+
+    # Linhas removidas dos CSVs deixam o cache; textos repetidos sao processados uma unica vez
+    current_fingerprints = pd.Index(fingerprints.unique())
+    if cached_rows:
+        row_cache = row_cache[row_cache.index.isin(current_fingerprints)]
+    new_rows = ~fingerprints.duplicated() & ~fingerprints.isin(row_cache.index)
+    removed_rows = cached_rows - len(row_cache)
+
+    print(f"Incremental: {int(new_rows.sum())} linhas novas/alteradas, {len(row_cache)} reaproveitadas do cache, {removed_rows} removidas do cache.")
+
+    if new_rows.any():
+        new_df = EmailPreprocessor().preprocess_dataframe(processed_df.loc[new_rows, [text_column]], text_column, num_workers=num_workers)
+        cleaned_texts = new_df[f'{text_column}_processed'].tolist()
+        tokenized_data = tokenize_texts(cleaned_texts, model_name, max_length, num_workers=num_workers)
+
+        new_cache = pd.DataFrame({'processed': cleaned_texts, **tokenized_data}, index=pd.Index(fingerprints[new_rows].tolist()))
+        row_cache = pd.concat([row_cache, new_cache]) if len(row_cache) else new_cache
+
+    if new_rows.any() or removed_rows:
+        # Um unico cache por linha: o de outra limpeza/tokenizador/MAX_LENGTH e substituido
+        save_tokenization_cache(row_cache, row_cache_path, replaces_prefix="rows_")
+
+    # Monta as colunas na ordem das linhas atuais (mesmo resultado do processamento completo)
+    processed_df[f'{text_column}_processed'] = fingerprints.map(row_cache['processed'])
+    tokenized_data = {key: fingerprints.map(row_cache[key]) for key in row_cache.columns.drop('processed')}
+    return processed_df, tokenized_data
 
-    def __len__(self):
-        # Retorna o numero de amostras
-        return len(self.encodings['input_ids'])
 
 # Carrega, pre-processa e tokeniza datasets de emails para treinamento da IA
-def prepare_data_for_ia(file_paths: list[str], text_column: str = 'message', category_column: str = 'label'):
+def prepare_data_for_ia(file_paths: list[str], text_column: str = 'message', category_column: str = 'label',
+                        num_workers: int | str | None = None):
     """
     Carrega, pre-processa e tokeniza datasets de emails para treinamento da IA.
+    A limpeza e a tokenizacao rodam em blocos paralelos com num_workers > 1 (padrao: PREPROCESS_WORKERS).
+    O resultado fica em cache (TOKENIZATION_CACHE_DIR) e e reaproveitado enquanto os CSVs,
+    a limpeza, o MODEL_NAME e o MAX_LENGTH nao mudarem.
     """
     try:
+        # Variaveis do .env com valores default para configuracao do tokenizador
+        MODEL_NAME_FROM_ENV = os.getenv("MODEL_NAME", "distilbert-base-multilingual-cased")
+        MAX_LENGTH_FROM_ENV = int(os.getenv("MAX_LENGTH", 128))
+
+        # Reaproveita a limpeza/tokenizacao de uma execucao anterior com os mesmos dados e configuracao
+        cache_path = None
+        if TOKENIZATION_CACHE_DIR:
+            cache_group = tokenization_cache_group(file_paths, text_column, category_column)
+            cache_key = tokenization_cache_key(file_paths, text_column, category_column, MODEL_NAME_FROM_ENV, MAX_LENGTH_FROM_ENV)
+            cache_path = os.path.join(TOKENIZATION_CACHE_DIR, f"{cache_group}_{cache_key}.pkl")
+            if os.path.exists(cache_path):
+                df_cached = pd.read_pickle(cache_path)
+                print(f"--- Cache de tokenizacao encontrado ('{cache_path}'): {len(df_cached)} amostras, limpeza e tokenizacao ignoradas ---")
+                return df_cached
+
         all_dfs = []
 
         for f_path in file_paths:
@@ -200,8 +673,16 @@ def prepare_data_for_ia(file_paths: list[str], text_column: str = 'message', cat
         if text_column not in df_combined.columns:
             raise ValueError(f"Coluna de texto '{text_column}' nao encontrada no dataset combinado.")
         
-        preprocessor = EmailPreprocessor()
-        df_cleaned = preprocessor.preprocess_dataframe(df_combined.copy(), text_column)
+        incremental = INCREMENTAL_PREPROCESSING and bool(TOKENIZATION_CACHE_DIR)
+        if INCREMENTAL_PREPROCESSING and not incremental:
+            print("AVISO: INCREMENTAL_PREPROCESSING requer TOKENIZATION_CACHE_DIR. Processando todas as linhas.")
+
+        if incremental:
+            # Limpa e tokeniza apenas as linhas novas/alteradas (as demais vem do cache por linha)
+            df_cleaned, tokenized_data = incremental_clean_and_tokenize(df_combined, text_column, MODEL_NAME_FROM_ENV, MAX_LENGTH_FROM_ENV, num_workers=num_workers)
+        else:
+            preprocessor = EmailPreprocessor()
+            df_cleaned = preprocessor.preprocess_dataframe(df_combined.copy(), text_column, num_workers=num_workers)
         
         cleaned_text_column = f'{text_column}_processed'
         if cleaned_text_column not in df_cleaned.columns:
@@ -218,13 +699,7 @@ def prepare_data_for_ia(file_paths: list[str], text_column: str = 'message', cat
             unique_categories = df_cleaned[category_column].unique()
             print(f"Categorias unicas encontradas: {unique_categories}")
 
-            # Mapeamento de categorias - string para numericas (0, 1)
-            category_mapping = {
-                'Produtivo': 0,
-                'Improdutivo': 1,
-            }
-
-            df_cleaned['numeric_labels'] = df_cleaned[category_column].map(category_mapping)
+            df_cleaned['numeric_labels'] = df_cleaned[category_column].map(CATEGORY_MAPPING)
             
             initial_rows = len(df_cleaned)
 
@@ -239,34 +714,35 @@ def prepare_data_for_ia(file_paths: list[str], text_column: str = 'message', cat
         else:
             print(f"\nAVISO: Coluna de categoria '{category_column}' nao encontrada. Nao serao geradas labels para treinamento.")
         
-        # Variaveis do .env com valores default para configuracao do tokenizador
-        MODEL_NAME_FROM_ENV = os.getenv("MODEL_NAME", "distilbert-base-multilingual-cased")
-        MAX_LENGTH_FROM_ENV = int(os.getenv("MAX_LENGTH", 128))
+        if incremental:
+            print(f"\n--- Tokens de '{cleaned_text_column}' montados a partir do cache por linha ({len(df_cleaned)} amostras) ---")
+        else:
+            print(f"\n--- Tokenizador: {MODEL_NAME_FROM_ENV} ---")
+            print(f"--- Aplicando Tokenizacao na coluna '{cleaned_text_column}' ({len(df_cleaned)} amostras) ---")
+            tokenized_data = tokenize_texts(
+                df_cleaned[cleaned_text_column].tolist(), # list de 420
+                MODEL_NAME_FROM_ENV,
+                MAX_LENGTH_FROM_ENV,
+                num_workers=num_workers
+            )
 
-        print(f"\n--- Carregando Tokenizador: {MODEL_NAME_FROM_ENV} ---")
-        tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME_FROM_ENV)
-        
-        print(f"--- Aplicando Tokenizacao na coluna '{cleaned_text_column}' ({len(df_cleaned)} amostras) ---")
-        tokenized_data = tokenizer(
-            df_cleaned[cleaned_text_column].tolist(), # list de 420
-            truncation=True,
-            padding='max_length',
-            max_length=MAX_LENGTH_FROM_ENV,
-            return_tensors='pt'
-        )
+        # Adiciona as colunas de tokenizacao ao DataFrame
+        # Agora tokenized_data tem 420 entradas, e df_cleaned tem 420 linhas. Match!
+        # (no modo incremental sao Series alinhadas pelo indice, ja sem as linhas removidas)
+        df_cleaned['input_ids'] = tokenized_data['input_ids']
+        df_cleaned['attention_mask'] = tokenized_data['attention_mask']
+        if 'token_type_ids' in tokenized_data:
+            df_cleaned['token_type_ids'] = tokenized_data['token_type_ids']
 
         print("\nPrimeiras 5 entradas tokenizadas (input_ids):")
         for i in range(min(5, len(df_cleaned))):
             print(f"Original: {df_cleaned[cleaned_text_column].iloc[i][:70]}...")
-            print(f"Input IDs: {tokenized_data['input_ids'][i][:10]}...")
+            print(f"Input IDs: {df_cleaned['input_ids'].iloc[i][:10]}...")
             print("-" * 20)
-        
-        # Adiciona as colunas de tokenizacao ao DataFrame
-        # Agora tokenized_data tem 420 entradas, e df_cleaned tem 420 linhas. Match!
-        df_cleaned['input_ids'] = tokenized_data['input_ids'].tolist()
-        df_cleaned['attention_mask'] = tokenized_data['attention_mask'].tolist()
-        if 'token_type_ids' in tokenized_data:
-            df_cleaned['token_type_ids'] = tokenized_data['token_type_ids'].tolist()
+
+        if cache_path:
+            # Substitui a versao anterior do cache destes CSVs/colunas
+            save_tokenization_cache(df_cleaned, cache_path, replaces_prefix=f"{cache_group}_")
 
         return df_cleaned 
 
@@ -279,6 +755,105 @@ def prepare_data_for_ia(file_paths: list[str], text_column: str = 'message', cat
         traceback.print_exc()
         return None
 
+# =============================================================================
+# -------- Ingestao em streaming (datasets maiores que a memoria RAM) ---------
+# =============================================================================
+
+def _is_validation_sample(text: str, validation_fraction: float) -> bool:
+    # Divisao deterministica treino/validacao pelo conteudo (textos iguais caem no mesmo conjunto)
+    return zlib.crc32(text.encode('utf-8')) % 10000 < validation_fraction * 10000
+
+
+def stream_prepare_to_disk(file_paths: list[str], output_dir: str, text_column: str = 'message',
+                           category_column: str = 'label', validation_fraction: float = 0.2,
+                           num_workers: int | str | None = None, chunk_size: int | None = None):
+    """
+    Le os CSVs em blocos, limpa e tokeniza cada bloco e grava o resultado em dois token
+    stores em disco (`output_dir`/train e `output_dir`/val). So alguns blocos ficam em
+    memoria por vez, entao o uso de RAM nao depende do tamanho do corpus.
+    Retorna um resumo com o num de amostras de cada conjunto (ou None em caso de erro).
+    """
+    from myApp.data.token_store import TokenStoreWriter
+
+    model_name = os.getenv("MODEL_NAME", "distilbert-base-multilingual-cased")
+    max_length = int(os.getenv("MAX_LENGTH", 128))
+    chunk_size = max(1, chunk_size or PREPROCESS_CHUNK_SIZE)
+    num_workers = resolve_num_workers(num_workers)
+
+    existing_paths = [f_path for f_path in file_paths if os.path.exists(f_path)]
+    for f_path in file_paths:
+        if f_path not in existing_paths:
+            print(f"AVISO: CSV '{f_path}' nao encontrado. Sera ignorado.")
+    if not existing_paths:
+        print("ERRO: Nenhum arquivo CSV de dados encontrado para processamento.")
+        return None
+
+    def read_chunks():
+        # Gera (textos, labels) de cada bloco valido de cada CSV
+        for f_path in existing_paths:
+            print(f"--- Lendo '{f_path}' em blocos de {chunk_size} linhas ---")
+            for chunk in pd.read_csv(f_path, chunksize=chunk_size):
+                if text_column not in chunk.columns or category_column not in chunk.columns:
+                    print(f"AVISO: Colunas '{text_column}'/'{category_column}' nao encontradas em '{f_path}'. Sera ignorado.")
+                    break
+                labels = chunk[category_column].map(CATEGORY_MAPPING)
+                valid_rows = labels.notna()
+                texts = chunk.loc[valid_rows, text_column].astype(str).fillna('').tolist()
+                yield texts, labels[valid_rows].astype(int).tolist()
+
+    # Tamanho do vocabulario define o dtype dos tokens em disco (uint16 ou int32)
+    vocab_size = len(AutoTokenizer.from_pretrained(model_name))
+    writers = {
+        'train': TokenStoreWriter(os.path.join(output_dir, 'train'), vocab_size),
+        'val': TokenStoreWriter(os.path.join(output_dir, 'val'), vocab_size)
+    }
+
+    def write_chunk(texts, labels, input_ids):
+        # Separa o bloco entre treino e validacao e grava nos token stores
+        split = {'train': ([], []), 'val': ([], [])}
+        for text, label, ids in zip(texts, labels, input_ids):
+            target = 'val' if _is_validation_sample(text, validation_fraction) else 'train'
+            split[target][0].append(ids)
+            split[target][1].append(label)
+        for name, (chunk_ids, chunk_labels) in split.items():
+            writers[name].append(chunk_ids, chunk_labels)
+
+    processed = 0
+    try:
+        if num_workers <= 1:
+            _init_tokenizer_worker(model_name, max_length)
+            for texts, labels in read_chunks():
+                write_chunk(texts, labels, _clean_and_tokenize_chunk(texts))
+                processed += len(texts)
+                print(f"  Streaming: {processed} amostras processadas")
+        else:
+            # Mantem no maximo 2 blocos por processo em andamento (memoria limitada)
+            with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_tokenizer_worker,
+                                     initargs=(model_name, max_length)) as executor:
+                in_flight = deque()
+                for texts, labels in read_chunks():
+                    in_flight.append((texts, labels, executor.submit(_clean_and_tokenize_chunk, texts)))
+                    while len(in_flight) >= 2 * num_workers:
+                        texts_done, labels_done, future = in_flight.popleft()
+                        write_chunk(texts_done, labels_done, future.result())
+                        processed += len(texts_done)
+                        print(f"  Streaming: {processed} amostras processadas")
+                while in_flight:
+                    texts_done, labels_done, future = in_flight.popleft()
+                    write_chunk(texts_done, labels_done, future.result())
+                    processed += len(texts_done)
+                    print(f"  Streaming: {processed} amostras processadas")
+    except Exception as e:
+        print(f"Ocorreu um erro ao processar os dados em streaming: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+    finally:
+        summary = {name: writer.close() for name, writer in writers.items()}
+
+    print(f"--- Token stores gravados em '{output_dir}': {summary['train']['num_samples']} treino, {summary['val']['num_samples']} validacao ---")
+    return summary
+
 # =============================================================================
 # ------------------------- Bloco de teste local ------------------------------
 # =============================================================================
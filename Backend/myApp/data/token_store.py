@@ -0,0 +1,156 @@
+# ======================================================================================
+# -------- Armazenamento em disco de datasets tokenizados (treino com pouca RAM) -------
+# ======================================================================================
+#
+# Formato (um diretorio por conjunto: train, val, ...):
+#   input_ids.bin - todos os tokens concatenados, sem padding (uint16 se o vocabulario
+#                   couber em 16 bits, senao int32)
+#   offsets.bin   - inicio de cada amostra em input_ids.bin (int64, num_samples + 1 valores)
+#   labels.bin    - label numerica de cada amostra (int8)
+#   meta.json     - num de amostras/tokens e o dtype dos tokens
+#
+# Os arquivos sao lidos com memoria mapeada: o dataset devolve views (sem copia) dos tokens
+# e o sistema operacional compartilha as paginas entre os workers do DataLoader.
+
+import itertools
+import json
+import os
+
+import numpy as np
+import torch
+
+from torch.utils.data import Dataset
+
+
+TOKENS_FILE = "input_ids.bin"
+OFFSETS_FILE = "offsets.bin"
+LABELS_FILE = "labels.bin"
+META_FILE = "meta.json"
+
+
+def token_dtype_for_vocab(vocab_size: int) -> np.dtype:
+    # 2 bytes por token quando todos os ids cabem em uint16 (ex: vocabularios ate 65536)
+    return np.dtype(np.uint16) if vocab_size <= np.iinfo(np.uint16).max + 1 else np.dtype(np.int32)
+
+
+class TokenStoreWriter:
+    """
+    Grava amostras tokenizadas (sem padding) em arquivos binarios, bloco a bloco,
+    sem manter o dataset inteiro em memoria.
+    """
+
+    def __init__(self, path: str, vocab_size: int):
+        self.path = path
+        self.token_dtype = token_dtype_for_vocab(vocab_size)
+        os.makedirs(path, exist_ok=True)
+
+        self._tokens_file = open(os.path.join(path, TOKENS_FILE), 'wb')
+        self._offsets_file = open(os.path.join(path, OFFSETS_FILE), 'wb')
+        self._labels_file = open(os.path.join(path, LABELS_FILE), 'wb')
+
+        self.num_samples = 0
+        self.num_tokens = 0
+        np.zeros(1, dtype=np.int64).tofile(self._offsets_file) # Primeiro offset = 0
+
+    def append(self, input_ids: list[list[int]], labels: list[int]):
+        # Acrescenta um bloco de amostras (listas de tokens de tamanhos variados)
+        if not len(input_ids):
+            return
+
+        lengths = np.fromiter(map(len, input_ids), dtype=np.int64, count=len(input_ids))
+        tokens = np.fromiter(itertools.chain.from_iterable(input_ids), dtype=self.token_dtype, count=int(lengths.sum()))
+
+        tokens.tofile(self._tokens_file)
+        (self.num_tokens + np.cumsum(lengths)).tofile(self._offsets_file)
+        np.asarray(labels, dtype=np.int8).tofile(self._labels_file)
+
+        self.num_samples += len(input_ids)
+        self.num_tokens += int(lengths.sum())
+
+    def close(self) -> dict:
+        for f in (self._tokens_file, self._offsets_file, self._labels_file):
+            f.close()
+
+        meta = {
+            'num_samples': self.num_samples,
+            'num_tokens': self.num_tokens,
+            'token_dtype': self.token_dtype.name
+        }
+        with open(os.path.join(self.path, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        return meta
+
+
+def write_token_store(path: str, input_ids, labels, vocab_size: int) -> dict:
+    # Grava de uma vez um conjunto ja tokenizado (ex: colunas de um DataFrame)
+    writer = TokenStoreWriter(path, vocab_size)
+    writer.append(list(input_ids), list(labels))
+    return writer.close()
+
+
+class TokenStoreDataset(Dataset):
+    """
+    Dataset (para PyTorch Trainer) lido de um token store via memoria mapeada.
+    Cada item traz `input_ids` como uma view (sem copia) do arquivo; o padding e a
+    attention_mask sao montados por lote em TokenStoreCollator.
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, META_FILE), encoding='utf-8') as f:
+            self.meta = json.load(f)
+
+        num_samples = self.meta['num_samples']
+        token_dtype = np.dtype(self.meta.get('token_dtype', 'int32'))
+
+        # mode='c' (copy-on-write): arrays gravaveis para o torch, sem nunca alterar o arquivo
+        self.tokens = self._map(os.path.join(path, TOKENS_FILE), token_dtype, self.meta['num_tokens'])
+        self.offsets = self._map(os.path.join(path, OFFSETS_FILE), np.int64, num_samples + 1)
+        self.labels = self._map(os.path.join(path, LABELS_FILE), np.int8, num_samples)
+
+    @staticmethod
+    def _map(file_path: str, dtype, count: int) -> np.ndarray:
+        # np.memmap nao aceita arquivos vazios
+        if not count:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(file_path, dtype=dtype, mode='c', shape=(count,))
+
+    @property
+    def lengths(self) -> np.ndarray:
+        # Num de tokens de cada amostra
+        return np.diff(self.offsets)
+
+    def __getitem__(self, idx):
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        return {
+            'input_ids': torch.from_numpy(self.tokens[start:end]),
+            'labels': int(self.labels[idx])
+        }
+
+    def __len__(self):
+        return self.meta['num_samples']
+
+
+class TokenStoreCollator:
+    """
+    Monta um lote a partir dos itens de TokenStoreDataset: completa os tokens ate o maior
+    item do lote (padding dinamico) e gera a attention_mask, copiando cada amostra uma unica vez.
+    """
+
+    def __init__(self, pad_token_id: int = 0):
+        self.pad_token_id = pad_token_id
+
+    def __call__(self, features: list[dict]) -> dict:
+        max_length = max(len(feature['input_ids']) for feature in features)
+
+        input_ids = torch.full((len(features), max_length), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(features), max_length), dtype=torch.long)
+        for i, feature in enumerate(features):
+            length = len(feature['input_ids'])
+            input_ids[i, :length].copy_(feature['input_ids'])
+            attention_mask[i, :length] = 1
+
+        return {
+            'input_ids': input_ids,
+            'attention_mask': attention_mask,
+            'labels': torch.tensor([feature['labels'] for feature in features], dtype=torch.long)
+        }
@@ -0,0 +1,90 @@
+# ========================================================================
+# ---- Backends de inferencia: grafo exportado (TorchScript/ONNX) --------
+# ========================================================================
+#
+# O export_model.py grava o modelo treinado como um grafo congelado em EXPORTED_MODEL_PATH:
+#   model.torchscript.pt - TorchScript (torch.jit.trace + freeze), roda so com o torch
+#   model.onnx           - ONNX, roda com o onnxruntime (dependencia opcional)
+#   export_meta.json     - impressao digital do modelo de origem (detecta export desatualizado)
+#
+# Os dois backends recebem input_ids/attention_mask e devolvem um objeto com `.logits`,
+# igual ao modelo do HF, entao o restante do pipeline de classificacao nao muda.
+
+import json
+import os
+
+import numpy as np
+import torch
+from transformers.modeling_outputs import SequenceClassifierOutput
+
+from myApp.result_cache import model_fingerprint
+
+
+INFERENCE_BACKENDS = ('eager', 'torchscript', 'onnx')
+
+TORCHSCRIPT_FILE = "model.torchscript.pt"
+ONNX_FILE = "model.onnx"
+EXPORT_META_FILE = "export_meta.json"
+
+
+class TorchScriptModel:
+    """
+    Modelo TorchScript congelado: sem o overhead Python do transformers a cada forward.
+    """
+
+    def __init__(self, path: str, device: torch.device):
+        self.device = device
+        self.module = torch.jit.load(path, map_location=device)
+        self.module.eval()
+
+    def __call__(self, input_ids, attention_mask, **kwargs):
+        return SequenceClassifierOutput(logits=self.module(input_ids, attention_mask)[0])
+
+
+class OnnxModel:
+    """
+    Modelo ONNX executado pelo onnxruntime na CPU.
+    """
+
+    def __init__(self, path: str, num_threads: int = 0):
+        import onnxruntime # Dependencia opcional: so e necessaria com INFERENCE_BACKEND=onnx
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+
+    def __call__(self, input_ids, attention_mask, **kwargs):
+        logits = self.session.run(['logits'], {
+            'input_ids': input_ids.cpu().numpy().astype(np.int64),
+            'attention_mask': attention_mask.cpu().numpy().astype(np.int64)
+        })[0]
+        return SequenceClassifierOutput(logits=torch.from_numpy(logits))
+
+
+def check_export_is_current(export_dir: str, model_path: str):
+    # O grafo exportado precisa ser do mesmo modelo treinado (senao o export esta desatualizado)
+    with open(os.path.join(export_dir, EXPORT_META_FILE), encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('model_fingerprint') != model_fingerprint(model_path):
+        raise RuntimeError(f"O modelo exportado em '{export_dir}' nao corresponde a '{model_path}'. Rode novamente o export_model.py")
+
+
+def load_exported_model(backend: str, export_dir: str, model_path: str, device: torch.device):
+    """
+    Carrega o grafo exportado do `backend` ('torchscript' ou 'onnx').
+    Levanta uma excecao se o arquivo nao existir, estiver desatualizado ou o runtime faltar;
+    quem chama decide o fallback para o modelo eager.
+    """
+    if backend not in INFERENCE_BACKENDS or backend == 'eager':
+        raise ValueError(f"Backend de inferencia exportado invalido: '{backend}'.")
+
+    check_export_is_current(export_dir, model_path)
+
+    if backend == 'torchscript':
+        return TorchScriptModel(os.path.join(export_dir, TORCHSCRIPT_FILE), device)
+
+    if device.type != 'cpu':
+        raise RuntimeError("O backend onnx roda apenas na CPU.")
+    return OnnxModel(os.path.join(export_dir, ONNX_FILE), num_threads=torch.get_num_threads())
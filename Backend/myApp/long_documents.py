@@ -0,0 +1,78 @@
+# ========================================================================
+# ---- E-mails longos: janelas deslizantes de tokens + agregacao ---------
+# ========================================================================
+#
+# Em vez de truncar o e-mail em MAX_LENGTH tokens, o texto limpo e dividido em janelas
+# de MAX_LENGTH tokens com sobreposicao (LONG_DOCUMENT_OVERLAP), limitadas a
+# LONG_DOCUMENT_MAX_WINDOWS por e-mail. Todas as janelas de um e-mail vao no mesmo
+# forward pass (junto com as de outros e-mails do lote) e os logits das janelas sao
+# combinados em um unico resultado:
+#   mean      - media dos logits das janelas
+#   max       - maior logit de cada categoria entre as janelas
+#   attention - media ponderada pela confianca de cada janela (softmax do maior logit),
+#               entao as janelas com sinal mais forte pesam mais
+
+import torch
+
+
+AGGREGATION_STRATEGIES = ('mean', 'max', 'attention')
+
+
+def sliding_windows(tokenizer, token_ids: list[int], max_length: int, overlap: int,
+                    max_windows: int) -> tuple[list[list[int]], bool]:
+    """
+    Divide os tokens de um texto (sem tokens especiais) em janelas de ate `max_length`
+    tokens ja com os tokens especiais. A primeira janela e igual a tokenizacao truncada.
+    Retorna (janelas, truncado): `truncado` indica que `max_windows` parou antes do fim do texto.
+    """
+    content_length = max(1, max_length - tokenizer.num_special_tokens_to_add(pair=False))
+    step = max(1, content_length - max(0, overlap))
+
+    windows = []
+    for start in range(0, max(len(token_ids), 1), step):
+        windows.append(tokenizer.build_inputs_with_special_tokens(token_ids[start:start + content_length]))
+        if start + content_length >= len(token_ids):
+            return windows, False
+        if len(windows) >= max_windows:
+            return windows, True
+    return windows, False
+
+
+def window_batches(window_lengths: list[list[int]], batch_size: int) -> list[list[int]]:
+    """
+    Agrupa os indices dos e-mails em lotes de ate `batch_size` janelas, com e-mails de
+    tamanho parecido juntos. As janelas de um e-mail nunca sao separadas em lotes diferentes
+    (um e-mail com mais janelas que `batch_size` vai sozinho no seu lote).
+    """
+    ordered_indexes = sorted(range(len(window_lengths)), key=lambda i: max(window_lengths[i]))
+
+    batches = []
+    batch, batch_windows = [], 0
+    for i in ordered_indexes:
+        if batch and batch_windows + len(window_lengths[i]) > batch_size:
+            batches.append(batch)
+            batch, batch_windows = [], 0
+        batch.append(i)
+        batch_windows += len(window_lengths[i])
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def aggregate_window_logits(logits: torch.Tensor, window_counts: list[int], strategy: str) -> torch.Tensor:
+    """
+    Combina os logits das janelas (na ordem dos e-mails) em uma linha por e-mail.
+    """
+    if all(count == 1 for count in window_counts):
+        return logits
+
+    aggregated = []
+    for window_logits in torch.split(logits, window_counts):
+        if strategy == 'max':
+            aggregated.append(window_logits.max(dim=0).values)
+        elif strategy == 'attention':
+            weights = torch.softmax(window_logits.max(dim=-1).values, dim=0)
+            aggregated.append((weights.unsqueeze(-1) * window_logits).sum(dim=0))
+        else:
+            aggregated.append(window_logits.mean(dim=0))
+    return torch.stack(aggregated)
@@ -0,0 +1,208 @@
+# ========================================================================
+# ---- Metricas da classificacao (tempo por etapa, contadores, /metrics) --
+# ========================================================================
+#
+# Cada etapa do caminho de uma classificacao (extracao do texto, limpeza, cache, tokenizacao,
+# forward pass, pos-processamento) e medida com `timed_stage` e entra em um histograma com
+# buckets fixos. Contadores acompanham e-mails por categoria, bytes recebidos, tokens, e-mails
+# truncados e erros. Tudo e exposto em GET /metrics no formato texto do Prometheus.
+#
+# Com `request_timer`, os tempos das etapas tambem sao somados por requisicao (contextvar):
+# o /upload devolve esse detalhamento no JSON com ?timings=true (ou sempre, com REQUEST_TIMINGS).
+# Etapas que rodam fora da thread da requisicao (micro-batcher) aparecem como 'micro_batch'.
+#
+# As metricas sao por processo: com varios workers do Gunicorn, cada scrape ve um worker.
+
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Desativa a coleta (timed_stage e os contadores viram no-op)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+
+# Inclui o tempo de cada etapa (timings_ms) em toda resposta do /upload
+REQUEST_TIMINGS = os.getenv("REQUEST_TIMINGS", "False").lower() == "true"
+
+# Limites (s) dos buckets dos histogramas de tempo
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Counter:
+    """
+    Contador monotono com um label opcional (ex: category). Thread-safe.
+    """
+
+    def __init__(self, name: str, documentation: str, label: str | None = None):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount: float = 1, label_value: str = ''):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        if not values and self.label is None:
+            values = [('', 0)]
+        for label_value, value in values:
+            lines.append(f"{self.name}{_labels(self.label, label_value)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Histograma com buckets fixos (acumulados so na renderizacao) e um label opcional (ex: stage).
+    Cada observacao custa um bisect e um lock, sem alocacao.
+    """
+
+    def __init__(self, name: str, documentation: str, label: str | None = None, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}  # label -> [contagem por bucket (+Inf no final), soma, total]
+
+    def observe(self, value: float, label_value: str = ''):
+        if not METRICS_ENABLED:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            series = sorted((label_value, (list(counts), total, count)) for label_value, (counts, total, count) in self._series.items())
+
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_value, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.label, label_value, le=le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label, label_value)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label, label_value)} {count}")
+        return lines
+
+
+def _labels(label: str | None, label_value: str, **extra) -> str:
+    pairs = ([(label, label_value)] if label is not None else []) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class InferenceMetrics:
+    """
+    Metricas do worker: tempo por etapa e por requisicao, e-mails, bytes, tokens, truncamentos e erros.
+    """
+
+    def __init__(self):
+        self.stage_seconds = Histogram(
+            'mailclassify_stage_seconds', 'Tempo (s) de cada etapa da classificacao (por chamada/lote).', 'stage')
+        self.request_seconds = Histogram(
+            'mailclassify_request_seconds', 'Tempo (s) total das requisicoes de classificacao.', 'route')
+        self.emails = Counter(
+            'mailclassify_emails_total', 'E-mails classificados por categoria.', 'category')
+        self.received_bytes = Counter(
+            'mailclassify_received_bytes_total', 'Bytes recebidos para classificacao por tipo de conteudo.', 'content_type')
+        self.tokens = Counter(
+            'mailclassify_model_tokens_total', 'Tokens enviados ao modelo (real = sem padding, padded = com padding).', 'kind')
+        self.truncated = Counter(
+            'mailclassify_truncated_emails_total', 'E-mails que atingiram o limite de tokens do modelo (MAX_LENGTH ou max de janelas).')
+        self.errors = Counter(
+            'mailclassify_errors_total', 'Erros por tipo (extracao, modelo indisponivel, fila cheia, ...).', 'kind')
+
+    def render(self, extra_lines: list[str] | None = None) -> str:
+        lines = []
+        for metric in (self.stage_seconds, self.request_seconds, self.emails, self.received_bytes,
+                       self.tokens, self.truncated, self.errors):
+            lines.extend(metric.render())
+        lines.extend(extra_lines or [])
+        return '\n'.join(lines) + '\n'
+
+
+def gauge_lines(name: str, documentation: str, value: float, metric_type: str = 'gauge') -> list[str]:
+    # Valor pontual (ex: modelo pronto, itens na fila) no mesmo formato do /metrics
+    return [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}", f"{name} {_number(value)}"]
+
+
+# Metricas do processo (rotas Flask/ASGI, jobs em lote e scripts usam as mesmas)
+metrics = InferenceMetrics()
+
+# Tempos (s) por etapa da requisicao atual (None fora de request_timer)
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+_request_timings_lock = threading.Lock()
+
+
+@contextmanager
+def timed_stage(stage: str):
+    """
+    Mede o bloco como a etapa `stage`: entra no histograma e, dentro de request_timer,
+    no detalhamento da requisicao.
+    """
+    if not METRICS_ENABLED and _request_timings.get() is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.stage_seconds.observe(elapsed, stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            with _request_timings_lock: # No ASGI, arquivos do mesmo upload sao extraidos em paralelo
+                timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+@contextmanager
+def request_timer(route: str, collect: bool = True):
+    """
+    Mede a requisicao inteira e, com `collect`, junta os tempos das etapas dela.
+    Produz o dict {etapa: segundos} (com 'total' ao sair).
+    """
+    timings = {}
+    token = _request_timings.set(timings if collect else None)
+    start = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+        timings['total'] = time.perf_counter() - start
+        metrics.request_seconds.observe(timings['total'], route)
+
+
+def wants_timings(flag: str | None) -> bool:
+    # ?timings=true|1 na requisicao, ou REQUEST_TIMINGS=True para todas
+    return REQUEST_TIMINGS or (flag or '').strip().lower() in ('1', 'true', 'yes')
+
+
+def timings_ms(timings: dict) -> dict:
+    return {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}
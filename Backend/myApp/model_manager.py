@@ -0,0 +1,385 @@
+# ========================================================================
+# ---- Gerenciador do modelo da IA (carga eager, em background ou lazy) --
+# ========================================================================
+#
+# Modos de carga (MODEL_LOADING):
+#   eager      - carrega no create_app (com GUNICORN_PRELOAD=True, carrega uma unica vez no
+#                processo master e os workers compartilham os pesos via copy-on-write)
+#   background - o worker sobe na hora e carrega o modelo em uma thread; /ready responde 503
+#                ate o modelo ficar pronto e as classificacoes nesse meio tempo recebem 503
+#   lazy       - so carrega na primeira classificacao (ferramentas/scripts que nao usam o modelo)
+#
+# Recarga a quente: uma nova versao do modelo (watcher de MODEL_PATH ou rota administrativa)
+# e carregada e aquecida em background; so depois substitui a atual, de uma vez. Cada lote
+# usa um unico ModelBundle, entao nenhuma requisicao mistura versoes.
+
+import contextlib
+import os
+import threading
+import time
+
+import torch
+from dotenv import load_dotenv
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+from myApp.inference_backends import INFERENCE_BACKENDS, load_exported_model
+from myApp.quantization import quantize_model
+from myApp.result_cache import model_fingerprint
+
+load_dotenv()
+
+# Configurando dados da IA + Fallback (caso os dados nao sejam encontrados)
+MODEL_PATH = os.getenv("MODEL_PATH", "./fine_tuned_classifier")
+
+# Quantizacao dinamica INT8 das camadas lineares ao carregar o modelo (apenas CPU)
+QUANTIZE_MODEL = os.getenv("QUANTIZE_MODEL", "False").lower() == "true"
+
+# Backend de inferencia: eager (modelo HF) | torchscript | onnx (grafos gerados pelo export_model.py)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "eager").strip().lower()
+EXPORTED_MODEL_PATH = os.getenv("EXPORTED_MODEL_PATH", "./fine_tuned_classifier_export")
+
+# Momento da carga do modelo: eager | background | lazy
+MODEL_LOADING_MODES = ('eager', 'background', 'lazy')
+MODEL_LOADING = os.getenv("MODEL_LOADING", "eager").strip().lower()
+
+# Intervalo (s) da verificacao de nova versao em MODEL_PATH (0 desativa o watcher)
+MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", 0))
+
+# Caminho rapido da inferencia: forward pass em torch.inference_mode (em vez de torch.no_grad)
+INFERENCE_FAST_PATH = os.getenv("INFERENCE_FAST_PATH", "False").lower() == "true"
+# Precisao do forward pass no caminho rapido: fp32 | bf16 (autocast; so backend eager e
+# hardware com bf16 nativo, senao usa fp32). Confira com python util/check_inference_parity.py
+INFERENCE_PRECISIONS = ('fp32', 'bf16')
+INFERENCE_PRECISION = os.getenv("INFERENCE_PRECISION", "fp32").strip().lower()
+
+
+class ModelNotReadyError(RuntimeError):
+    """
+    O modelo ainda esta sendo carregado em background. A requisicao deve ser
+    recusada (503) em vez de esperar a carga terminar.
+    """
+
+
+class ModelBundle:
+    """
+    Tudo que uma versao carregada do modelo precisa para classificar: tokenizador, modelo,
+    dispositivo, backend efetivo, impressao digital dos arquivos, versao (chave do cache de resultados)
+    e o modo do forward pass (caminho rapido e precisao).
+    """
+
+    def __init__(self, tokenizer, model, device: torch.device, backend: str, fingerprint: str, version: str,
+                 fast_path: bool = False, precision: str = 'fp32'):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.device = device
+        self.backend = backend
+        self.fingerprint = fingerprint
+        self.version = version
+        self.fast_path = fast_path
+        self.precision = precision
+
+
+def bf16_supported(device: torch.device) -> bool:
+    # bf16 nativo: GPU com suporte ou CPU com AVX512-BF16/AMX (emulado seria mais lento que fp32)
+    if device.type == "cuda":
+        return torch.cuda.is_bf16_supported()
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def resolve_precision(device: torch.device, backend: str, fast_path: bool = INFERENCE_FAST_PATH,
+                      precision: str = INFERENCE_PRECISION) -> str:
+    # Precisao efetiva do forward pass (fp32 se o bf16 nao se aplica a este backend/hardware)
+    if not fast_path or precision == "fp32":
+        return "fp32"
+    if precision not in INFERENCE_PRECISIONS:
+        print(f"AVISO: INFERENCE_PRECISION '{precision}' invalido (opcoes: {', '.join(INFERENCE_PRECISIONS)}). Usando fp32.")
+        return "fp32"
+    if backend != "eager":
+        print(f"AVISO: INFERENCE_PRECISION=bf16 so se aplica ao backend eager (backend atual: {backend}). Usando fp32.")
+        return "fp32"
+    if not bf16_supported(device):
+        print(f"AVISO: O dispositivo {device} nao tem suporte nativo a bf16. Usando fp32.")
+        return "fp32"
+    return "bf16"
+
+
+def inference_context(bundle: ModelBundle):
+    """
+    Contexto do forward pass: torch.no_grad (padrao) ou, no caminho rapido, torch.inference_mode
+    (sem rastrear versoes/visoes dos tensores) e autocast bf16 com precision='bf16'.
+    """
+    if not bundle.fast_path:
+        return torch.no_grad()
+    stack = contextlib.ExitStack()
+    stack.enter_context(torch.inference_mode())
+    if bundle.precision == "bf16":
+        stack.enter_context(torch.autocast(device_type=bundle.device.type, dtype=torch.bfloat16))
+    return stack
+
+
+def load_model_bundle(model_path: str = MODEL_PATH) -> ModelBundle:
+    """
+    Carrega tokenizador e modelo de `model_path` com o backend configurado
+    (INFERENCE_BACKEND/QUANTIZE_MODEL). Levanta uma excecao se a carga falhar.
+    """
+    # Define o dispositivo: CPU ou GPU
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    print(f"\n--- Carregando Modelo de Classificação da IA para o Flask (dispositivo: {device}) ---")
+
+    # Backend efetivamente usado (volta para eager se o grafo exportado nao puder ser carregado)
+    active_backend = "eager"
+
+    # Carrega o tokenizador (com base no caminho do modelo salvo)
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+
+    model = None
+    if INFERENCE_BACKEND not in INFERENCE_BACKENDS:
+        print(f"AVISO: INFERENCE_BACKEND '{INFERENCE_BACKEND}' invalido (opcoes: {', '.join(INFERENCE_BACKENDS)}). Usando eager.")
+    elif INFERENCE_BACKEND != "eager":
+        # Grafo congelado (TorchScript/ONNX): menos overhead Python por forward pass
+        try:
+            model = load_exported_model(INFERENCE_BACKEND, EXPORTED_MODEL_PATH, model_path, device)
+            active_backend = INFERENCE_BACKEND
+            print(f"Modelo exportado '{INFERENCE_BACKEND}' carregado de '{EXPORTED_MODEL_PATH}'.")
+            if QUANTIZE_MODEL:
+                print("AVISO: QUANTIZE_MODEL so se aplica ao backend eager e sera ignorado.")
+        except Exception as e:
+            print(f"AVISO: Nao foi possivel carregar o backend '{INFERENCE_BACKEND}': {e}. Usando eager.")
+
+    if model is None:
+        # Carrega o modelo treinado (tbm com base no caminho do modelo salvo)
+        model = AutoModelForSequenceClassification.from_pretrained(model_path)
+
+        model.to(device) # Move o modelo para o dispositivo correto (CPU ou GPU)
+        model.eval()    # Coloca o modelo em modo de avaliacao (sem treinamento)
+
+        # Pesos int8: menos RAM por worker e inferencia mais rapida na CPU
+        if QUANTIZE_MODEL and device.type == "cpu":
+            model = quantize_model(model)
+            active_backend = "eager-int8"
+            print("Modelo quantizado (INT8 dinamico nas camadas lineares).")
+        elif QUANTIZE_MODEL:
+            print("AVISO: QUANTIZE_MODEL so e suportado na CPU. O modelo sera usado em fp32.")
+
+    # Versao do modelo servido (quantizado/exportado/bf16 geram probabilidades levemente diferentes do eager fp32)
+    precision = resolve_precision(device, active_backend)
+    fingerprint = model_fingerprint(model_path)
+    version = fingerprint + ("" if active_backend == "eager" else f"-{active_backend.replace('eager-', '')}")
+    version += "" if precision == "fp32" else f"-{precision}"
+
+    print(f"Modelo de IA (backend: {active_backend}{', caminho rapido ' + precision if INFERENCE_FAST_PATH else ''}) "
+          f"e Tokenizador carregados com sucesso no Flask!")
+    return ModelBundle(tokenizer, model, device, active_backend, fingerprint, version, INFERENCE_FAST_PATH, precision)
+
+
+def warm_up_bundle(bundle: ModelBundle):
+    # Um forward pass antes de receber trafego (alocacoes, kernels e caches do runtime)
+    inputs = bundle.tokenizer(["aquecimento do modelo de classificacao"], return_tensors="pt")
+    inputs = {k: v.to(bundle.device) for k, v in inputs.items()}
+    with inference_context(bundle):
+        bundle.model(**inputs)
+
+
+class ModelManager:
+    """
+    Guarda o modelo carregado (ModelBundle) e controla quando e carregado
+    (eager, background ou lazy). Estados: not_loaded, loading, ready, failed.
+    """
+
+    def __init__(self, loader=load_model_bundle, watch_interval: float = MODEL_WATCH_INTERVAL,
+                 fingerprint=lambda: model_fingerprint(MODEL_PATH)):
+        self.loader = loader  # Funcao sem argumentos que retorna um ModelBundle (ou levanta excecao)
+        self.watch_interval = watch_interval
+        self.fingerprint = fingerprint  # Impressao digital atual dos arquivos do modelo (detecta nova versao)
+        self.mode = "lazy"
+        self.state = "not_loaded"
+        self.error = None
+        self.load_seconds = None
+
+        # Recarga a quente
+        self.reloads = 0
+        self.reload_error = None
+        self._failed_fingerprint = None  # Versao que falhou ao carregar (nao tenta de novo ate mudar)
+
+        self._bundle = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        self._watcher = None
+        self._watcher_pid = None
+        self._watcher_lock = threading.Lock()
+
+    def start(self, mode: str | None = None):
+        # Chamado no create_app: aplica o modo de carga configurado
+        mode = (mode or MODEL_LOADING).strip().lower()
+        if mode not in MODEL_LOADING_MODES:
+            print(f"AVISO: MODEL_LOADING '{mode}' invalido (opcoes: {', '.join(MODEL_LOADING_MODES)}). Usando eager.")
+            mode = "eager"
+        self.mode = mode
+
+        if mode == "eager":
+            self.load()
+        elif mode == "background":
+            self._start_background_load()
+
+    def get(self) -> ModelBundle | None:
+        """
+        Retorna o modelo carregado, carregando agora se ainda nao foi (modo lazy).
+        Retorna None se a carga falhou e levanta ModelNotReadyError se a carga
+        em background ainda nao terminou.
+        """
+        self._ensure_watcher() # Iniciado no worker que atende (nao no master do gunicorn com preload)
+        bundle = self._bundle
+        if bundle is not None:
+            return bundle
+        if self.state == "failed":
+            return None
+        if self._background_load_running():
+            raise ModelNotReadyError("Modelo de IA ainda está carregando.")
+        return self.load()
+
+    def load(self) -> ModelBundle | None:
+        with self._lock:
+            if self._bundle is not None:
+                return self._bundle
+
+            self.state = "loading"
+            start = time.monotonic()
+            try:
+                bundle = self.loader()
+            except Exception as e:
+                print(f"ERRO CRÍTICO: Não foi possível carregar o modelo ou tokenizador do Flask: {e}")
+                self.state = "failed"
+                self.error = str(e)
+                return None
+
+            self._bundle = bundle
+            self.state = "ready"
+            self.error = None
+            self.load_seconds = round(time.monotonic() - start, 2)
+            return bundle
+
+    @property
+    def ready(self) -> bool:
+        # No modo lazy o worker atende mesmo antes da carga (carrega na primeira classificacao)
+        return self.state == "ready" or (self.mode == "lazy" and self.state == "not_loaded")
+
+    def status(self) -> dict:
+        # Sem o lock: load() o segura durante toda a carga e /ready precisa responder nesse meio tempo
+        bundle = self._bundle
+        return {
+            'status': self.state,
+            'ready': self.ready,
+            'mode': self.mode,
+            'backend': bundle.backend if bundle is not None else None,
+            'fast_path': bundle.fast_path if bundle is not None else None,
+            'precision': bundle.precision if bundle is not None else None,
+            'model_version': bundle.version if bundle is not None else None,
+            'load_seconds': self.load_seconds,
+            'error': self.error,
+            'reloading': self._reload_lock.locked(),
+            'reloads': self.reloads,
+            'reload_error': self.reload_error
+        }
+
+    # --- Recarga a quente (nova versao sem reiniciar o worker) ---
+
+    def reload(self, wait: bool = False) -> bool:
+        """
+        Carrega e aquece a versao atual de MODEL_PATH em background e a coloca no lugar da
+        versao em uso. Enquanto isso, as requisicoes continuam com o modelo anterior.
+        Retorna False se ja houver uma recarga em andamento.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        thread = threading.Thread(target=self._reload, name="model-reloader", daemon=True)
+        thread.start()
+        if wait:
+            thread.join()
+        return True
+
+    def _reload(self):
+        try:
+            target_fingerprint = self.fingerprint()
+            start = time.monotonic()
+            try:
+                bundle = self.loader()
+                warm_up_bundle(bundle)
+            except Exception as e:
+                print(f"ERRO: Falha ao recarregar o modelo: {e}. A versao atual continua em uso.")
+                with self._lock:
+                    self.reload_error = str(e)
+                    self._failed_fingerprint = target_fingerprint
+                return
+
+            # Troca atomica (bundle e contadores juntos): requisicoes em andamento terminam
+            # com o bundle que ja pegaram
+            with self._lock:
+                previous = self._bundle
+                self._bundle = bundle
+                self.state = "ready"
+                self.error = None
+                self.reloads += 1
+                self.reload_error = None
+                self._failed_fingerprint = None
+                self.load_seconds = round(time.monotonic() - start, 2)
+            print(f"--- Modelo recarregado: versao {previous.version if previous else None} -> {bundle.version} ({self.load_seconds}s) ---")
+        finally:
+            self._reload_lock.release()
+
+    def _ensure_watcher(self):
+        # Uma thread por processo (como no micro-batcher, threads nao sobrevivem ao fork)
+        if self.watch_interval <= 0 or self._watcher_alive():
+            return
+        with self._watcher_lock:
+            if self._watcher_alive():
+                return
+            self._watcher = threading.Thread(target=self._watch, name="model-watcher", daemon=True)
+            self._watcher_pid = os.getpid()
+            self._watcher.start()
+
+    def _watcher_alive(self) -> bool:
+        return self._watcher is not None and self._watcher_pid == os.getpid() and self._watcher.is_alive()
+
+    def _watch(self):
+        pending_fingerprint = None
+        while True:
+            time.sleep(self.watch_interval)
+            bundle = self._bundle
+            if bundle is None:
+                continue # A primeira carga e feita por start()/get()
+            try:
+                current = self.fingerprint()
+            except OSError:
+                continue # Diretorio sendo substituido; tenta na proxima verificacao
+
+            if current in (bundle.fingerprint, self._failed_fingerprint):
+                pending_fingerprint = None
+                continue
+            # So recarrega quando os arquivos param de mudar (treino ainda gravando o modelo)
+            if current != pending_fingerprint:
+                pending_fingerprint = current
+                continue
+
+            pending_fingerprint = None
+            print(f"--- Nova versao do modelo detectada em '{MODEL_PATH}'. Recarregando em background ---")
+            self.reload()
+
+    # --- Carga em background ---
+
+    def _start_background_load(self):
+        with self._lock:
+            if self._bundle is not None or self._background_load_running():
+                return
+            self.state = "loading"
+            self._thread = threading.Thread(target=self.load, name="model-loader", daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _background_load_running(self) -> bool:
+        # Threads nao sobrevivem a um fork: um worker criado no meio da carga carrega por conta propria
+        return self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive()
@@ -0,0 +1,253 @@
+# ========================================================================
+# ---- Extracao de texto de PDFs (paginas em paralelo, com limites) ------
+# ========================================================================
+#
+# - Limites de tamanho (PDF_MAX_MB) e de paginas (PDF_MAX_PAGES) por documento
+# - Paginas extraidas em blocos (PDF_PAGES_PER_TASK) em um pool de processos (PDF_EXTRACTION_WORKERS),
+#   mesmo com 1 processo: o PyPDF2 pode travar em PDFs malformados e so um processo separado
+#   pode ser interrompido quando o tempo acaba
+# - O documento vai para os processos por um arquivo temporario e cada processo o abre uma vez
+#   (os blocos seguintes do mesmo documento reaproveitam o PdfReader)
+# - Para de extrair quando ja ha texto suficiente para o orcamento de tokens do modelo
+#   (PDF_TEXT_BUDGET_CHARS, por padrao 50 caracteres por token que o modelo le: MAX_LENGTH ou,
+#   com LONG_DOCUMENT_MODE, MAX_LENGTH * LONG_DOCUMENT_MAX_WINDOWS): o restante do documento nao
+#   muda a classificacao. O texto devolvido fica incompleto (o /upload marca com text_truncated)
+# - Tempo limite por documento (PDF_EXTRACTION_TIMEOUT): devolve o texto extraido ate ali e
+#   recria o pool (os processos travados sao encerrados)
+# - Os processos do pool partem de um forkserver, nao de um fork do worker: o worker ja tem threads
+#   (torch, micro-batcher, recarga do modelo) e um fork pode herdar um lock travado. So precisam do PyPDF2
+
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import PyPDF2
+from dotenv import load_dotenv
+
+from myApp.metrics import metrics
+
+load_dotenv()
+
+# Limites por documento
+PDF_MAX_MB = float(os.getenv("PDF_MAX_MB", 20))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", 50))
+PDF_EXTRACTION_TIMEOUT = float(os.getenv("PDF_EXTRACTION_TIMEOUT", 30))
+
+# Tokens que o modelo le por e-mail (uma janela ou, no modo de e-mails longos, ate LONG_DOCUMENT_MAX_WINDOWS)
+MAX_LENGTH = int(os.getenv("MAX_LENGTH", 64))
+LONG_DOCUMENT_MODE = os.getenv("LONG_DOCUMENT_MODE", "False").lower() == "true"
+LONG_DOCUMENT_MAX_WINDOWS = max(1, int(os.getenv("LONG_DOCUMENT_MAX_WINDOWS", 8)))
+MODEL_TOKEN_BUDGET = MAX_LENGTH * (LONG_DOCUMENT_MAX_WINDOWS if LONG_DOCUMENT_MODE else 1)
+
+# Texto suficiente para o modelo (folga para cabecalhos/URLs removidos na limpeza)
+PDF_TEXT_BUDGET_CHARS = int(os.getenv("PDF_TEXT_BUDGET_CHARS", MODEL_TOKEN_BUDGET * 50))
+
+# Processos que extraem paginas em paralelo e paginas por tarefa
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", 1))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 8))
+
+# Documentos abertos mantidos em cada processo do pool (requisicoes concorrentes intercalam blocos)
+WORKER_OPEN_DOCUMENTS = 4
+
+# Processos do pool: id do documento -> PdfReader (cada processo abre o documento uma vez)
+_worker_documents = OrderedDict()
+
+# Como os processos do pool sao iniciados (forkserver; spawn onde nao existe, ex: Windows)
+_POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# Erros de um bloco cujo pool foi recriado por causa de outro documento (o bloco e tentado de novo)
+_POOL_RECYCLED_ERRORS = (BrokenProcessPool, CancelledError)
+
+
+def _extract_pages(pdf_path: str, document_id: str, start: int, end: int) -> tuple[int, list[str]]:
+    # Executado nos processos do pool: num de paginas do documento e texto das paginas [start, end)
+    pdf_reader = _worker_documents.get(document_id)
+    if pdf_reader is None:
+        with open(pdf_path, 'rb') as f:
+            pdf_reader = PyPDF2.PdfReader(io.BytesIO(f.read()))
+        _worker_documents[document_id] = pdf_reader
+        while len(_worker_documents) > WORKER_OPEN_DOCUMENTS:
+            _worker_documents.popitem(last=False)
+
+    num_pages = len(pdf_reader.pages)
+    return num_pages, [pdf_reader.pages[page_num].extract_text() or "" for page_num in range(start, min(end, num_pages))]
+
+
+class PdfExtractor:
+    """
+    Extrai o texto de PDFs respeitando os limites de tamanho, paginas, tempo e texto.
+    Os blocos de paginas sao extraidos por um pool de `workers` processos (compartilhado
+    pelas requisicoes do worker e criado sob demanda em cada processo), recriado quando
+    um documento estoura o tempo limite.
+    """
+
+    def __init__(self, max_bytes: int, max_pages: int, timeout: float, text_budget_chars: int,
+                 workers: int = 1, pages_per_task: int = 8):
+        self.max_bytes = max_bytes
+        self.max_pages = max(1, max_pages)
+        self.timeout = timeout
+        self.text_budget_chars = text_budget_chars
+        self.workers = max(1, workers)
+        self.pages_per_task = max(1, pages_per_task)
+
+        self._pool = None
+        self._pool_pid = None
+        self._pool_futures = set() # Blocos enviados ao pool atual (de todas as requisicoes)
+        self._lock = threading.Lock()
+
+    def extract_text(self, pdf_bytes: bytes) -> str:
+        return self.extract(pdf_bytes)[0]
+
+    def extract(self, pdf_bytes: bytes) -> tuple[str, bool]:
+        """
+        Retorna (texto, truncado). `truncado` indica que parte do documento nao foi extraida
+        (orcamento de texto, PDF_MAX_PAGES ou tempo limite).
+        """
+        if len(pdf_bytes) > self.max_bytes:
+            metrics.errors.inc(1, 'pdf_too_large')
+            return f'PDF excede o tamanho máximo permitido ({self.max_bytes / (1024 * 1024):.0f} MB).', False
+
+        deadline = time.monotonic() + self.timeout
+        pdf_path = None
+        try:
+            fd, pdf_path = tempfile.mkstemp(prefix='pdf-', suffix='.pdf')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(pdf_bytes)
+
+            try:
+                page_texts, truncated = self._extract_in_pool(pdf_path, deadline)
+            except _POOL_RECYCLED_ERRORS:
+                # Pool recriado por causa de outro documento que estourou o tempo: tenta de novo uma vez
+                page_texts, truncated = self._extract_in_pool(pdf_path, deadline)
+
+        except (Exception, CancelledError) as e: # CancelledError nao herda de Exception
+            metrics.errors.inc(1, 'pdf_extraction')
+            return f'Não foi possível extrair texto do PDF: {str(e)}', False
+
+        finally:
+            if pdf_path is not None:
+                try:
+                    os.remove(pdf_path)
+                except OSError:
+                    pass
+
+        if page_texts is None:
+            metrics.errors.inc(1, 'pdf_timeout')
+            return 'Não foi possível extrair texto do PDF: tempo limite excedido.', False
+
+        # Junta as paginas uma unica vez (sem concatenacao quadratica de strings)
+        return "".join(page_texts).strip(), truncated
+
+    def _extract_in_pool(self, pdf_path: str, deadline: float):
+        pool = self._get_pool()
+        document_id = uuid.uuid4().hex
+
+        # O primeiro bloco tambem informa o num de paginas (o PDF so e aberto nos processos do pool)
+        in_flight = deque([self._submit(pool, pdf_path, document_id, 0, min(self.pages_per_task, self.max_pages))])
+        next_start = num_pages = None
+        page_texts = []
+        collected = 0
+        truncated = False
+        try:
+            # Mantem no max um bloco por processo em andamento; os resultados sao lidos em ordem
+            while in_flight:
+                try:
+                    total_pages, texts = in_flight[0].result(timeout=max(0.0, deadline - time.monotonic()))
+                except FutureTimeoutError:
+                    print(f"AVISO: Tempo limite na extracao do PDF ({len(page_texts)}/{num_pages or '?'} paginas extraidas).")
+                    self._recycle_pool(pool, in_flight)
+                    in_flight.clear()
+                    return page_texts or None, True
+                in_flight.popleft()
+
+                if num_pages is None:
+                    num_pages = min(total_pages, self.max_pages)
+                    next_start = len(texts)
+                    truncated = total_pages > num_pages
+
+                page_texts.extend(texts)
+                collected += sum(len(text) for text in texts)
+                if collected >= self.text_budget_chars:
+                    # Texto suficiente para o modelo: os blocos seguintes nao sao extraidos
+                    truncated = truncated or len(page_texts) < num_pages
+                    break
+
+                while next_start < num_pages and len(in_flight) < self.workers:
+                    end = min(next_start + self.pages_per_task, num_pages)
+                    in_flight.append(self._submit(pool, pdf_path, document_id, next_start, end))
+                    next_start = end
+        finally:
+            self._drain(pool, in_flight, deadline)
+        return page_texts, truncated
+
+    def _drain(self, pool: ProcessPoolExecutor, futures, deadline: float):
+        # Blocos que ja estao rodando nao podem ser cancelados: espera ate o tempo limite do
+        # documento e, se algum continuar rodando (travado), recria o pool
+        running = [future for future in futures if not future.cancel()]
+        if running:
+            _, not_done = wait(running, timeout=max(0.0, deadline - time.monotonic()))
+            if not_done:
+                print(f"AVISO: {len(not_done)} bloco(s) de paginas ainda rodando apos o tempo limite. Recriando o pool.")
+                self._recycle_pool(pool, running)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # Pools de processos nao sobrevivem a um fork (ex: gunicorn com preload): um por processo
+        if self._pool is not None and self._pool_pid == os.getpid():
+            return self._pool
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context(_POOL_START_METHOD))
+                self._pool_pid = os.getpid()
+                self._pool_futures = set()
+            return self._pool
+
+    def _submit(self, pool: ProcessPoolExecutor, pdf_path: str, document_id: str, start: int, end: int):
+        future = pool.submit(_extract_pages, pdf_path, document_id, start, end)
+        with self._lock:
+            if pool is self._pool:
+                self._pool_futures.add(future)
+        future.add_done_callback(self._pool_futures.discard) # Fora do lock: pode rodar nesta thread
+        return future
+
+    def _recycle_pool(self, pool: ProcessPoolExecutor, own_futures):
+        # Encerra os processos (inclusive os travados em uma pagina) e o proximo documento cria
+        # um pool novo. Blocos de outras requisicoes nesse pool falham (BrokenProcessPool ou
+        # CancelledError) e sao tentados de novo por elas
+        with self._lock:
+            if self._pool is not pool:
+                return # Ja recriado por outra requisicao
+            self._pool = None
+            others = [future for future in self._pool_futures if not future.done() and future not in own_futures]
+            self._pool_futures = set()
+        if others:
+            print(f"AVISO: {len(others)} bloco(s) de paginas de outras requisicoes interrompidos pela recriacao do pool.")
+
+        # O ProcessPoolExecutor nao tem API publica para encerrar os processos: usa o atributo
+        # interno _processes (pid -> Process), o mesmo que o shutdown() usa para esperar por eles
+        for process in list((pool._processes or {}).values()):
+            process.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Extrator usado pelas rotas (Flask e ASGI)
+pdf_extractor = PdfExtractor(
+    max_bytes=int(PDF_MAX_MB * 1024 * 1024),
+    max_pages=PDF_MAX_PAGES,
+    timeout=PDF_EXTRACTION_TIMEOUT,
+    text_budget_chars=PDF_TEXT_BUDGET_CHARS,
+    workers=PDF_EXTRACTION_WORKERS,
+    pages_per_task=PDF_PAGES_PER_TASK
+)
+
+
+def extract_pdf_text(pdf_bytes: bytes) -> tuple[str, bool]:
+    # (texto, truncado)
+    return pdf_extractor.extract(pdf_bytes)
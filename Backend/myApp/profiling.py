@@ -0,0 +1,252 @@
+# ========================================================================
+# ---- Profiler de requisicoes (amostragem de pilhas ou cProfile) --------
+# ========================================================================
+#
+# Opcional: mostra onde o tempo de CPU de um /upload lento foi gasto (ex: regex da limpeza
+# em corpos enormes ou o loop de paginas do PyPDF2). Uma requisicao e perfilada quando:
+#   - sorteada com probabilidade PROFILE_SAMPLE_RATE, ou
+#   - enviada com o header X-Profile-Token igual a PROFILE_TOKEN (vazio desativa o header)
+#
+# Formatos (PROFILE_FORMAT):
+#   collapsed - amostra as pilhas das threads da requisicao a cada PROFILE_INTERVAL_MS e grava
+#               pilhas colapsadas (.folded: "f1;f2;f3 N"), prontas para flamegraph.pl/speedscope
+#   cprofile  - cProfile deterministico (.prof, abrir com pstats ou snakeviz); mais preciso, mas
+#               deixa a requisicao bem mais lenta e so roda um por vez por processo
+#
+# Os arquivos vao para PROFILE_DIR (no max PROFILE_MAX_FILES, os mais antigos sao apagados).
+# No modo ASGI, as threads dos pools que trabalham para a requisicao entram no mesmo perfil.
+# Paginas de PDF extraidas em outros processos (PDF_EXTRACTION_WORKERS > 1) nao aparecem.
+# Desativado (padrao), o custo por requisicao e o de um if.
+
+import contextvars
+import cProfile
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Fracao das requisicoes perfiladas (0 desativa o sorteio; 1 = todas)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+
+# Header que forca o perfil de uma requisicao (valor = PROFILE_TOKEN; vazio desativa)
+PROFILE_HEADER = 'X-Profile-Token'
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+
+# collapsed | cprofile
+PROFILE_FORMATS = ('collapsed', 'cprofile')
+PROFILE_FORMAT = os.getenv("PROFILE_FORMAT", "collapsed").strip().lower()
+
+# Intervalo (ms) entre as amostras de pilha (formato collapsed)
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 2))
+
+# So grava perfis de requisicoes que demoraram pelo menos isso (ms)
+PROFILE_MIN_DURATION_MS = float(os.getenv("PROFILE_MIN_DURATION_MS", 0))
+
+# Diretorio dos perfis e max de arquivos mantidos (rotacao)
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 100))
+
+if PROFILE_FORMAT not in PROFILE_FORMATS:
+    print(f"AVISO: PROFILE_FORMAT '{PROFILE_FORMAT}' invalido (opcoes: {', '.join(PROFILE_FORMATS)}). Usando collapsed.")
+    PROFILE_FORMAT = 'collapsed'
+
+PROFILING_ENABLED = PROFILE_SAMPLE_RATE > 0 or bool(PROFILE_TOKEN)
+
+
+class RequestProfile:
+    """
+    Perfil de uma requisicao. As threads que trabalham para ela entram com `attach`
+    (a thread da requisicao e as dos pools do modo ASGI) e saem com `detach`.
+    """
+
+    def __init__(self, route: str, profile_format: str):
+        self.route = route
+        self.format = profile_format
+        self.filename = None
+        self._lock = threading.Lock()
+        self._threads = Counter()     # ident da thread -> num de attach ativos
+        self._profilers = {}          # cprofile: ident da thread -> cProfile.Profile
+        self._finished_profilers = []
+        self._stacks = Counter()      # collapsed: pilha colapsada -> num de amostras
+        self._samples = 0
+        self._stop = threading.Event()
+        self._sampler = None
+        self._start = time.perf_counter()
+
+    # --- Threads da requisicao ---
+
+    def attach(self):
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] += 1
+            if self.format != 'cprofile' or self._threads[ident] > 1:
+                return
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                return # Outro profiler ja ativo nesta thread/interpretador: a thread fica de fora
+            self._profilers[ident] = profiler
+
+    def detach(self):
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] -= 1
+            if self._threads[ident] > 0:
+                return
+            del self._threads[ident]
+            profiler = self._profilers.pop(ident, None)
+        if profiler is not None:
+            profiler.disable()
+            self._finished_profilers.append(profiler)
+
+    # --- Amostragem (collapsed) ---
+
+    def start_sampling(self):
+        if self.format != 'collapsed':
+            return
+        self._sampler = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+        self._sampler.start()
+
+    def _sample_loop(self):
+        interval = max(0.0001, PROFILE_INTERVAL_MS / 1000)
+        while not self._stop.wait(interval):
+            with self._lock:
+                idents = list(self._threads)
+            frames = sys._current_frames()
+            for ident in idents:
+                frame = frames.get(ident)
+                if frame is not None:
+                    self._stacks[_collapse(frame)] += 1
+                    self._samples += 1
+
+    # --- Fim da requisicao ---
+
+    def finish(self) -> float:
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        return (time.perf_counter() - self._start) * 1000
+
+    def write(self, duration_ms: float) -> str | None:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        route = re.sub(r'[^a-zA-Z0-9]+', '_', self.route).strip('_') or 'root'
+        base_name = f"{datetime.now():%Y%m%d-%H%M%S-%f}_{route}_{duration_ms:.0f}ms_{os.getpid()}"
+
+        if self.format == 'cprofile':
+            if not self._finished_profilers:
+                return None
+            import pstats
+            stats = pstats.Stats(self._finished_profilers[0])
+            for profiler in self._finished_profilers[1:]:
+                stats.add(profiler)
+            self.filename = base_name + '.prof'
+            stats.dump_stats(os.path.join(PROFILE_DIR, self.filename))
+        else:
+            if not self._samples:
+                return None
+            self.filename = base_name + '.folded'
+            with open(os.path.join(PROFILE_DIR, self.filename), 'w', encoding='utf-8') as f:
+                for stack, count in self._stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+
+        _rotate(PROFILE_DIR, PROFILE_MAX_FILES)
+        return self.filename
+
+
+def _collapse(frame) -> str:
+    # Pilha da raiz ate o frame atual: "funcao (arquivo:linha);..."
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def _rotate(directory: str, max_files: int):
+    # Mantem so os `max_files` perfis mais recentes
+    try:
+        entries = [entry for entry in os.scandir(directory) if entry.is_file() and entry.name.endswith(('.prof', '.folded'))]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:max(0, len(entries) - max(1, max_files))]:
+            os.remove(entry.path)
+    except OSError as e:
+        print(f"AVISO: Falha ao rotacionar os perfis em '{directory}': {e}")
+
+
+# Perfil da requisicao atual (None se a requisicao nao esta sendo perfilada)
+_active_profile = contextvars.ContextVar('active_profile', default=None)
+
+# cProfile: um perfil por vez por processo (requisicoes sorteadas nesse meio tempo nao sao perfiladas)
+_cprofile_lock = threading.Lock()
+
+
+def should_profile(header_token: str | None) -> bool:
+    if PROFILE_TOKEN and header_token and hmac.compare_digest(header_token, PROFILE_TOKEN):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+@contextmanager
+def profile_request(route: str, header_token: str | None = None, attach_thread: bool = True):
+    """
+    Perfila o bloco (a requisicao) se ela for sorteada ou trouxer o header PROFILE_HEADER.
+    Produz o RequestProfile (ou None); depois do bloco, `profile.filename` e o arquivo gravado.
+    `attach_thread=False` (event loop do ASGI, compartilhado por varias requisicoes): so as
+    threads que entram com run_in_request_profile sao perfiladas.
+    """
+    if not PROFILING_ENABLED or not should_profile(header_token):
+        yield None
+        return
+
+    if PROFILE_FORMAT == 'cprofile' and not _cprofile_lock.acquire(blocking=False):
+        yield None
+        return
+
+    profile = RequestProfile(route, PROFILE_FORMAT)
+    token = _active_profile.set(profile)
+    if attach_thread:
+        profile.attach()
+    profile.start_sampling()
+    try:
+        yield profile
+    finally:
+        if attach_thread:
+            profile.detach()
+        _active_profile.reset(token)
+        duration_ms = profile.finish()
+        if PROFILE_FORMAT == 'cprofile':
+            _cprofile_lock.release()
+        if duration_ms >= PROFILE_MIN_DURATION_MS:
+            try:
+                profile.write(duration_ms)
+            except OSError as e:
+                print(f"AVISO: Falha ao gravar o perfil da requisicao em '{PROFILE_DIR}': {e}")
+
+
+def run_in_request_profile(function, *args):
+    # Executa `function` em uma thread de pool dentro do perfil da requisicao (se houver)
+    profile = _active_profile.get()
+    if profile is None:
+        return function(*args)
+    profile.attach()
+    try:
+        return function(*args)
+    finally:
+        profile.detach()
+
+
+def profile_headers(profile) -> dict:
+    # Nome do arquivo gravado, para achar o perfil da requisicao em PROFILE_DIR
+    return {'X-Profile-File': profile.filename} if profile is not None and profile.filename else {}
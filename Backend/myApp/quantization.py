@@ -0,0 +1,24 @@
+# ========================================================================
+# ---- Quantizacao dinamica INT8 do modelo (inferencia na CPU) -----------
+# ========================================================================
+
+import torch
+
+
+def quantize_model(model: torch.nn.Module) -> torch.nn.Module:
+    """
+    Aplica quantizacao dinamica INT8 nas camadas nn.Linear do modelo (atencao e feed-forward
+    do DistilBERT): os pesos ficam em int8 e as ativacoes sao quantizadas a cada forward.
+    Reduz a memoria dos pesos em ~4x e acelera a inferencia na CPU. Nao funciona em GPU.
+    """
+    # Usa um backend de quantizacao disponivel nesta CPU (x86/fbgemm em Intel/AMD, qnnpack em ARM)
+    supported_engines = torch.backends.quantized.supported_engines
+    if torch.backends.quantized.engine not in supported_engines or torch.backends.quantized.engine == 'none':
+        for engine in ('x86', 'fbgemm', 'qnnpack'):
+            if engine in supported_engines:
+                torch.backends.quantized.engine = engine
+                break
+
+    quantized_model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    quantized_model.eval()
+    return quantized_model
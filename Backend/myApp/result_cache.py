@@ -0,0 +1,221 @@
+# ========================================================================
+# ---- Cache de resultados da IA (texto limpo + versao do modelo) --------
+# ========================================================================
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def model_fingerprint(model_path: str) -> str:
+    """
+    Gera uma impressao digital do modelo a partir dos arquivos em `model_path`
+    (nome, tamanho e data de modificacao). Se o modelo for re-treinado, muda.
+    """
+    digest = hashlib.sha256()
+
+    if not os.path.isdir(model_path):
+        digest.update(model_path.encode('utf-8'))
+        return digest.hexdigest()[:16]
+
+    for root, dirs, files in os.walk(model_path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            stat = os.stat(file_path)
+            relative_path = os.path.relpath(file_path, model_path)
+            digest.update(f"{relative_path}:{stat.st_size}:{stat.st_mtime_ns}\n".encode('utf-8'))
+
+    return digest.hexdigest()[:16]
+
+
+class ResultCache:
+    """
+    Cache de (categoria, probabilidades) endereçado pelo conteudo do texto limpo.
+
+    - Camada em memoria: LRU limitada a `max_entries` itens.
+    - Camada em disco (opcional, SQLite em `disk_dir`): sobrevive ao restart dos workers
+      e e compartilhada entre eles.
+
+    A chave inclui o `fingerprint` do modelo, entao um modelo novo nunca reaproveita
+    resultados antigos. Workers com versoes diferentes (ex: durante uma recarga) dividem o
+    mesmo arquivo: as linhas de outras versoes so sao apagadas depois de `stale_after_seconds`
+    sem serem gravadas (veja `purge_stale`).
+    """
+
+    def __init__(self, fingerprint: str, max_entries: int = 10000, disk_dir: str | None = None,
+                 stale_after_seconds: float = 24 * 3600):
+        self.fingerprint = fingerprint
+        self.max_entries = max(0, max_entries)
+        self.disk_path = os.path.join(disk_dir, "result_cache.sqlite3") if disk_dir else None
+        self.stale_after_seconds = stale_after_seconds
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+
+        # Contadores expostos em /stats
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.disk_path:
+            try:
+                os.makedirs(disk_dir, exist_ok=True)
+                self._open_disk()
+            except (OSError, sqlite3.Error) as e:
+                # Ex: banco travado por outro worker ou diretorio somente leitura: segue so em memoria
+                print(f"AVISO: Falha ao abrir o cache de resultados em disco '{self.disk_path}': {e}. Usando apenas a memoria.")
+                self.disk_path = None
+                return
+            self.purge_stale()
+
+    def key(self, cleaned_text: str) -> str:
+        return hashlib.sha256(f"{self.fingerprint}\0{cleaned_text}".encode('utf-8')).hexdigest()
+
+    def get(self, cleaned_text: str):
+        # Retorna (categoria, probabilidades) ou None se nao estiver em cache
+        key = self.key(cleaned_text)
+
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+
+            result = self._disk_get(key)
+            if result is not None:
+                self._memory_put(key, result)
+                self.disk_hits += 1
+                return result
+
+            self.misses += 1
+            return None
+
+    def put(self, cleaned_text: str, result: tuple):
+        self.put_many([(cleaned_text, result)])
+
+    def put_many(self, items: list[tuple[str, tuple]]):
+        # Grava varios (texto limpo, resultado) de uma vez: um unico commit no disco por requisicao
+        entries = [(self.key(cleaned_text), result) for cleaned_text, result in items]
+        if not entries:
+            return
+        with self._lock:
+            for key, result in entries:
+                self._memory_put(key, result)
+            self._disk_put_many(entries)
+
+    def clear(self):
+        # Limpa apenas a camada em memoria (o disco e invalidado pelo fingerprint)
+        with self._lock:
+            self._memory.clear()
+
+    def purge_stale(self) -> int:
+        """
+        Apaga do disco as linhas de outras versoes do modelo sem gravacoes ha mais de
+        `stale_after_seconds` (as de uma versao ainda servida por outro worker continuam).
+        Retorna o num de linhas apagadas.
+        """
+        if not self.disk_path:
+            return 0
+        with self._lock:
+            try:
+                connection = self._open_disk()
+                cursor = connection.execute(
+                    "DELETE FROM results WHERE fingerprint != ? AND COALESCE(updated_at, 0) < ?",
+                    (self.fingerprint, time.time() - self.stale_after_seconds)
+                )
+                connection.commit()
+            except sqlite3.Error as e:
+                print(f"AVISO: Falha ao limpar o cache de resultados em disco: {e}")
+                return 0
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'model_fingerprint': self.fingerprint,
+                'memory_entries': len(self._memory),
+                'max_entries': self.max_entries,
+                'disk_enabled': self.disk_path is not None,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_ratio': round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0
+            }
+
+    # --- Camada em memoria (LRU) ---
+
+    def _memory_put(self, key: str, result: tuple):
+        if not self.max_entries:
+            return
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False) # Remove o item usado ha mais tempo
+
+    # --- Camada em disco (SQLite) ---
+
+    def _open_disk(self):
+        # Uma conexao por processo (conexoes SQLite nao devem atravessar um fork)
+        if self._connection is not None and self._connection_pid == os.getpid():
+            return self._connection
+
+        connection = sqlite3.connect(self.disk_path, timeout=5, check_same_thread=False)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, category TEXT NOT NULL, probabilities TEXT NOT NULL, "
+                "updated_at REAL)"
+            )
+            # Arquivos criados antes da coluna updated_at (linhas antigas contam como vencidas)
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(results)")]
+            if 'updated_at' not in columns:
+                connection.execute("ALTER TABLE results ADD COLUMN updated_at REAL")
+            connection.commit()
+        except sqlite3.Error:
+            connection.close()
+            raise
+
+        self._connection = connection
+        self._connection_pid = os.getpid()
+        return connection
+
+    def _disk_get(self, key: str):
+        if not self.disk_path:
+            return None
+        try:
+            row = self._open_disk().execute(
+                "SELECT category, probabilities FROM results WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"AVISO: Falha ao ler o cache de resultados em disco: {e}")
+            return None
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def _disk_put_many(self, entries: list[tuple[str, tuple]]):
+        if not self.disk_path:
+            return
+        now = time.time()
+        rows = [
+            (key, self.fingerprint, category, json.dumps(probabilities), now)
+            for key, (category, probabilities) in entries
+        ]
+        try:
+            connection = self._open_disk()
+            connection.executemany(
+                "INSERT OR REPLACE INTO results (key, fingerprint, category, probabilities, updated_at) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            connection.commit()
+        except sqlite3.Error as e:
+            print(f"AVISO: Falha ao gravar no cache de resultados em disco: {e}")
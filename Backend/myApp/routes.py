@@ -1,12 +1,21 @@
-from flask import request, jsonify
-import PyPDF2
+from flask import Response, request, jsonify, send_file
+import hmac
 import os
+import threading
+from collections import Counter
 from dotenv import load_dotenv
 import torch
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import numpy as np
 
-from myApp.data.data_preprocessing import EmailPreprocessor 
+from myApp.batching import BatcherFullError, BatcherTimeoutError, MicroBatcher
+from myApp.bulk_jobs import BULK_MAX_UPLOAD_MB, BulkJobError, BulkJobManager, BulkJobsBusyError
+from myApp.data.data_preprocessing import EmailPreprocessor, PaddingStats
+from myApp.long_documents import AGGREGATION_STRATEGIES, aggregate_window_logits, sliding_windows, window_batches
+from myApp.metrics import gauge_lines, metrics, request_timer, timed_stage, timings_ms, wants_timings
+from myApp.model_manager import ModelManager, ModelNotReadyError, inference_context
+from myApp.pdf_extraction import extract_pdf_text
+from myApp.profiling import PROFILE_HEADER, profile_headers, profile_request
+from myApp.result_cache import ResultCache
 
 load_dotenv()
 
@@ -15,10 +24,46 @@ load_dotenv()
 # ==============================================================
 
 # Configurando dados da IA + Fallback (caso os dados nao sejam encontrados)
-MODEL_PATH = os.getenv("MODEL_PATH", "./fine_tuned_classifier")
+# (MODEL_PATH, QUANTIZE_MODEL, INFERENCE_BACKEND e MODEL_LOADING ficam em model_manager.py)
 MODEL_NAME = os.getenv("MODEL_NAME", "distilbert-base-multilingual-cased")
 MAX_LENGTH = int(os.getenv("MAX_LENGTH", 64))
 
+# E-mails longos: janelas de MAX_LENGTH tokens com sobreposicao, agregadas em um resultado (long_documents.py)
+LONG_DOCUMENT_MODE = os.getenv("LONG_DOCUMENT_MODE", "False").lower() == "true"
+LONG_DOCUMENT_AGGREGATION = os.getenv("LONG_DOCUMENT_AGGREGATION", "mean").strip().lower()
+LONG_DOCUMENT_OVERLAP = int(os.getenv("LONG_DOCUMENT_OVERLAP", MAX_LENGTH // 4)) # Tokens repetidos entre janelas vizinhas
+LONG_DOCUMENT_MAX_WINDOWS = max(1, int(os.getenv("LONG_DOCUMENT_MAX_WINDOWS", 8))) # Max de janelas por e-mail
+
+if LONG_DOCUMENT_AGGREGATION not in AGGREGATION_STRATEGIES:
+    print(f"AVISO: LONG_DOCUMENT_AGGREGATION '{LONG_DOCUMENT_AGGREGATION}' invalido (opcoes: {', '.join(AGGREGATION_STRATEGIES)}). Usando mean.")
+    LONG_DOCUMENT_AGGREGATION = 'mean'
+
+# Limpa so o inicio de e-mails longos: o modelo ve no max MAX_LENGTH tokens (por janela), e cada palavra
+# vira ao menos um token, entao as primeiras palavras limpas bastam (mesma entrada do modelo)
+CLEAN_TEXT_BUDGET = os.getenv("CLEAN_TEXT_BUDGET", "True").lower() == "true"
+CLEAN_TEXT_MAX_WORDS = None
+if CLEAN_TEXT_BUDGET:
+    CLEAN_TEXT_MAX_WORDS = MAX_LENGTH * LONG_DOCUMENT_MAX_WINDOWS if LONG_DOCUMENT_MODE else MAX_LENGTH
+
+# Num max de e-mails enviados ao modelo em um unico micro-lote (forward pass)
+INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", 32))
+
+# Micro-batching entre requisicoes concorrentes (so faz sentido com workers com threads)
+MICRO_BATCHING = os.getenv("MICRO_BATCHING", "False").lower() == "true"
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", INFERENCE_BATCH_SIZE)) # Max de e-mails por lote
+MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", 5)) # Espera max para completar um lote
+MICRO_BATCH_QUEUE_SIZE = int(os.getenv("MICRO_BATCH_QUEUE_SIZE", 256)) # Max de requisicoes na fila (backpressure)
+MICRO_BATCH_TIMEOUT_MS = float(os.getenv("MICRO_BATCH_TIMEOUT_MS", 30000)) # Espera max de uma requisicao pelo seu lote
+
+# Cache de resultados (0 desativa a camada em memoria; sem diretorio nao ha camada em disco)
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 10000))
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "")
+# Horas sem gravacoes ate as linhas de outras versoes do modelo serem apagadas do disco
+RESULT_CACHE_STALE_HOURS = float(os.getenv("RESULT_CACHE_STALE_HOURS", 24))
+
+# Token das rotas administrativas (ex: recarregar o modelo). Vazio desativa as rotas
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
 # Mapeamento reverso para exibir 
 # labels em texto (ID numerico -> string categoria)
 LABEL_MAP = {
@@ -26,34 +71,63 @@ LABEL_MAP = {
     1: 'Improdutivo'
 }
 
-# ==============================================================
-# ------------- Carregar Modelo e Tokenizador ------------------
-# ==============================================================
+# Nomes das categorias por ID em um array, para mapear o lote inteiro de uma vez (num_labels -> array)
+_label_names = {}
 
-# Define o dispositivo: CPU ou GPU
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-print(f"\n--- Carregando Modelo de Classificação da IA para o Flask (dispositivo: {device}) ---")
 
-try:
-    # Carrega o tokenizador (com base no caminho do modelo salvo)
-    tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
+def label_names(num_labels: int) -> np.ndarray:
+    names = _label_names.get(num_labels)
+    if names is None:
+        names = np.array([LABEL_MAP.get(class_id, "Desconhecido") for class_id in range(num_labels)], dtype=object)
+        _label_names[num_labels] = names
+    return names
 
-    # Carrega o modelo treinado (tbm com base no caminho do modelo salvo)
-    model = AutoModelForSequenceClassification.from_pretrained(MODEL_PATH)
-
-    model.to(device) # Move o modelo para o dispositivo correto (CPU ou GPU)
-    model.eval()    # Coloca o modelo em modo de avaliacao (sem treinamento)
-    
-    print("Modelo de IA e Tokenizador carregados com sucesso no Flask!")
+# ==============================================================
+# ------------- Carregar Modelo e Tokenizador ------------------
+# ==============================================================
 
-except Exception as e:
-    print(f"ERRO CRÍTICO: Não foi possível carregar o modelo ou tokenizador do Flask: {e}")
-    tokenizer = None
-    model = None
+# O modelo e carregado pelo create_app (modo MODEL_LOADING), nao na importacao deste modulo
+model_manager = ModelManager()
 
 # Instancia do pre-processador de email (sua classe)
 email_preprocessor = EmailPreprocessor()
 
+# Economia de tokens do padding dinamico (exposta em /stats)
+padding_stats = PaddingStats(MAX_LENGTH)
+
+# Cache de resultados: e-mails repetidos (newsletters, respostas automaticas) nao passam pelo modelo
+# (criado quando o modelo fica pronto, pois a chave depende da versao do modelo carregado;
+# uma nova versao recria o cache e descarta os resultados da anterior)
+result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def result_cache_fingerprint(bundle) -> str:
+    # O modo de e-mails longos muda o resultado para o mesmo texto limpo: entra na chave do cache
+    if LONG_DOCUMENT_MODE:
+        return f"{bundle.version}:long:{LONG_DOCUMENT_AGGREGATION}:{LONG_DOCUMENT_OVERLAP}:{LONG_DOCUMENT_MAX_WINDOWS}"
+    return bundle.version
+
+
+def current_result_cache(bundle):
+    global result_cache
+    if not (RESULT_CACHE_SIZE > 0 or RESULT_CACHE_DIR):
+        return None
+    with _result_cache_lock:
+        if result_cache is None or result_cache.fingerprint != result_cache_fingerprint(bundle):
+            # Requisicao ainda em andamento com a versao anterior (apos uma recarga): sem cache
+            if bundle is not model_manager.get():
+                return None
+            if result_cache is not None:
+                result_cache.clear()
+            result_cache = ResultCache(
+                result_cache_fingerprint(bundle),
+                max_entries=RESULT_CACHE_SIZE,
+                disk_dir=RESULT_CACHE_DIR or None,
+                stale_after_seconds=RESULT_CACHE_STALE_HOURS * 3600
+            )
+        return result_cache
+
 
 # ==============================================================
 # ------------------ Classificação da IA -----------------------
@@ -61,43 +135,161 @@ email_preprocessor = EmailPreprocessor()
 
 # Chamada para classificar o texto extraido/digitado
 def classify_email(email_text: str):
-
-    if not model or not tokenizer:
+    return classify_emails([email_text])[0]
+
+
+# Classifica varios e-mails de uma vez (ex: upload com muitos arquivos)
+def classify_emails(email_texts: list[str], batch_size: int | None = None):
+    """
+    Limpa, tokeniza e classifica uma lista de e-mails em micro-lotes de ate
+    `batch_size` textos (padrao: INFERENCE_BATCH_SIZE), com um unico forward pass por lote.
+    Os lotes agrupam e-mails de tamanho parecido e usam padding dinamico. Com MICRO_BATCHING,
+    os textos entram na fila compartilhada e podem ir no mesmo lote de outras requisicoes.
+    Textos ja classificados com o mesmo modelo vem do cache de resultados.
+    Retorna uma lista de (categoria, probabilidades) na mesma ordem de `email_texts`.
+    """
+
+    bundle = model_manager.get() # Carrega agora no modo lazy; ModelNotReadyError durante a carga em background
+    if bundle is None:
         print("ERRO: Modelo ou tokenizador não carregados. Não é possível classificar.")
-        return "Erro de IA", 0.0 # Retorna um erro e probabilidade nula
-
-    # 1. Pre-processar o texto (limpeza)
-    cleaned_text = email_preprocessor.clean_text(email_text) 
-
-    # Se texto nao foi limpo retorna erro
-    if not cleaned_text.strip():
-        return "Texto Vazio", 0.0
-
-    # 2. Tokenizar o texto
-    inputs = tokenizer(
-        cleaned_text,
-        return_tensors="pt", 
-        truncation=True,
-        padding='max_length',
-        max_length=MAX_LENGTH # Usa o MAX_LENGTH configurado
-    )
-    # Move os inputs tokenizados para o mesmo dispositivo do modelo (CPU ou GPU)
-    inputs = {k: v.to(device) for k, v in inputs.items()}
-
-    # 3. Fazer a inferencia (previsao)
-    # Desativa o calculo de gradientes 
-    # (economiza memoria e e mais rapido para inferencia)
-    with torch.no_grad():
-        outputs = model(**inputs)
-    
-
-    logits = outputs.logits
-    probabilities = torch.softmax(logits, dim=-1)
-    predicted_class_id = int(torch.argmax(probabilities, dim=-1).item())
-
-    predicted_category = LABEL_MAP.get(predicted_class_id, "Desconhecido")
-    
-    return predicted_category, probabilities.tolist()[0]
+        metrics.errors.inc(len(email_texts), 'model_unavailable')
+        metrics.emails.inc(len(email_texts), 'Erro de IA')
+        return [("Erro de IA", 0.0) for _ in email_texts] # Retorna um erro e probabilidade nula
+
+    # 1. Pre-processar os textos (limpeza)
+    with timed_stage('cleaning'):
+        cleaned_texts = [email_preprocessor.clean_text(text, max_words=CLEAN_TEXT_MAX_WORDS) for text in email_texts]
+
+    # Textos que ficaram vazios apos a limpeza nao vao para o modelo
+    results = [("Texto Vazio", 0.0)] * len(email_texts)
+    pending_indexes = [i for i, text in enumerate(cleaned_texts) if text.strip()]
+
+    if not pending_indexes:
+        return count_categories(results)
+
+    # 2. Reaproveita resultados ja calculados para o mesmo texto limpo
+    result_cache = current_result_cache(bundle)
+    if result_cache is not None:
+        with timed_stage('cache'):
+            missing_indexes = []
+            for i in pending_indexes:
+                cached = result_cache.get(cleaned_texts[i])
+                if cached is None:
+                    missing_indexes.append(i)
+                else:
+                    results[i] = cached
+            pending_indexes = missing_indexes
+
+        if not pending_indexes:
+            return count_categories(results)
+
+    # 3. Tokenizar e classificar (direto ou junto com outras requisicoes via micro-batcher)
+    pending_texts = [cleaned_texts[i] for i in pending_indexes]
+    if micro_batcher is not None:
+        # Tokenizacao e modelo rodam na thread do micro-batcher: aqui so se mede a espera total
+        # O lote usa o mesmo modelo desta requisicao (o do cache de resultados), mesmo durante uma recarga
+        with timed_stage('micro_batch'):
+            predictions = micro_batcher.submit(pending_texts, bundle)
+    else:
+        predictions = predict_cleaned_texts(pending_texts, batch_size, bundle)
+
+    for i, prediction in zip(pending_indexes, predictions):
+        results[i] = prediction
+    if result_cache is not None:
+        # Um unico commit no SQLite para todos os e-mails novos da requisicao
+        result_cache.put_many(list(zip(pending_texts, predictions)))
+
+    return count_categories(results)
+
+
+# Contabiliza os e-mails classificados por categoria (/metrics)
+def count_categories(results: list):
+    for category, count in Counter(category for category, _ in results).items():
+        metrics.emails.inc(count, category)
+    return results
+
+
+# Tokeniza e roda o modelo sobre textos ja limpos (e nao vazios)
+def predict_cleaned_texts(cleaned_texts: list[str], batch_size: int | None = None, bundle=None):
+    batch_size = max(1, batch_size or INFERENCE_BATCH_SIZE)
+    results = [None] * len(cleaned_texts)
+
+    # Todos os lotes usam o mesmo modelo (tokenizador e pesos da mesma versao)
+    bundle = bundle or model_manager.get()
+    if bundle is None:
+        raise RuntimeError("Modelo ou tokenizador não carregados.")
+    tokenizer, model, device = bundle.tokenizer, bundle.model, bundle.device
+
+    # Tokenizar todos os textos de uma vez, sem padding. Cada e-mail vira uma lista de janelas:
+    # so a tokenizacao truncada ou, no modo de e-mails longos, janelas deslizantes de MAX_LENGTH tokens
+    with timed_stage('tokenization'):
+        if LONG_DOCUMENT_MODE:
+            token_ids = tokenizer(cleaned_texts, add_special_tokens=False, verbose=False)['input_ids']
+            windows, truncated = [], 0
+            for ids in token_ids:
+                email_windows, email_truncated = sliding_windows(
+                    tokenizer, ids, MAX_LENGTH, LONG_DOCUMENT_OVERLAP, LONG_DOCUMENT_MAX_WINDOWS
+                )
+                windows.append(email_windows)
+                truncated += email_truncated # So conta se sobrou texto depois da ultima janela
+        else:
+            encodings = tokenizer(
+                cleaned_texts,
+                truncation=True,
+                max_length=MAX_LENGTH # Usa o MAX_LENGTH configurado
+            )
+            windows = [[ids] for ids in encodings['input_ids']]
+            truncated = sum(1 for ids in encodings['input_ids'] if len(ids) >= MAX_LENGTH)
+        window_lengths = [[len(ids) for ids in email_windows] for email_windows in windows]
+    metrics.truncated.inc(truncated)
+
+    # Micro-lotes com e-mails de tamanho parecido, completados so ate o maior item do lote
+    # (as janelas de um e-mail vao sempre no mesmo lote: um unico forward pass por e-mail)
+    for batch_indexes in window_batches(window_lengths, batch_size):
+        batch_lengths = [length for i in batch_indexes for length in window_lengths[i]]
+        padding_stats.update(batch_lengths)
+        metrics.tokens.inc(sum(batch_lengths), 'real')
+        metrics.tokens.inc(max(batch_lengths) * len(batch_lengths), 'padded')
+
+        with timed_stage('tokenization'):
+            inputs = tokenizer.pad(
+                {'input_ids': [ids for i in batch_indexes for ids in windows[i]]},
+                padding='longest',
+                return_tensors="pt"
+            )
+            # Move os inputs tokenizados para o mesmo dispositivo do modelo (CPU ou GPU)
+            inputs = {k: v.to(device) for k, v in inputs.items()}
+
+        # Fazer a inferencia (previsao) do lote
+        # Desativa o calculo de gradientes (torch.no_grad; no caminho rapido, torch.inference_mode
+        # e autocast bf16 com INFERENCE_PRECISION=bf16) - economiza memoria e e mais rapido
+        with timed_stage('forward'), inference_context(bundle):
+            outputs = model(**inputs)
+
+        with timed_stage('postprocessing'):
+            # Uma linha de logits por e-mail (janelas combinadas com LONG_DOCUMENT_AGGREGATION)
+            # Em fp32 (logits bf16 do autocast), para as probabilidades terem a precisao de sempre
+            logits = aggregate_window_logits(outputs.logits.float(), [len(windows[i]) for i in batch_indexes], LONG_DOCUMENT_AGGREGATION)
+            probabilities = torch.softmax(logits, dim=-1)
+
+            # Lote inteiro de uma vez: argmax dos logits (mesma ordem do softmax) e nomes pelo array
+            predicted_class_ids = torch.argmax(logits, dim=-1).cpu().numpy()
+            categories = label_names(logits.shape[-1])[predicted_class_ids].tolist()
+
+            for i, category, probs in zip(batch_indexes, categories, probabilities.tolist()):
+                results[i] = (category, probs)
+
+    return results
+
+
+# Fila compartilhada pelas threads do worker: um forward pass para varias requisicoes
+micro_batcher = MicroBatcher(
+    lambda cleaned_texts, bundle: predict_cleaned_texts(cleaned_texts, bundle=bundle),
+    max_batch_size=MICRO_BATCH_MAX_SIZE,
+    max_wait_ms=MICRO_BATCH_MAX_WAIT_MS,
+    max_queue_size=MICRO_BATCH_QUEUE_SIZE,
+    timeout_ms=MICRO_BATCH_TIMEOUT_MS
+) if MICRO_BATCHING else None
 
 
 # ==============================================================
@@ -120,115 +312,356 @@ def generate_response(category: str):
 
 
 # ==============================================================
-# ------ Rota de Upload do Flask (onde a IA será usada) --------
+# --- Extracao e classificacao do upload (Flask e modo ASGI) ---
 # ==============================================================
 
-# Chamado quando a rota /upload e acessada
-def upload_files():
-    processed_contents = [] # Lista para armazenar o resultado de cada e-mail processado
+# Extrai o texto de um arquivo enviado (.txt ou .pdf); retorna (texto, truncado)
+# truncado: parte do documento nao foi extraida (so PDFs, veja pdf_extraction.py)
+def extract_text(content_type: str, file_content: bytes) -> tuple[str, bool]:
+    # .TXT - Extracao de texto baseada no tipo de arquivo
+    if content_type == 'text/plain':
+
+        try:
+            return file_content.decode('utf-8').strip(), False
+
+        except UnicodeDecodeError:
+            metrics.errors.inc(1, 'txt_decode')
+            return 'Não foi possível decodificar o arquivo TXT (codificação inválida).', False
     
-    # Logica para lidar com UPLOAD DE ARQUIVOS (txt, pdf)
-    if 'files' in request.files and request.files.getlist('files'):
-        uploaded_files = request.files.getlist('files')
-        
-        for file in uploaded_files:
-            if file.filename == '':
-                continue
-            
-            file_content = file.read()
-            file.seek(0)
-            
-            extracted_text = ""
-
-            # .TXT - Extracao de texto baseada no tipo de arquivo
-            if file.content_type == 'text/plain':
-
-                try:
-                    extracted_text = file_content.decode('utf-8').strip()
-
-                except UnicodeDecodeError:
-                    extracted_text = 'Não foi possível decodificar o arquivo TXT (codificação inválida).'
-            
-            # .PDF - Extracao de texto baseada no tipo de arquivo
-            elif file.content_type == 'application/pdf':
-
-                try:
-                    pdf_reader = PyPDF2.PdfReader(file.stream)
-                    pdf_text = ""
-
-                    for page_num in range(len(pdf_reader.pages)):
-
-                        page = pdf_reader.pages[page_num]
-                        pdf_text += page.extract_text() or ""
-
-                    extracted_text = pdf_text.strip()
-
-                except Exception as e:
-                    extracted_text = f'Não foi possível extrair texto do PDF: {str(e)}'
-            
-            else:
-                extracted_text = 'Tipo de arquivo não suportado para extração de texto.'
-            
-
-            # ==============================================================
-            # ------ INTEGRAÇÃO DA IA: Classificar e Gerar Resposta --------
-            # ==============================================================
-
-            # Classificar e Gerar Resposta
-            category, probabilities = classify_email(extracted_text)
-            suggested_response = generate_response(category)
-
-            file_info = {
-                'filename': file.filename,
-                'content_type': file.content_type,
-                'size': len(file_content),
-                'extracted_text': extracted_text,
-                'category': category, # Categoria prevista pela IA
-                'probabilities': probabilities, # Probabilidades da previsão
-                'suggested_response': suggested_response # Resposta automática gerada
-            }
-            
-            processed_contents.append(file_info)
-
-    # Logica para lidar com TEXTO DIRETO INSERIDO
-    elif 'email_text' in request.form:
-        email_text_data = request.form['email_text']
-        cleaned_email_text = email_text_data.strip()
-
-        # Se o texto digitado esta vazio ou so tem espacos
-        if not cleaned_email_text:
-            return jsonify({
-                'message': 'Conteúdo vazio.',
-                'files': [{
-                    'filename': 'email_digitado.txt',
-                    'extracted_text': '',
-                    'category': 'Texto Vazio',
-                    'suggested_response': generate_response('Texto Vazio')
-                }]
-            }), 200 # Retorna 200 OK, mas com categoria 'Texto Vazio'
-        
-        # Se o texto digitado esta vazio ou so tem espacos
-        category, probabilities = classify_email(cleaned_email_text)
-        suggested_response = generate_response(category)
-
-        text_info = {
-            'filename': 'email_digitado.txt',
-            'content_type': 'text/plain',
-            'size': len(cleaned_email_text.encode('utf-8')),
-            'extracted_text': cleaned_email_text,
-            'category': category, 
-            'probabilities': probabilities,
-            'suggested_response': suggested_response
+    # .PDF - Extracao de texto baseada no tipo de arquivo
+    elif content_type == 'application/pdf':
+
+        # Paginas em paralelo, com limites de tamanho/paginas/tempo e parada antecipada (pdf_extraction.py)
+        return extract_pdf_text(file_content)
+    
+    else:
+        metrics.errors.inc(1, 'unsupported_type')
+        return 'Tipo de arquivo não suportado para extração de texto.', False
+
+
+# Extrai o texto de cada arquivo: recebe (filename, content_type, conteudo em bytes)
+def extract_file_infos(files: list[tuple[str, str, bytes]]) -> list[dict]:
+    processed_contents = [] # Lista para armazenar o resultado de cada e-mail processado
+
+    for filename, content_type, file_content in files:
+        if filename == '':
+            continue
+
+        metrics.received_bytes.inc(len(file_content), content_type or '')
+        with timed_stage('extraction'):
+            extracted_text, text_truncated = extract_text(content_type, file_content)
+
+        file_info = {
+            'filename': filename,
+            'content_type': content_type,
+            'size': len(file_content),
+            'extracted_text': extracted_text,
+            # O PDF parou de ser extraido no orcamento de texto do modelo, em PDF_MAX_PAGES ou no
+            # tempo limite: extracted_text tem so o inicio do documento
+            'text_truncated': text_truncated
         }
         
-        processed_contents.append(text_info)
+        processed_contents.append(file_info)
+
+    return processed_contents
+
+
+# ==============================================================
+# ------ INTEGRAÇÃO DA IA: Classificar e Gerar Resposta --------
+# ==============================================================
+
+def classify_file_infos(processed_contents: list[dict]) -> list[dict]:
+    # Classifica todos os arquivos do upload em lote (micro-lotes no modelo)
+    classifications = classify_emails([info['extracted_text'] for info in processed_contents])
+
+    for file_info, (category, probabilities) in zip(processed_contents, classifications):
+        file_info['category'] = category # Categoria prevista pela IA
+        file_info['probabilities'] = probabilities # Probabilidades da previsão
+        file_info['suggested_response'] = generate_response(category) # Resposta automática gerada
+
+    return processed_contents
+
+
+# Classifica o texto digitado no formulario; retorna (corpo da resposta, status HTTP)
+def process_typed_text(email_text_data: str) -> tuple[dict, int]:
+    cleaned_email_text = email_text_data.strip()
+    metrics.received_bytes.inc(len(email_text_data.encode('utf-8')), 'typed_text')
+
+    # Se o texto digitado esta vazio ou so tem espacos
+    if not cleaned_email_text:
+        return {
+            'message': 'Conteúdo vazio.',
+            'files': [{
+                'filename': 'email_digitado.txt',
+                'extracted_text': '',
+                'category': 'Texto Vazio',
+                'suggested_response': generate_response('Texto Vazio')
+            }]
+        }, 200 # Retorna 200 OK, mas com categoria 'Texto Vazio'
+    
+    # Se o texto digitado esta vazio ou so tem espacos
+    category, probabilities = classify_email(cleaned_email_text)
+    suggested_response = generate_response(category)
+
+    text_info = {
+        'filename': 'email_digitado.txt',
+        'content_type': 'text/plain',
+        'size': len(cleaned_email_text.encode('utf-8')),
+        'extracted_text': cleaned_email_text,
+        'category': category, 
+        'probabilities': probabilities,
+        'suggested_response': suggested_response
+    }
 
+    return upload_result([text_info])
+
+
+# Resposta unificada do /upload; retorna (corpo da resposta, status HTTP)
+def upload_result(processed_contents: list[dict]) -> tuple[dict, int]:
     # Se nenhum conteudo (nem arquivo, nem texto digitado) foi fornecido
     if not processed_contents:
-        return jsonify({'error': 'Nenhum conteúdo de e-mail válido fornecido para processamento.'}), 400
+        return {'error': 'Nenhum conteúdo de e-mail válido fornecido para processamento.'}, 400
 
     # Retorna uma resposta unificada para o frontend
-    return jsonify({
+    return {
         'message': 'Conteúdo(s) processado(s) com sucesso!',
         'files': processed_contents
-    }), 200
\ No newline at end of file
+    }, 200
+
+
+# ==============================================================
+# ------ Rota de Upload do Flask (onde a IA será usada) --------
+# ==============================================================
+
+# Chamado quando a rota /upload e acessada
+def upload_files():
+    # Tempo de cada etapa (/metrics) e, com ?timings=true, detalhado na resposta
+    # (perfil de CPU opcional: PROFILE_SAMPLE_RATE ou header X-Profile-Token, veja profiling.py)
+    collect_timings = wants_timings(request.args.get('timings'))
+    with profile_request('/upload', request.headers.get(PROFILE_HEADER)) as profile, \
+            request_timer('/upload', collect_timings) as timings:
+        processed_contents = []
+
+        # Logica para lidar com UPLOAD DE ARQUIVOS (txt, pdf)
+        if 'files' in request.files and request.files.getlist('files'):
+            uploaded_files = request.files.getlist('files')
+            files = [(file.filename, file.content_type, file.read()) for file in uploaded_files]
+            processed_contents = classify_file_infos(extract_file_infos(files))
+            payload, status = upload_result(processed_contents)
+
+        # Logica para lidar com TEXTO DIRETO INSERIDO
+        elif 'email_text' in request.form:
+            payload, status = process_typed_text(request.form['email_text'])
+
+        else:
+            payload, status = upload_result(processed_contents)
+
+    if collect_timings:
+        payload['timings_ms'] = timings_ms(timings)
+    return jsonify(payload), status, profile_headers(profile)
+
+
+# ==============================================================
+# ------------- Estatisticas de Inferencia (/stats) ------------
+# ==============================================================
+
+# Estatisticas expostas em /stats
+def stats_payload() -> dict:
+    return {
+        'model': model_manager.status(),
+        'padding': padding_stats.as_dict(),
+        'micro_batching': micro_batcher.stats() if micro_batcher is not None else None,
+        'result_cache': result_cache.stats() if result_cache is not None else None
+    }
+
+
+# Chamado quando a rota /stats e acessada
+def inference_stats():
+    return jsonify(stats_payload()), 200
+
+
+# ==============================================================
+# ------------ Metricas no formato Prometheus (/metrics) -------
+# ==============================================================
+
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+# Texto exposto em /metrics: histogramas/contadores de metrics.py + estado atual do worker
+def metrics_text() -> str:
+    extra_lines = gauge_lines('mailclassify_model_ready', 'Modelo carregado e pronto (1) ou nao (0).', int(model_manager.ready))
+    if micro_batcher is not None:
+        extra_lines += gauge_lines('mailclassify_micro_batch_queued_jobs', 'Requisicoes na fila do micro-batcher.',
+                                   micro_batcher.stats()['queued_jobs'])
+    if result_cache is not None:
+        cache_stats = result_cache.stats()
+        extra_lines += gauge_lines('mailclassify_result_cache_hits_total', 'Acertos do cache de resultados (memoria + disco).',
+                                   cache_stats['memory_hits'] + cache_stats['disk_hits'], 'counter')
+        extra_lines += gauge_lines('mailclassify_result_cache_misses_total', 'Falhas do cache de resultados.',
+                                   cache_stats['misses'], 'counter')
+    return metrics.render(extra_lines)
+
+
+# Chamado quando a rota /metrics e acessada
+def prometheus_metrics():
+    return Response(metrics_text(), content_type=PROMETHEUS_MIMETYPE)
+
+
+# Resposta 503 para fila cheia ou lote demorado (BatcherFullError/BatcherTimeoutError) ou modelo carregando (ModelNotReadyError)
+def unavailable_result(error) -> tuple[dict, int, dict]:
+    if isinstance(error, ModelNotReadyError):
+        metrics.errors.inc(1, 'model_not_ready')
+    else:
+        metrics.errors.inc(1, 'batch_timeout' if isinstance(error, BatcherTimeoutError) else 'queue_full')
+    if isinstance(error, ModelNotReadyError):
+        return {'error': f'Servidor iniciando, tente novamente em instantes. {error}'}, 503, {'Retry-After': '5'}
+    return {'error': f'Servidor ocupado, tente novamente em instantes. {error}'}, 503, {}
+
+
+# Chamado quando a fila do micro-batcher esta cheia (backpressure)
+def classification_queue_full(error):
+    payload, status, headers = unavailable_result(error)
+    return jsonify(payload), status, headers
+
+
+# Chamado quando o modelo ainda esta carregando em background
+def model_not_ready(error):
+    payload, status, headers = unavailable_result(error)
+    return jsonify(payload), status, headers
+
+
+# ==============================================================
+# ------------- Prontidao do worker (readiness probe) ----------
+# ==============================================================
+
+# Chamado quando a rota /ready e acessada (load balancer/autoscaling)
+def readiness():
+    status = model_manager.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+
+# ==============================================================
+# ------------- Rotas administrativas (ADMIN_TOKEN) ------------
+# ==============================================================
+
+# Recarrega o modelo sem reiniciar o worker; retorna (corpo da resposta, status HTTP)
+def reload_model_result(admin_token: str) -> tuple[dict, int]:
+    if not ADMIN_TOKEN:
+        return {'error': 'Rotas administrativas desativadas (defina ADMIN_TOKEN).'}, 404
+    if not hmac.compare_digest(admin_token, ADMIN_TOKEN):
+        return {'error': 'Token administrativo inválido.'}, 403
+
+    started = model_manager.reload()
+    status = model_manager.status()
+    if not started:
+        return {'message': 'Já existe uma recarga do modelo em andamento.', **status}, 409
+    return {'message': 'Recarga do modelo iniciada em background.', **status}, 202
+
+
+# Chamado quando a rota /admin/reload-model e acessada
+def reload_model():
+    payload, status = reload_model_result(request.headers.get('X-Admin-Token', ''))
+    return jsonify(payload), status
+
+
+# ==============================================================
+# ------ Jobs de classificacao em lote (/jobs, bulk_jobs.py) ---
+# ==============================================================
+
+# Exportacoes grandes (CSV, mbox, JSONL, .zip) classificadas em background, em lotes
+bulk_job_manager = BulkJobManager(classify_emails, labels=[LABEL_MAP[class_id] for class_id in sorted(LABEL_MAP)])
+
+# Tipo e nome do download dos resultados de um job
+BULK_RESULTS_MIMETYPES = {'jsonl': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def bulk_job_payload(status: dict) -> dict:
+    return {
+        **status,
+        'status_url': f"/jobs/{status['job_id']}",
+        'results_url': f"/jobs/{status['job_id']}/results"
+    }
+
+
+# Cria um job a partir do arquivo enviado (gravado com save_input); retorna (corpo da resposta, status HTTP)
+def create_bulk_job_result(filename: str, save_input, content_length: int | None = None, input_format: str | None = None,
+                           output_format: str | None = None, text_column: str | None = None) -> tuple[dict, int]:
+    if content_length and content_length > BULK_MAX_UPLOAD_MB * 1024 * 1024:
+        return {'error': f'Arquivo excede o tamanho máximo permitido ({BULK_MAX_UPLOAD_MB:.0f} MB).'}, 413
+    if not filename:
+        return {'error': 'Nenhum arquivo enviado (campo "file").'}, 400
+
+    try:
+        status = bulk_job_manager.create_job(filename, save_input, input_format, output_format, text_column)
+    except BulkJobError as e:
+        return {'error': str(e)}, 400
+    except BulkJobsBusyError as e:
+        return {'error': f'Servidor ocupado, tente novamente em instantes. {e}'}, 503
+
+    return {'message': 'Job de classificação iniciado.', **bulk_job_payload(status)}, 202
+
+
+# Progresso de um job; retorna (corpo da resposta, status HTTP)
+def bulk_job_status_result(job_id: str) -> tuple[dict, int]:
+    status = bulk_job_manager.status(job_id)
+    if status is None:
+        return {'error': 'Job não encontrado.'}, 404
+    return bulk_job_payload(status), 200
+
+
+# Retoma um job interrompido ou que falhou; retorna (corpo da resposta, status HTTP)
+def resume_bulk_job_result(job_id: str) -> tuple[dict, int]:
+    try:
+        started, status = bulk_job_manager.resume(job_id)
+    except BulkJobsBusyError as e:
+        return {'error': f'Servidor ocupado, tente novamente em instantes. {e}'}, 503
+
+    if status is None:
+        return {'error': 'Job não encontrado.'}, 404
+    if not started:
+        return {'message': f"O job está '{status['state']}' e não pode ser retomado.", **bulk_job_payload(status)}, 409
+    return {'message': 'Job retomado a partir do último lote gravado.', **bulk_job_payload(status)}, 202
+
+
+# Arquivo de resultados de um job: (caminho, tipo, nome do download) ou None
+def bulk_job_results_file(job_id: str):
+    path = bulk_job_manager.results_path(job_id)
+    if path is None:
+        return None
+    output_format = os.path.splitext(path)[1].lstrip('.')
+    return os.path.abspath(path), BULK_RESULTS_MIMETYPES[output_format], f"{job_id}.{output_format}"
+
+
+# Chamado quando a rota POST /jobs e acessada (campo 'file'; opcionais: format, output, text_column)
+def create_bulk_job():
+    uploaded_file = request.files.get('file')
+    payload, status = create_bulk_job_result(
+        uploaded_file.filename if uploaded_file is not None else '',
+        uploaded_file.save if uploaded_file is not None else None,
+        request.content_length,
+        request.form.get('format'),
+        request.form.get('output'),
+        request.form.get('text_column')
+    )
+    return jsonify(payload), status
+
+
+# Chamado quando a rota GET /jobs/<job_id> e acessada
+def bulk_job_status(job_id: str):
+    payload, status = bulk_job_status_result(job_id)
+    return jsonify(payload), status
+
+
+# Chamado quando a rota POST /jobs/<job_id>/resume e acessada
+def resume_bulk_job(job_id: str):
+    payload, status = resume_bulk_job_result(job_id)
+    return jsonify(payload), status
+
+
+# Chamado quando a rota GET /jobs/<job_id>/results e acessada (resultados parciais enquanto o job roda)
+def bulk_job_results(job_id: str):
+    results_file = bulk_job_results_file(job_id)
+    if results_file is None:
+        return jsonify({'error': 'Resultados não encontrados.'}), 404
+    path, mimetype, download_name = results_file
+    return send_file(path, mimetype=mimetype, as_attachment=True, download_name=download_name)
@@ -1,6 +1,8 @@
 from myApp import create_app
 
-app = create_app()
+# Os processos do pool de PDFs (forkserver) importam este arquivo de novo como __mp_main__
+if __name__ != '__mp_main__':
+    app = create_app()
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -5,13 +5,15 @@ import sys # Para sys.exit()
 
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 from transformers.trainer import Trainer
+from transformers.trainer_pt_utils import LengthGroupedSampler
 from transformers.training_args import TrainingArguments
 
 from torch.utils.data import Dataset, DataLoader
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, precision_recall_fscore_support
 
-from myApp.data.data_preprocessing import EmailDataset, prepare_data_for_ia
+from myApp.data.data_preprocessing import PaddingStats, length_buckets, prepare_data_for_ia, stream_prepare_to_disk
+from myApp.data.token_store import TokenStoreCollator, TokenStoreDataset, write_token_store
 
 from dotenv import load_dotenv 
 
@@ -38,6 +40,13 @@ BATCH_SIZE = int(os.getenv("BATCH_SIZE", 1)) # Reduzi de 8 para 1 para economiza
 LEARNING_RATE = float(os.getenv("LEARNING_RATE", 2e-5))
 NUM_EPOCHS = int(os.getenv("NUM_EPOCHS", 3))
 
+# Modo streaming: CSVs lidos em blocos e tokens gravados em disco (para datasets maiores que a RAM)
+STREAMING_DATASET = os.getenv("STREAMING_DATASET", "False").lower() == "true"
+# Diretorio dos datasets tokenizados em disco (memoria mapeada) usados no treino
+PREPARED_DATASET_DIR = os.getenv("PREPARED_DATASET_DIR", "./prepared_dataset")
+# Processos do DataLoader (compartilham os arquivos mapeados em memoria)
+DATALOADER_WORKERS = int(os.getenv("DATALOADER_WORKERS", 0))
+
 
 # Variável para armazenar a decisão final do dispositivo
 final_device = "cpu" # Assume CPU por padrão
@@ -76,6 +85,25 @@ def compute_metrics(pred):
         'recall': recall
     }
 
+
+# --- Trainer com group_by_length usando os tamanhos gravados no token store ---
+class TokenStoreTrainer(Trainer):
+    """
+    Com group_by_length=True o Trainer mede cada amostra lendo o dataset item por item
+    (a menos que seja um datasets.Dataset com length_column_name). O TokenStoreDataset ja
+    tem os tamanhos nos offsets: o sampler os recebe direto, sem ler os tokens do memmap.
+    """
+
+    def _get_train_sampler(self, *args, **kwargs):
+        train_dataset = args[0] if args else kwargs.get('train_dataset', self.train_dataset)
+        if self.args.group_by_length and isinstance(train_dataset, TokenStoreDataset):
+            return LengthGroupedSampler(
+                self.args.train_batch_size * self.args.gradient_accumulation_steps,
+                dataset=train_dataset,
+                lengths=train_dataset.lengths.tolist()
+            )
+        return super()._get_train_sampler(*args, **kwargs)
+
 # --- Bloco de execução principal do script ---
 if __name__ == "__main__":
     print("--- Iniciando Treinamento do Classificador de E-mails ---")
@@ -166,50 +194,67 @@ if __name__ == "__main__":
     text_col = 'message' 
     category_col = 'label' 
 
-    df_final = prepare_data_for_ia(
-        file_paths=all_csv_paths,
-        text_column=text_col, 
-        category_column=category_col
-    )
+    if STREAMING_DATASET:
+        # Le os CSVs em blocos e grava os tokens em disco: a RAM nao depende do tamanho do corpus
+        summary = stream_prepare_to_disk(
+            file_paths=all_csv_paths,
+            output_dir=PREPARED_DATASET_DIR,
+            text_column=text_col,
+            category_column=category_col
+        )
+
+        if summary is None or not summary['train']['num_samples']:
+            print("Erro na preparação dos dados em streaming. O treinamento não pode continuar.")
+            sys.exit(1) # Use sys.exit(1) para indicar erro
+
+        print(f"\nConjunto de Treinamento: {summary['train']['num_samples']} amostras")
+        print(f"Conjunto de Validação: {summary['val']['num_samples']} amostras")
+
+    else:
+        df_final = prepare_data_for_ia(
+            file_paths=all_csv_paths,
+            text_column=text_col, 
+            category_column=category_col
+        )
     
-    if df_final is None:
-        print("Erro na preparação dos dados. O treinamento não pode continuar.")
-        sys.exit(1) # Use sys.exit(1) para indicar erro
+        if df_final is None:
+            print("Erro na preparação dos dados. O treinamento não pode continuar.")
+            sys.exit(1) # Use sys.exit(1) para indicar erro
 
-    if 'numeric_labels' not in df_final.columns:
-        print("ERRO: Coluna 'numeric_labels' não encontrada no DataFrame. Verifique o mapeamento de categorias em data_preprocessing.py.")
-        sys.exit(1) # Use sys.exit(1) para indicar erro
+        if 'numeric_labels' not in df_final.columns:
+            print("ERRO: Coluna 'numeric_labels' não encontrada no DataFrame. Verifique o mapeamento de categorias em data_preprocessing.py.")
+            sys.exit(1) # Use sys.exit(1) para indicar erro
     
-    # ======================================================================================
-    # --- PRÓXIMO BLOCO: DIVISÃO E CRIAÇÃO DE DATASETS (fica logo após a prep de dados) ----
-    # ======================================================================================
+        # ======================================================================================
+        # --- PRÓXIMO BLOCO: DIVISÃO E CRIAÇÃO DE DATASETS (fica logo após a prep de dados) ----
+        # ======================================================================================
     
-    train_df, val_df = train_test_split(
-        df_final, 
-        test_size=0.2, 
-        random_state=42, 
-        stratify=df_final['numeric_labels'] 
-    )
-
-    print(f"\nConjunto de Treinamento: {len(train_df)} amostras")
-    print(f"Conjunto de Validação: {len(val_df)} amostras")
-
-    train_encodings = {
-        'input_ids': train_df['input_ids'].tolist(),
-        'attention_mask': train_df['attention_mask'].tolist(),
-        'token_type_ids': train_df['token_type_ids'].tolist() if 'token_type_ids' in df_final.columns else None
-    }
-    val_encodings = {
-        'input_ids': val_df['input_ids'].tolist(),
-        'attention_mask': val_df['attention_mask'].tolist(),
-        'token_type_ids': val_df['token_type_ids'].tolist() if 'token_type_ids' in df_final.columns else None
-    }
-
-    train_encodings = {k: v for k, v in train_encodings.items() if v is not None}
-    val_encodings = {k: v for k, v in val_encodings.items() if v is not None}
-
-    train_dataset = EmailDataset(train_encodings, train_df['numeric_labels'].tolist())
-    val_dataset = EmailDataset(val_encodings, val_df['numeric_labels'].tolist())
+        train_df, val_df = train_test_split(
+            df_final, 
+            test_size=0.2, 
+            random_state=42, 
+            stratify=df_final['numeric_labels'] 
+        )
+
+        print(f"\nConjunto de Treinamento: {len(train_df)} amostras")
+        print(f"Conjunto de Validação: {len(val_df)} amostras")
+
+        # Grava os tokens em disco (formato binario compacto) e libera as listas Python da memoria
+        vocab_size = len(AutoTokenizer.from_pretrained(MODEL_NAME))
+        write_token_store(os.path.join(PREPARED_DATASET_DIR, 'train'), train_df['input_ids'], train_df['numeric_labels'], vocab_size)
+        write_token_store(os.path.join(PREPARED_DATASET_DIR, 'val'), val_df['input_ids'], val_df['numeric_labels'], vocab_size)
+        del df_final, train_df, val_df
+
+    # Datasets lidos com memoria mapeada (views sem copia dos tokens em disco)
+    train_dataset = TokenStoreDataset(os.path.join(PREPARED_DATASET_DIR, 'train'))
+    val_dataset = TokenStoreDataset(os.path.join(PREPARED_DATASET_DIR, 'val'))
+    train_lengths = train_dataset.lengths.tolist()
+
+    # Estimativa da economia do padding dinamico com lotes agrupados por tamanho
+    padding_stats = PaddingStats(MAX_LENGTH)
+    for batch_indexes in length_buckets(train_lengths, BATCH_SIZE):
+        padding_stats.update([train_lengths[i] for i in batch_indexes])
+    print(f"Padding dinamico: {padding_stats.saved_fraction:.1%} dos tokens de padding (max_length={MAX_LENGTH}) economizados por epoca.")
 
     # =========================================================================
     # --------- PRÓXIMO BLOCO: CARREGAMENTO DO MODELO E TOKENIZADOR -----------
@@ -239,6 +284,8 @@ if __name__ == "__main__":
         load_best_model_at_end=True,
         metric_for_best_model="f1",
         greater_is_better=True,
+        group_by_length=True, # Lotes com e-mails de tamanho parecido (menos padding; tamanhos lidos dos offsets)
+        dataloader_num_workers=DATALOADER_WORKERS,
         report_to="none"
     )
 
@@ -247,11 +294,12 @@ if __name__ == "__main__":
     # =========================================================================
 
     print("\n--- Inicializando e Treinando o Modelo ---")
-    trainer = Trainer(
+    trainer = TokenStoreTrainer(
         model=model,
         args=training_args,
         train_dataset=train_dataset,
         eval_dataset=val_dataset,
+        data_collator=TokenStoreCollator(tokenizer.pad_token_id), # Padding ate o maior item de cada lote
         compute_metrics=compute_metrics,
     )
 
@@ -0,0 +1,172 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+# Permite rodar a partir da pasta Backend: python util/benchmark_cpu_layout.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mesmos corpora e configuracao do benchmark de inferencia (cache e micro-batching desligados)
+from benchmark_inference import LENGTH_PROFILES, build_corpora, percentiles
+
+import torch
+from dotenv import load_dotenv
+
+from myApp import routes
+from myApp.cpu_layout import available_cores, core_sets
+
+load_dotenv()
+
+# ============================================================================
+# ------------------------------- Configurações ------------------------------
+# ============================================================================
+#
+# Compara layouts de CPU para servir o modelo nesta maquina: num de workers, threads do torch
+# por worker (TORCH_INTRA_OP_THREADS) e afinidade (CPU_AFFINITY). Cada worker e um processo com
+# o seu modelo atendendo requisicoes em sequencia (como um worker sync do Gunicorn), todos ao
+# mesmo tempo por DURATION segundos. Mostra vazao total e latencia por requisicao (p50/p95/p99).
+#
+# Layouts testados para N nucleos e W workers (W = 1, 2, 4, ... ate N):
+#   dividido   - N/W threads por worker (TORCH_INTRA_OP_THREADS=auto)
+#   fixado     - N/W threads e cada worker nos seus nucleos (CPU_AFFINITY=True)
+#   sobreposto - N threads por worker (padrao do torch sem este ajuste: oversubscription)
+#
+# Exemplo: python util/benchmark_cpu_layout.py --duration 20 --profile medium
+
+# Tempo (s) de cada layout e requisicoes de aquecimento por worker
+BENCHMARK_DURATION_SECONDS = 10
+WARMUP_REQUESTS = 5
+
+# E-mails por requisicao (1 = um /upload com um e-mail)
+EMAILS_PER_REQUEST = 1
+
+# ============================================================================
+# --------------------------- Benchmark de layouts ---------------------------
+# ============================================================================
+
+
+def candidate_layouts(cores: int, worker_counts: list[int] | None) -> list[dict]:
+    worker_counts = worker_counts or sorted({w for w in (1, 2, 4, 8, 16, 32, 64) if w <= cores} | {cores})
+    layouts = []
+    for workers in worker_counts:
+        threads = max(1, cores // workers)
+        layouts.append({'name': 'dividido', 'workers': workers, 'threads': threads, 'pinned': False})
+        if workers > 1:
+            layouts.append({'name': 'fixado', 'workers': workers, 'threads': threads, 'pinned': True})
+            if threads < cores:
+                layouts.append({'name': 'sobreposto', 'workers': workers, 'threads': cores, 'pinned': False})
+    return layouts
+
+
+def run_worker(cores: list[int] | None, threads: int, texts: list[str], emails_per_request: int,
+               duration: float, ready_barrier, start_barrier, result_queue):
+    # Processo de um worker: aplica o layout, carrega o modelo e atende requisicoes em sequencia
+    try:
+        if cores:
+            os.sched_setaffinity(0, cores)
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+
+        routes.model_manager.start('eager')
+        if not routes.model_manager.ready:
+            raise RuntimeError(f"Modelo nao carregado: {routes.model_manager.status().get('error')}")
+        requests = [texts[i:i + emails_per_request] for i in range(0, len(texts), emails_per_request)]
+        for request in requests[:WARMUP_REQUESTS]:
+            routes.classify_emails(request)
+    except Exception as e:
+        print(f"ERRO: Falha ao preparar o worker: {e}")
+        ready_barrier.abort() # Libera o processo principal (BrokenBarrierError)
+        return
+
+    ready_barrier.wait()
+    start_barrier.wait()
+
+    latencies = []
+    deadline = time.perf_counter() + duration
+    i = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        routes.classify_emails(requests[i % len(requests)])
+        latencies.append((time.perf_counter() - start) * 1000)
+        i += 1
+    result_queue.put(latencies)
+
+
+def run_layout(layout: dict, texts: list[str], emails_per_request: int, duration: float) -> dict:
+    context = multiprocessing.get_context('spawn')
+    workers = layout['workers']
+    ready_barrier, start_barrier = context.Barrier(workers + 1), context.Barrier(workers + 1)
+    worker_cores = core_sets(available_cores(), workers) if layout['pinned'] else [None] * workers
+
+    result_queue = context.Queue()
+    processes = [
+        context.Process(target=run_worker, args=(worker_cores[i], layout['threads'], texts, emails_per_request,
+                                                 duration, ready_barrier, start_barrier, result_queue))
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        ready_barrier.wait() # Todos os modelos carregados e aquecidos
+        start = time.perf_counter()
+        start_barrier.wait()
+        latencies = [latency for _ in processes for latency in result_queue.get()]
+        elapsed = time.perf_counter() - start
+    finally:
+        for process in processes:
+            process.join()
+
+    return {
+        **layout,
+        'requests': len(latencies),
+        'emails_per_second': len(latencies) * emails_per_request / elapsed,
+        **{f'latency_ms_{name}': value for name, value in percentiles(latencies).items()}
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compara layouts de workers/threads/afinidade para a inferencia na CPU.")
+    parser.add_argument('--workers', type=int, nargs='+', help="Num de workers testados (padrao: 1, 2, 4, ... nucleos)")
+    parser.add_argument('--duration', type=float, default=BENCHMARK_DURATION_SECONDS, help="Segundos por layout")
+    parser.add_argument('--profile', choices=list(LENGTH_PROFILES), default='medium', help="Perfil de tamanho dos e-mails")
+    parser.add_argument('--samples', type=int, default=200, help="E-mails distintos no corpus")
+    parser.add_argument('--emails-per-request', type=int, default=EMAILS_PER_REQUEST)
+    parser.add_argument('--output', help="Grava os resultados em JSON")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    cores = available_cores()
+    texts = build_corpora([args.profile], max(1, args.samples))[args.profile]
+    layouts = candidate_layouts(len(cores), args.workers)
+
+    print(f"--- {len(layouts)} layout(s) em {len(cores)} nucleo(s), perfil '{args.profile}', {args.duration:.0f}s cada ---")
+    print(f"{'layout':12}{'workers':>8}{'threads':>9}{'e-mails/s':>12}{'p50':>10}{'p95':>10}{'p99':>10}")
+
+    results = []
+    for layout in layouts:
+        try:
+            result = run_layout(layout, texts, max(1, args.emails_per_request), args.duration)
+        except threading.BrokenBarrierError:
+            print("ERRO: Um dos workers falhou ao carregar o modelo (veja a mensagem acima).")
+            sys.exit(1)
+        results.append(result)
+        print(f"{result['name']:12}{result['workers']:>8}{result['threads']:>9}{result['emails_per_second']:>12.1f}"
+              f"{result['latency_ms_p50']:>8.1f}ms{result['latency_ms_p95']:>8.1f}ms{result['latency_ms_p99']:>8.1f}ms")
+
+    best_throughput = max(results, key=lambda r: r['emails_per_second'])
+    best_tail = min(results, key=lambda r: r['latency_ms_p99'])
+    for title, best in (('Maior vazao', best_throughput), ('Menor latencia p99', best_tail)):
+        print(f"\n{title}: {best['name']} com {best['workers']} worker(s) x {best['threads']} thread(s) "
+              f"({best['emails_per_second']:.1f} e-mails/s, p99 {best['latency_ms_p99']:.1f} ms)")
+        print(f"  .env: GUNICORN_WORKERS={best['workers']} TORCH_INTRA_OP_THREADS={best['threads']} "
+              f"CPU_AFFINITY={best['pinned']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'cores': len(cores), 'profile': args.profile, 'results': results}, f, indent=2)
+        print(f"\nResultado gravado em '{args.output}'.")
@@ -0,0 +1,341 @@
+import argparse
+import csv
+import io
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# Permite rodar a partir da pasta Backend: python util/benchmark_inference.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# O benchmark mede o caminho da classificacao, entao tudo que desviaria dele fica desligado:
+# cache de resultados (os textos se repetem entre as rodadas) e micro-batching (sem concorrencia aqui)
+os.environ['RESULT_CACHE_SIZE'] = '0'
+os.environ['RESULT_CACHE_DIR'] = ''
+os.environ['MICRO_BATCHING'] = 'False'
+os.environ['MODEL_LOADING'] = 'eager'
+
+import torch
+from dotenv import load_dotenv
+
+from myApp import create_app, routes
+from myApp.long_documents import sliding_windows
+from myApp.model_manager import MODEL_PATH, inference_context
+
+load_dotenv()
+
+# ============================================================================
+# ------------------------------- Configurações ------------------------------
+# ============================================================================
+#
+# Mede latencia (p50/p95/p99, um e-mail por vez) de cada etapa da classificacao - limpeza,
+# tokenizacao, forward pass e o /upload completo -, vazao (e-mails/s) em varios tamanhos de
+# lote e num de threads do torch e o pico de memoria residente. O resultado vai para um JSON
+# e, se existir um baseline, e comparado com ele (o script sai com erro se algo piorou).
+#
+# Exemplo (a partir da pasta Backend, com o modelo de MODEL_PATH):
+#   python util/benchmark_inference.py --save-baseline   # grava o baseline desta maquina
+#   python util/benchmark_inference.py                   # depois da mudanca: compara com o baseline
+# (compare sempre na mesma maquina, com o mesmo modelo e a mesma configuracao do .env)
+
+BACKEND_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Datasets do treino, base dos corpora do benchmark
+DATASETS_PATH = os.path.join(BACKEND_PATH, 'myApp', 'data', 'datasets')
+DATASET_LANGUAGES = ['en', 'pt']
+
+# Resultados de cada execucao e baseline usado na comparacao
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks')
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, 'baseline.json')
+
+# Perfis de tamanho (palavras aproximadas do e-mail bruto; 0 = linha do CSV como esta)
+LENGTH_PROFILES = {
+    'short': 0,     # mensagens reais dos CSVs
+    'medium': 250,  # e-mail completo: cabecalhos, corpo, link, assinatura e mensagem original citada
+    'long': 4000    # conversa longa com varias respostas citadas (e-mails acima de MAX_LENGTH tokens)
+}
+
+# E-mails por perfil e e-mails descartados antes de medir (aquecimento)
+BENCHMARK_SAMPLES = 200
+WARMUP_SAMPLES = 10
+
+# Tempo min (s) de cada medida de vazao (o corpus e repetido ate atingir)
+MIN_THROUGHPUT_SECONDS = 1.0
+
+# Variacao aceita em relacao ao baseline antes de acusar piora (fracao: 0.10 = 10%)
+REGRESSION_TOLERANCE = 0.10
+
+# ============================================================================
+# -------------------------------- Corpora -----------------------------------
+# ============================================================================
+
+
+def load_messages() -> list[str]:
+    messages = []
+    for lang in DATASET_LANGUAGES:
+        with open(os.path.join(DATASETS_PATH, f'email_dataset_{lang}.csv'), encoding='utf-8-sig', newline='') as f:
+            messages.extend(row[0] for row in list(csv.reader(f))[1:] if row and row[0].strip())
+    return messages
+
+
+def synthetic_email(rng: random.Random, messages: list[str], target_words: int, i: int) -> str:
+    # E-mail "completo" montado com mensagens reais ate ter ~target_words palavras
+    parts = [
+        f"From: sender{i}@example.com\nTo: team@example.com\nSubject: {rng.choice(messages)[:60]}\n"
+        f"Date: Mon, {1 + i % 28} Jan 2024 10:{i % 60:02d}:00 -0300\nContent-Type: text/plain; charset=utf-8\n\n"
+        f"{rng.choice(messages)}\nSee https://example.com/tickets/{i} or www.site.com"
+    ]
+    words = sum(len(part.split()) for part in parts)
+    while words < target_words:
+        reply = rng.choice(messages)
+        parts.append(
+            f"\nOn Tue, {1 + rng.randrange(28)} Jan 2024, someone{rng.randrange(1000)}@example.com wrote:\n"
+            + '\n'.join(f"> {line}" for line in reply.splitlines() or [reply])
+        )
+        words += len(reply.split()) + 6
+    parts.append("\nBest regards,\nJohn\n-----Original Message-----\n" + rng.choice(messages))
+    return '\n'.join(parts)
+
+
+def build_corpora(profiles: list[str], samples: int, seed: int = 42) -> dict[str, list[str]]:
+    messages = load_messages()
+    rng = random.Random(seed)
+
+    corpora = {}
+    for profile in profiles:
+        target_words = LENGTH_PROFILES[profile]
+        if target_words == 0:
+            corpora[profile] = [rng.choice(messages) for _ in range(samples)]
+        else:
+            corpora[profile] = [synthetic_email(rng, messages, target_words, i) for i in range(samples)]
+    return corpora
+
+
+# ============================================================================
+# -------------------------------- Medidas -----------------------------------
+# ============================================================================
+
+
+def percentiles(latencies_ms: list[float]) -> dict:
+    cuts = statistics.quantiles(latencies_ms, n=100, method='inclusive') if len(latencies_ms) > 1 else latencies_ms * 99
+    return {'p50': cuts[49], 'p95': cuts[94], 'p99': cuts[98]}
+
+
+def timed(function, items: list) -> list[float]:
+    # Latencia (ms) de cada item, depois de WARMUP_SAMPLES chamadas de aquecimento
+    for item in items[:WARMUP_SAMPLES]:
+        function(item)
+
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        function(item)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def encode(bundle, cleaned_text: str) -> list[list[int]]:
+    # Mesma tokenizacao de routes.predict_cleaned_texts (truncada ou janelas no modo de e-mails longos)
+    if routes.LONG_DOCUMENT_MODE:
+        token_ids = bundle.tokenizer(cleaned_text, add_special_tokens=False, verbose=False)['input_ids']
+        return sliding_windows(
+            bundle.tokenizer, token_ids, routes.MAX_LENGTH, routes.LONG_DOCUMENT_OVERLAP, routes.LONG_DOCUMENT_MAX_WINDOWS
+        )[0]
+    return [bundle.tokenizer(cleaned_text, truncation=True, max_length=routes.MAX_LENGTH)['input_ids']]
+
+
+def forward(bundle, windows: list[list[int]]):
+    inputs = bundle.tokenizer.pad({'input_ids': windows}, padding='longest', return_tensors="pt")
+    inputs = {k: v.to(bundle.device) for k, v in inputs.items()}
+    with inference_context(bundle):
+        return bundle.model(**inputs).logits
+
+
+def measure_latencies(client, bundle, texts: list[str]) -> dict:
+    clean = lambda text: routes.email_preprocessor.clean_text(text, max_words=routes.CLEAN_TEXT_MAX_WORDS)
+    cleaned_texts = [clean(text) for text in texts]
+    windows = [encode(bundle, text) for text in cleaned_texts]
+
+    def upload(text):
+        response = client.post('/upload', data={'files': [(io.BytesIO(text.encode('utf-8')), 'email.txt', 'text/plain')]})
+        if response.status_code != 200:
+            raise RuntimeError(f"/upload respondeu {response.status_code}: {response.get_data(as_text=True)[:200]}")
+
+    return {
+        'cleaning': percentiles(timed(clean, texts)),
+        'tokenization': percentiles(timed(lambda text: encode(bundle, text), cleaned_texts)),
+        'forward': percentiles(timed(lambda email_windows: forward(bundle, email_windows), windows)),
+        'upload': percentiles(timed(upload, texts))
+    }
+
+
+def measure_throughput(texts: list[str], batch_size: int, threads: int) -> float:
+    # E-mails/s de routes.classify_emails (limpeza + tokenizacao + modelo) com `threads` threads do torch
+    previous_threads = torch.get_num_threads()
+    torch.set_num_threads(threads)
+    try:
+        routes.classify_emails(texts[:max(batch_size, WARMUP_SAMPLES)], batch_size) # Aquecimento
+
+        emails = 0
+        start = time.perf_counter()
+        while True:
+            routes.classify_emails(texts, batch_size)
+            emails += len(texts)
+            elapsed = time.perf_counter() - start
+            if elapsed >= MIN_THROUGHPUT_SECONDS:
+                return emails / elapsed
+    finally:
+        torch.set_num_threads(previous_threads)
+
+
+def resident_memory_mb(peak: bool = False) -> float:
+    # Memoria residente atual (Linux) ou o pico do processo (ru_maxrss)
+    if not peak:
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 ** 2)
+        except (OSError, ValueError):
+            pass
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / (1024 ** 2) if sys.platform == 'darwin' else peak_rss / 1024
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_PATH, check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(profiles: list[str], samples: int, batch_sizes: list[int], thread_counts: list[int]) -> dict:
+    corpora = build_corpora(profiles, samples)
+
+    rss_before_model = resident_memory_mb()
+    loading_start = time.perf_counter()
+    app = create_app() # Carrega o modelo (MODEL_LOADING=eager)
+    bundle = routes.model_manager.get()
+    if bundle is None:
+        raise RuntimeError(f"Modelo nao carregado: {routes.model_manager.status().get('error')}")
+    metrics = {
+        'model_load_seconds': time.perf_counter() - loading_start,
+        'memory_mb.model_rss': resident_memory_mb() - rss_before_model
+    }
+    print(f"Modelo carregado em {metrics['model_load_seconds']:.1f}s ({bundle.backend}, {bundle.device})")
+
+    client = app.test_client()
+    for profile, texts in corpora.items():
+        print(f"Latencia por etapa: perfil '{profile}' ({len(texts)} e-mails)...")
+        for stage, cuts in measure_latencies(client, bundle, texts).items():
+            for name, value in cuts.items():
+                metrics[f'latency_ms.{stage}.{profile}.{name}'] = value
+
+        for threads in thread_counts:
+            for batch_size in batch_sizes:
+                emails_per_second = measure_throughput(texts, batch_size, threads)
+                metrics[f'throughput_eps.{profile}.batch{batch_size}.threads{threads}'] = emails_per_second
+            print(f"  vazao com {threads} thread(s): " + ", ".join(
+                f"lote {b}: {metrics[f'throughput_eps.{profile}.batch{b}.threads{threads}']:.1f} e-mails/s" for b in batch_sizes
+            ))
+
+    metrics['memory_mb.peak_rss'] = resident_memory_mb(peak=True)
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'model_path': MODEL_PATH,
+            'model_version': bundle.version,
+            'inference_backend': bundle.backend,
+            'inference_precision': bundle.precision,
+            'device': str(bundle.device),
+            'max_length': routes.MAX_LENGTH,
+            'long_document_mode': routes.LONG_DOCUMENT_MODE,
+            'clean_text_budget': routes.CLEAN_TEXT_BUDGET,
+            'samples': samples,
+            'cpu_count': os.cpu_count(),
+            'python': platform.python_version(),
+            'torch': torch.__version__
+        },
+        'metrics': metrics
+    }
+
+
+# ============================================================================
+# ------------------------- Comparacao com o baseline ------------------------
+# ============================================================================
+
+
+def higher_is_better(metric: str) -> bool:
+    return metric.startswith('throughput_eps.')
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    # Avisa se a configuracao mudou (a comparacao so faz sentido nas mesmas condicoes)
+    for key in ('model_version', 'inference_backend', 'inference_precision', 'device', 'max_length', 'long_document_mode', 'cpu_count'):
+        if results['meta'].get(key) != baseline['meta'].get(key):
+            print(f"AVISO: '{key}' difere do baseline ({baseline['meta'].get(key)} -> {results['meta'].get(key)}).")
+
+    regressions = []
+    print(f"\n{'métrica':58}{'baseline':>12}{'atual':>12}{'variação':>11}")
+    for metric, value in results['metrics'].items():
+        base = baseline['metrics'].get(metric)
+        if base is None or base <= 0:
+            continue
+
+        change = (value - base) / base
+        worse = -change if higher_is_better(metric) else change
+        flag = ' PIOR' if worse > tolerance else (' melhor' if worse < -tolerance else '')
+        if worse > tolerance:
+            regressions.append(metric)
+        print(f"{metric:58}{base:>12.2f}{value:>12.2f}{change:>+10.1%}{flag}")
+
+    if regressions:
+        print(f"\nERRO: {len(regressions)} métrica(s) pioraram mais de {tolerance:.0%} em relação ao baseline "
+              f"({baseline['meta'].get('git_commit')}, {baseline['meta'].get('timestamp')}).")
+        return False
+
+    print(f"\nOK: Nenhuma métrica piorou mais de {tolerance:.0%} em relação ao baseline.")
+    return True
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de latencia, vazao e memoria da classificacao.")
+    parser.add_argument('--profiles', nargs='+', choices=list(LENGTH_PROFILES), default=list(LENGTH_PROFILES))
+    parser.add_argument('--samples', type=int, default=BENCHMARK_SAMPLES, help="E-mails por perfil")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32, 64])
+    parser.add_argument('--threads', type=int, nargs='+', default=None, help="Threads do torch (padrao: 1, 2, 4, ... CPUs)")
+    parser.add_argument('--output', help="JSON de saida (padrao: util/benchmarks/<data>.json)")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="JSON usado na comparacao")
+    parser.add_argument('--save-baseline', action='store_true', help="Grava o resultado como o novo baseline")
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE, help="Piora aceita (fracao)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    cpu_count = os.cpu_count() or 1
+    thread_counts = args.threads or sorted({n for n in (1, 2, 4, 8, 16, 32) if n < cpu_count} | {cpu_count})
+
+    results = run_benchmark(args.profiles, max(1, args.samples), args.batch_sizes, thread_counts)
+
+    os.makedirs(BENCHMARK_DIR, exist_ok=True)
+    output_path = args.output or os.path.join(BENCHMARK_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    for path in [output_path] + ([args.baseline] if args.save_baseline else []):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Resultado gravado em '{path}'.")
+
+    if args.save_baseline or not os.path.isfile(args.baseline):
+        sys.exit(0)
+
+    with open(args.baseline, encoding='utf-8') as f:
+        sys.exit(0 if compare(results, json.load(f), args.tolerance) else 1)
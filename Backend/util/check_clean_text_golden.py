@@ -0,0 +1,120 @@
+import csv
+import json
+import os
+import sys
+
+# Permite rodar a partir da pasta Backend: python util/check_clean_text_golden.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from myApp.data.data_preprocessing import EmailPreprocessor
+
+
+# ============================================================================
+# ------------------------------- Configurações ------------------------------
+# ============================================================================
+
+# Datasets usados como base do teste golden
+DATASETS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'myApp', 'data', 'datasets')
+DATASET_LANGUAGES = ['en', 'pt']
+
+# Saida esperada de EmailPreprocessor.clean_text (gerada com a implementacao original)
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'clean_text_golden.json')
+
+# clean_text(text, max_words=N) deve devolver as primeiras N palavras da limpeza completa
+BUDGET_MAX_WORDS = [1, 8, 64, 128]
+# Entradas do golden juntadas em e-mails longos (varias mensagens, assinaturas e cabecalhos no meio)
+BUDGET_JOINED_INPUTS = 40
+
+# ============================================================================
+# ----------------------- Script de Verificação (golden) ---------------------
+# ============================================================================
+
+
+def build_inputs() -> list[str]:
+    # Cada linha dos CSVs e usada pura e tambem dentro de e-mails "completos"
+    # (cabecalhos, URLs, enderecos, assinatura e mensagem encaminhada)
+    inputs = []
+
+    for lang in DATASET_LANGUAGES:
+        with open(os.path.join(DATASETS_PATH, f'email_dataset_{lang}.csv'), encoding='utf-8-sig', newline='') as f:
+            messages = [row[0] for row in csv.reader(f) if row][1:]
+
+        for i, message in enumerate(messages):
+            next_message = messages[(i + 1) % len(messages)]
+            inputs.append(message)
+            inputs.append(
+                f"From: someone{i}@example.com\nTo: team@example.com\nSubject: {next_message}\n\n"
+                f"{message}\nSee https://example.com/{i} or www.site.com\n\n"
+                f"Best regards,\nJohn\n-----Original Message-----\n{next_message}"
+            )
+            inputs.append(f"{message}\n___\n{next_message}\nSent from my BlackBerry")
+
+    return inputs
+
+
+def check_golden(update: bool = False) -> bool:
+    preprocessor = EmailPreprocessor()
+    inputs = build_inputs()
+    outputs = [preprocessor.clean_text(text) for text in inputs]
+
+    if update:
+        with open(GOLDEN_PATH, 'w', encoding='utf-8') as f:
+            json.dump(outputs, f, ensure_ascii=False, indent=0)
+        print(f"Golden atualizado com {len(outputs)} saídas em '{GOLDEN_PATH}'.")
+        return True
+
+    with open(GOLDEN_PATH, encoding='utf-8') as f:
+        expected = json.load(f)
+
+    if len(expected) != len(outputs):
+        print(f"ERRO: O golden tem {len(expected)} saídas, mas foram geradas {len(outputs)} entradas.")
+        return False
+
+    mismatches = [i for i, (out, exp) in enumerate(zip(outputs, expected)) if out != exp]
+    for i in mismatches[:10]:
+        print(f"Divergência na entrada {i}:\n  entrada:  {inputs[i]!r}\n  esperado: {expected[i]!r}\n  obtido:   {outputs[i]!r}")
+
+    if mismatches:
+        print(f"ERRO: {len(mismatches)} de {len(outputs)} saídas diferentes do golden.")
+        return False
+
+    print(f"OK: {len(outputs)} saídas idênticas ao golden.")
+    return True
+
+
+def check_budget() -> bool:
+    preprocessor = EmailPreprocessor()
+    inputs = build_inputs()
+    long_inputs = [
+        separator.join(inputs[start:start + BUDGET_JOINED_INPUTS])
+        for start in range(0, len(inputs), BUDGET_JOINED_INPUTS)
+        for separator in ('\n', ' ', '\n\n')
+    ]
+
+    mismatches = 0
+    for text in inputs + long_inputs:
+        words = preprocessor.clean_text(text).split(' ')
+        for max_words in BUDGET_MAX_WORDS:
+            expected = ' '.join(words[:max_words])
+            obtained = preprocessor.clean_text(text, max_words=max_words)
+            if obtained != expected:
+                mismatches += 1
+                if mismatches <= 10:
+                    print(f"Divergência com max_words={max_words}:\n  esperado: {expected!r}\n  obtido:   {obtained!r}")
+
+    if mismatches:
+        print(f"ERRO: {mismatches} saídas com max_words diferentes da limpeza completa.")
+        return False
+
+    print(f"OK: limpeza com max_words idêntica à limpeza completa ({len(inputs) + len(long_inputs)} entradas).")
+    return True
+
+
+if __name__ == "__main__":
+    # --update regrava o golden (use apenas quando a mudanca na limpeza for intencional)
+    # e, nesse caso, incremente PREPROCESSOR_VERSION para invalidar os caches de tokenizacao
+    update = '--update' in sys.argv
+    ok = check_golden(update=update)
+    if not update:
+        ok = check_budget() and ok
+    sys.exit(0 if ok else 1)
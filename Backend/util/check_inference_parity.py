@@ -0,0 +1,118 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# Permite rodar a partir da pasta Backend: python util/check_inference_parity.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mesma divisao de validacao da verificacao do modelo quantizado
+from check_quantization_parity import load_validation_split
+
+from dotenv import load_dotenv
+
+from myApp import routes
+from myApp.model_manager import INFERENCE_PRECISIONS, ModelBundle, load_model_bundle, resolve_precision
+
+load_dotenv()
+
+# ============================================================================
+# ------------------------------- Configurações ------------------------------
+# ============================================================================
+#
+# Compara o caminho padrao da classificacao (torch.no_grad, fp32) com o caminho rapido
+# (INFERENCE_FAST_PATH: torch.inference_mode e autocast bf16 opcional) sobre a validacao do
+# treino, com o mesmo modelo e o mesmo routes.predict_cleaned_texts.
+# Mostra concordancia das categorias, maior diferenca de probabilidade e speed-up.
+#
+# Exemplo: python util/check_inference_parity.py --precision bf16 --limit 500
+
+# Fracao max de e-mails com categoria diferente da do caminho padrao (0.01 = 1%)
+MAX_DISAGREEMENT = 0.01
+# Num de e-mails usados para medir a latencia de um e-mail por vez
+LATENCY_SAMPLES = 100
+
+# ============================================================================
+# ---------------------- Script de Verificação (paridade) --------------------
+# ============================================================================
+
+
+def with_fast_path(bundle: ModelBundle, fast_path: bool, precision: str) -> ModelBundle:
+    # Mesmo modelo carregado, outro modo do forward pass
+    return ModelBundle(bundle.tokenizer, bundle.model, bundle.device, bundle.backend,
+                       bundle.fingerprint, bundle.version, fast_path, precision)
+
+
+def benchmark(bundle: ModelBundle, texts: list[str]) -> tuple[list, dict]:
+    routes.predict_cleaned_texts(texts[:8], bundle=bundle) # Aquecimento
+
+    start = time.perf_counter()
+    results = routes.predict_cleaned_texts(texts, bundle=bundle)
+    batch_seconds = time.perf_counter() - start
+
+    latencies = []
+    for text in texts[:LATENCY_SAMPLES]:
+        start = time.perf_counter()
+        routes.predict_cleaned_texts([text], bundle=bundle)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return results, {
+        'emails_per_second': len(texts) / batch_seconds,
+        'latency_ms_p50': statistics.median(latencies)
+    }
+
+
+def check_parity(precision: str, limit: int | None) -> bool:
+    texts, labels = load_validation_split()
+    # E-mails vazios apos a limpeza nao chegam ao modelo no Flask
+    samples = [(text, label) for text, label in zip(texts, labels) if text][:limit]
+    texts, labels = [text for text, _ in samples], [routes.LABEL_MAP.get(label) for _, label in samples]
+
+    loaded = load_model_bundle()
+    fast_precision = resolve_precision(loaded.device, loaded.backend, True, precision)
+    bundles = {
+        'padrão': with_fast_path(loaded, False, 'fp32'),
+        f'rápido {fast_precision}': with_fast_path(loaded, True, fast_precision)
+    }
+    print(f"Validação: {len(texts)} e-mails | Backend: {loaded.backend} ({loaded.device}) | MAX_LENGTH={routes.MAX_LENGTH}")
+
+    results, report = {}, {}
+    for name, bundle in bundles.items():
+        results[name], report[name] = benchmark(bundle, texts)
+        report[name]['accuracy'] = sum(category == label for (category, _), label in zip(results[name], labels)) / len(texts)
+
+    reference, fast = results.values()
+    disagreement = sum(ref[0] != other[0] for ref, other in zip(reference, fast)) / len(texts)
+    max_probability_diff = max(
+        abs(p - q) for ref, other in zip(reference, fast) for p, q in zip(ref[1], other[1])
+    )
+
+    print(f"{'':14}{'acurácia':>10}{'e-mails/s':>12}{'p50 1 e-mail':>15}")
+    for name, result in report.items():
+        print(f"{name:14}{result['accuracy']:>10.2%}{result['emails_per_second']:>12.1f}{result['latency_ms_p50']:>12.2f} ms")
+
+    reference_report, fast_report = report.values()
+    print(f"\nConcordância das previsões: {1 - disagreement:.2%} | Maior diferença de probabilidade: {max_probability_diff:.4f}")
+    print(f"Speed-up (lote): {fast_report['emails_per_second'] / reference_report['emails_per_second']:.2f}x | "
+          f"Speed-up (1 e-mail): {reference_report['latency_ms_p50'] / fast_report['latency_ms_p50']:.2f}x")
+
+    if disagreement > MAX_DISAGREEMENT:
+        print(f"ERRO: O caminho rápido mudou a categoria de {disagreement:.2%} dos e-mails (máx: {MAX_DISAGREEMENT:.2%}).")
+        return False
+
+    print(f"OK: {disagreement:.2%} dos e-mails com categoria diferente (máx: {MAX_DISAGREEMENT:.2%}).")
+    return True
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compara o caminho padrão da inferência com o caminho rápido (inference_mode/bf16).")
+    parser.add_argument('--precision', choices=INFERENCE_PRECISIONS, default='bf16',
+                        help="Precisão do caminho rápido (bf16 usa fp32 se o hardware não suportar)")
+    parser.add_argument('--limit', type=int, help="Max de e-mails da validação")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    sys.exit(0 if check_parity(args.precision, args.limit) else 1)
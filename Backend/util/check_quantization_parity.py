@@ -0,0 +1,174 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Permite rodar a partir da pasta Backend: python util/check_quantization_parity.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import torch
+from dotenv import load_dotenv
+from sklearn.model_selection import train_test_split
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+from myApp.data.data_preprocessing import CATEGORY_MAPPING, EmailPreprocessor, length_buckets
+from myApp.quantization import quantize_model
+
+load_dotenv()
+
+# ============================================================================
+# ------------------------------- Configurações ------------------------------
+# ============================================================================
+
+BACKEND_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modelo comparado (fp32 x INT8 dinamico) - o mesmo servido pelo Flask
+MODEL_PATH = os.getenv("MODEL_PATH", os.path.join(BACKEND_PATH, 'fine_tuned_classifier'))
+MAX_LENGTH = int(os.getenv("MAX_LENGTH", 64))
+INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", 32))
+
+# Datasets do treino (a validacao e a mesma divisao usada em train_classifier.py)
+DATASETS_PATH = os.path.join(BACKEND_PATH, 'myApp', 'data', 'datasets')
+DATASET_LANGUAGES = [lang.strip() for lang in os.getenv("DATASET_LANGUAGES", "en, pt").split(',') if lang.strip()]
+
+# Queda max de acuracia aceita para o modelo quantizado (fracao: 0.01 = 1 ponto percentual)
+MAX_ACCURACY_DROP = 0.01
+# Num de e-mails usados para medir a latencia de um e-mail por vez
+LATENCY_SAMPLES = 100
+
+# ============================================================================
+# ---------------------- Script de Verificação (paridade) --------------------
+# ============================================================================
+
+
+def load_validation_split() -> tuple[list[str], list[int]]:
+    # Reproduz a divisao de train_classifier.py (test_size=0.2, random_state=42, estratificada)
+    all_dfs = [pd.read_csv(os.path.join(DATASETS_PATH, f'email_dataset_{lang}.csv')) for lang in DATASET_LANGUAGES]
+    df = pd.concat(all_dfs, ignore_index=True)
+    df['numeric_labels'] = df['label'].map(CATEGORY_MAPPING)
+    df = df.dropna(subset=['numeric_labels'])
+    df['numeric_labels'] = df['numeric_labels'].astype(int)
+
+    _, val_df = train_test_split(df, test_size=0.2, random_state=42, stratify=df['numeric_labels'])
+
+    preprocessor = EmailPreprocessor()
+    texts = [preprocessor.clean_text(text) for text in val_df['message'].astype(str)]
+    return texts, val_df['numeric_labels'].tolist()
+
+
+def load_model(quantized: bool):
+    model = AutoModelForSequenceClassification.from_pretrained(MODEL_PATH)
+    model.eval()
+    return quantize_model(model) if quantized else model
+
+
+def predict(model, tokenizer, texts: list[str], batch_size: int) -> torch.Tensor:
+    # Mesmo caminho do Flask: lotes por tamanho, padding dinamico, softmax
+    encodings = tokenizer(texts, truncation=True, max_length=MAX_LENGTH)
+    lengths = [len(ids) for ids in encodings['input_ids']]
+    probabilities = torch.zeros((len(texts), model.config.num_labels))
+
+    for batch_indexes in length_buckets(lengths, batch_size):
+        inputs = tokenizer.pad(
+            {key: [values[i] for i in batch_indexes] for key, values in encodings.items()},
+            padding='longest',
+            return_tensors="pt"
+        )
+        with torch.no_grad():
+            probabilities[batch_indexes] = torch.softmax(model(**inputs).logits, dim=-1)
+    return probabilities
+
+
+def benchmark(model, tokenizer, texts: list[str]) -> dict:
+    predict(model, tokenizer, texts[:8], INFERENCE_BATCH_SIZE) # Aquecimento
+
+    start = time.perf_counter()
+    predict(model, tokenizer, texts, INFERENCE_BATCH_SIZE)
+    batch_seconds = time.perf_counter() - start
+
+    latencies = []
+    for text in texts[:LATENCY_SAMPLES]:
+        start = time.perf_counter()
+        predict(model, tokenizer, [text], 1)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        'emails_per_second': len(texts) / batch_seconds,
+        'latency_ms_p50': statistics.median(latencies)
+    }
+
+
+def resident_memory_mb() -> float:
+    # Memoria residente atual do processo (Linux); fora do Linux usa o pico (ru_maxrss)
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 ** 2)
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 ** 2) if sys.platform == 'darwin' else peak / 1024
+
+
+def measure_rss(quantized: bool) -> float:
+    # Cada modelo e medido em um processo novo (memoria liberada nao volta sempre ao SO)
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--rss', 'int8' if quantized else 'fp32'],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])['rss_mb']
+
+
+def check_parity() -> bool:
+    texts, labels = load_validation_split()
+    labels = torch.tensor(labels)
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
+    print(f"Validação: {len(texts)} e-mails | Modelo: '{MODEL_PATH}' | MAX_LENGTH={MAX_LENGTH}")
+
+    report = {}
+    probabilities = {}
+    for name, quantized in (('fp32', False), ('int8', True)):
+        model = load_model(quantized)
+        probabilities[name] = predict(model, tokenizer, texts, INFERENCE_BATCH_SIZE)
+        report[name] = {
+            'accuracy': (probabilities[name].argmax(dim=-1) == labels).float().mean().item(),
+            **benchmark(model, tokenizer, texts),
+            'rss_mb': measure_rss(quantized)
+        }
+        del model
+
+    agreement = (probabilities['fp32'].argmax(dim=-1) == probabilities['int8'].argmax(dim=-1)).float().mean().item()
+    max_probability_diff = (probabilities['fp32'] - probabilities['int8']).abs().max().item()
+
+    print(f"{'':6}{'acurácia':>10}{'e-mails/s':>12}{'p50 1 e-mail':>15}{'RSS':>12}")
+    for name, result in report.items():
+        print(f"{name:6}{result['accuracy']:>10.2%}{result['emails_per_second']:>12.1f}"
+              f"{result['latency_ms_p50']:>12.2f} ms{result['rss_mb']:>9.0f} MB")
+
+    print(f"\nConcordância das previsões: {agreement:.2%} | Maior diferença de probabilidade: {max_probability_diff:.4f}")
+    print(f"Speed-up (lote): {report['int8']['emails_per_second'] / report['fp32']['emails_per_second']:.2f}x | "
+          f"Speed-up (1 e-mail): {report['fp32']['latency_ms_p50'] / report['int8']['latency_ms_p50']:.2f}x | "
+          f"Memória residente economizada: {report['fp32']['rss_mb'] - report['int8']['rss_mb']:.0f} MB por worker")
+
+    accuracy_drop = report['fp32']['accuracy'] - report['int8']['accuracy']
+    if accuracy_drop > MAX_ACCURACY_DROP:
+        print(f"ERRO: O modelo quantizado perdeu {accuracy_drop:.2%} de acurácia (máx: {MAX_ACCURACY_DROP:.2%}).")
+        return False
+
+    print(f"OK: Queda de acurácia de {max(accuracy_drop, 0.0):.2%} (máx: {MAX_ACCURACY_DROP:.2%}).")
+    return True
+
+
+if __name__ == "__main__":
+    # --rss fp32|int8: uso interno, mede a memoria de um worker com o modelo carregado
+    if '--rss' in sys.argv:
+        quantized = sys.argv[sys.argv.index('--rss') + 1] == 'int8'
+        rss_tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
+        rss_model = load_model(quantized)
+        predict(rss_model, rss_tokenizer, ["warm up"], 1)
+        print(json.dumps({'rss_mb': resident_memory_mb()}))
+        sys.exit(0)
+
+    sys.exit(0 if check_parity() else 1)
@@ -7,6 +7,7 @@ export interface FileData {
     content_type: string;
     size: number;
     extracted_text: string;
+    text_truncated?: boolean; // PDF extraido so em parte (orcamento de texto, paginas ou tempo)
     category?: string;
     probabilities?: number[];
     suggested_response?: string;